@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of the hot paths of the FBA and MDF scripts.
+
+Every case runs on fixed fixtures of the repository, for the small
+e_coli_core model and for the curated iML1515, so the scaling with model
+size is visible:
+ * load - cobra.io.load_json_model of the JSON file;
+ * addrxn - AddRxn of NewRxns4Full_EuMP.csv;
+ * yield_matrix - the 4 pathways x 13 precursors matrix of EuMP_FBA.py;
+ * req_calc - one minimal uptake curve as in fald_sensors_FBA.py;
+ * flux2file - export of one flux distribution, parquet and xlsx;
+ * mdf_sweep - the 6 pathways x 50 formate bounds of
+   formate_reduction_eQu.py (needs equilibrator, model independent);
+ * mdf_parametric - the exact MDF over the same formate bounds, without
+   the uncertainty of the ΔG'°.
+Each repeat runs in a new process, so the peak RSS is that of the case
+alone; it is not measured on Windows, which lacks the resource module.
+The setup of the fixtures is not timed. Solves are counted by wrapping
+optlang's Model.optimize and cvxpy's Problem.solve. The analyses run with
+processes=1 so that all solves are seen.
+
+Run `python benchmarks.py` in 0_tools. The results are appended to a JSON
+history and compared with the best earlier run of the same case on the same
+machine.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TOOLS_DIR)
+HISTORY_FILE = os.path.join(TOOLS_DIR, '.cache', 'benchmarks.json')
+MODEL_DIR = os.path.join(ROOT_DIR, '0_ecoli_models')
+EUMP_DIR = os.path.join(ROOT_DIR, '2022_EuMP', 'FBA')
+MDF_DIR = os.path.join(ROOT_DIR, '2022_formate_reduction', 'MDF')
+
+MODELS = {
+    'e_coli_core': {
+        'file': 'e_coli_core.json',
+        'patches': (),
+        'knockouts': (),
+        'medium': None,
+        'uptake': 'EX_glc__D_e',
+        'biomass': 'BIOMASS_Ecoli_core_w_GAM',
+    },
+    # as in EuMP_FBA.py
+    'iML1515': {
+        'file': 'iML1515.json',
+        'patches': ('THD2pp', 'HSDy', 'MMM'),
+        'knockouts': ('POR5', 'GLYCK', 'FDH4pp', 'FDH5pp', 'ATPM', 'PFL',
+                      'OBTFL', 'GART', 'DRPA', 'PAI2T', 'FRD2', 'FRD3', 'F6PA'),
+        'medium': 'formaldehyde',
+        'uptake': 'EX_fald_e',
+        'biomass': 'BIOMASS_Ec_iML1515_core_75p37M',
+    },
+}
+PSWS = ['RuMP', 'XuMP', 'SerCyc', 'EuMP']
+PRECURSORS = ['biomass', 'g6p_c', 'f6p_c', 'e4p_c', 'r5p_c', 'g3p_c',
+              '3pg_c', 'pep_c', 'pyr_c', 'accoa_c', 'akg_c', 'succoa_c', 'oaa_c']
+PATHWAY_KOS = ['FTHFLi', 'THRA', 'THRD']
+MDF_PSWS = ['1_THF', '1_THF_NADH', '2_CoA', '2_CoA_NADPH', '3_Pi', '3_Pi_NADH']
+
+_counts = {}
+
+
+def _count_solves():
+    """Count LP/MILP and cvxpy solves in this process."""
+    import optlang.interface
+
+    def counted(key, method):
+        def wrapper(*args, **kwargs):
+            _counts[key] = _counts.get(key, 0) + 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    optlang.interface.Model.optimize = counted(
+        'lp_solves', optlang.interface.Model.optimize)
+    # only cases that use cvxpy pay for importing it
+    if 'cvxpy' in sys.modules:
+        cvxpy = sys.modules['cvxpy']
+        cvxpy.Problem.solve = counted('cvxpy_solves', cvxpy.Problem.solve)
+
+
+def _base_model(name):
+    import iml1515
+    from medium import apply_medium
+    config = MODELS[name]
+    model_file = os.path.join(MODEL_DIR, config['file'])
+    model = iml1515.load_model(model_file, config['patches'], config['knockouts'])
+    if config['medium'] is not None:
+        apply_medium(model, config['medium'])
+    return model, config
+
+
+def _rxn_file(psw):
+    return os.path.join(EUMP_DIR, f'NewRxns4Full_{psw}.csv')
+
+
+def _load(name):
+    import cobra
+    path = os.path.join(MODEL_DIR, MODELS[name]['file'])
+    return lambda: cobra.io.load_json_model(path)
+
+
+def _addrxn(name):
+    from fba_utils import AddRxn
+    model, _ = _base_model(name)
+    return lambda: AddRxn(model, _rxn_file('EuMP'))
+
+
+def _yield_matrix(name):
+    from yield_matrix import yield_matrix
+    model, _ = _base_model(name)
+    psws = {psw: _rxn_file(psw) for psw in PSWS}
+    knockouts = {psw: [ID for ID in PATHWAY_KOS if ID in model.reactions]
+                 for psw in psws}
+    return lambda: yield_matrix(model, psws, PRECURSORS,
+                                knockouts=knockouts, processes=1)
+
+
+def _req_calc(name):
+    from fba_utils import AddRxn
+    from sweep import growth_sweep, dependency_slope
+    model, config = _base_model(name)
+    AddRxn(model, _rxn_file('RuMP'))
+    model.reactions.get_by_id(config['uptake']).lower_bound = -1000
+    growth_rates = np.arange(0.5, step=0.1)
+
+    def run():
+        sweep = growth_sweep(model, config['uptake'], growth_rates,
+                             biomass=config['biomass'])
+        return dependency_slope(growth_rates, sweep[config['uptake']].abs())
+    return run
+
+
+def _flux2file(name, fmt):
+    from fba_utils import flux2file
+    model, _ = _base_model(name)
+    solution = model.optimize()
+    output_dir = tempfile.mkdtemp()
+    return lambda: flux2file(model, 'bench', 'biomass', output_dir=output_dir,
+                             fmt=fmt, solution=solution)
+
+
+def _mdf_arrays():
+    from equilibrator_api import ComponentContribution, Q_
+    from equilibrator_pathway import ThermodynamicModel
+    import dgf_cache
+    from mdf_tools import mdf_arrays
+    # conditions of formate_reduction_eQu.py
+    comp_contrib = ComponentContribution()
+    comp_contrib.p_h = Q_(7)
+    comp_contrib.ionic_strength = Q_('250 mM')
+    comp_contrib.p_mg = Q_(3)
+    arrays = {}
+    for psw in MDF_PSWS:
+        model = ThermodynamicModel.from_sbtab(
+            os.path.join(MDF_DIR, f'{psw}.tsv'), comp_contrib=comp_contrib)
+        dgf_cache.update_standard_dgs(model)
+        arrays[psw] = mdf_arrays(model)
+    return arrays
+
+
+def _mdf_sweep(name):
+    from mdf_tools import mdf_sweep
+    arrays = _mdf_arrays()
+    return lambda: mdf_sweep(arrays, [('ub', 'for', range(1, 51))], processes=1)
+
+
+def _mdf_parametric(name):
+    from mdf_tools import mdf_parametric
+    arrays = {psw: dict(a, dg_confidence=0) for psw, a in _mdf_arrays().items()}
+    return lambda: mdf_parametric(arrays, 'for', 'ub', (1, 50))
+
+
+# name: (setup returning the timed callable, runs per model)
+CASES = {
+    'load': (_load, True),
+    'addrxn': (_addrxn, True),
+    'yield_matrix': (_yield_matrix, True),
+    'req_calc': (_req_calc, True),
+    'flux2file_parquet': (lambda name: _flux2file(name, 'parquet'), True),
+    'flux2file_xlsx': (lambda name: _flux2file(name, 'xlsx'), True),
+    'mdf_sweep': (_mdf_sweep, False),
+    'mdf_parametric': (_mdf_parametric, False),
+}
+
+
+def _run_case(case, name):
+    """Set up and time one case; runs in a new process."""
+    if TOOLS_DIR not in sys.path:
+        sys.path.append(TOOLS_DIR)
+    run = CASES[case][0](name)
+    _count_solves()
+    t = time.perf_counter()
+    run()
+    wall = time.perf_counter() - t
+    return {'wall_time': wall, 'peak_rss_mb': _peak_rss(), **_counts}
+
+
+def _peak_rss():
+    """Peak RSS of this process in MB, None without the resource module."""
+    if resource is None:
+        return None
+    # kB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (2**20 if sys.platform == 'darwin' else 2**10)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=ROOT_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(path=HISTORY_FILE) -> list:
+    """Earlier benchmark runs, oldest first."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_history(history, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+
+def run_benchmarks(cases=None, models=None, repeats=3) -> dict:
+    """Run the cases and return {'case/model': result}.
+
+    A result holds the minimal wall time (s) over the repeats, the largest
+    peak RSS (MB, None where unavailable) and the solve counts of the last
+    repeat, or the error of a case that failed, e.g. for a missing optional
+    dependency.
+    """
+    cases = list(cases or CASES)
+    models = list(models or MODELS)
+    spawn = multiprocessing.get_context('spawn')
+    results = {}
+    for case in cases:
+        for name in (models if CASES[case][1] else [None]):
+            key = case if name is None else f'{case}/{name}'
+            runs = []
+            try:
+                for _ in range(repeats):
+                    with ProcessPoolExecutor(1, mp_context=spawn) as pool:
+                        runs.append(pool.submit(_run_case, case, name).result())
+            except Exception as e:
+                results[key] = {'error': f'{type(e).__name__}: {e}'}
+                continue
+            result = dict(runs[-1])
+            result['wall_time'] = min(r['wall_time'] for r in runs)
+            rss = [r['peak_rss_mb'] for r in runs if r['peak_rss_mb'] is not None]
+            result['peak_rss_mb'] = max(rss) if rss else None
+            results[key] = result
+    return results
+
+
+def compare(results, history, tolerance=1.2) -> list:
+    """Regressions against the best earlier run of each case on this machine.
+
+    A case regresses when its wall time exceeds tolerance times the best
+    earlier time, or when its solve counts changed.
+    """
+    machine = platform.node()
+    regressions = []
+    for key, result in results.items():
+        earlier = [run['results'][key] for run in history
+                   if run['machine'] == machine and key in run['results']
+                   and 'error' not in run['results'][key]]
+        if 'error' in result or not earlier:
+            continue
+        best = min(r['wall_time'] for r in earlier)
+        if result['wall_time'] > tolerance * best:
+            regressions.append(f"{key}: {result['wall_time']:.3f} s, "
+                               f"best {best:.3f} s")
+        for count in ('lp_solves', 'cvxpy_solves'):
+            if result.get(count) != earlier[-1].get(count):
+                regressions.append(f"{key}: {count} {earlier[-1].get(count)} "
+                                   f"-> {result.get(count)}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-c', '--cases', nargs='+', choices=list(CASES))
+    parser.add_argument('-m', '--models', nargs='+', choices=list(MODELS))
+    parser.add_argument('-r', '--repeats', type=int, default=3)
+    parser.add_argument('--history', default=HISTORY_FILE)
+    parser.add_argument('--tolerance', type=float, default=1.2)
+    parser.add_argument('--no-save', action='store_true',
+                        help='do not append the results to the history')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.cases, args.models, args.repeats)
+    for key, result in results.items():
+        if 'error' in result:
+            print(f"{key:32s} {result['error']}")
+        else:
+            rss = result['peak_rss_mb']
+            rss = f'{rss:8.1f}' if rss is not None else f"{'n/a':>8s}"
+            print(f"{key:32s} {result['wall_time']:9.3f} s "
+                  f"{rss} MB "
+                  f"{result.get('lp_solves', 0):6d} LP "
+                  f"{result.get('cvxpy_solves', 0):6d} cvxpy")
+
+    history = read_history(args.history)
+    regressions = compare(results, history, args.tolerance)
+    for line in regressions:
+        print('REGRESSION', line)
+    if not args.no_save:
+        import cobra
+        history.append({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'machine': platform.node(),
+            'python': platform.python_version(),
+            'cobra': cobra.__version__,
+            'repeats': args.repeats,
+            'results': results,
+        })
+        _write_history(history, args.history)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
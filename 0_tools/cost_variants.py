@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""Pathway costs over a grid of stoichiometry variants.
+
+A variant axis scales the coefficients of reactions in LP constraints:
+{(constraint, reaction ID): sign} with one value per grid point, the
+coefficient becoming sign * value. The constraint is a metabolite ID for
+stoichiometry, e.g. ATP per carboxylation of GCC, or the name of an added
+constraint such as the RuBisCO carboxylation/oxygenation ratio. Only the LP
+matrix changes between variants; reactions are not rebuilt, so the
+cobra reactions keep their original metabolites (except in saved flux
+files).
+
+Each worker adds the reactions of a pathway once and solves all its
+variants one after another, like yield_matrix. Variants differing only in
+axes that do not touch a pathway are solved once.
+
+reducing_eq_segments gives the reducing equivalents over a whole range of
+one conversion factor (ATP or ferredoxin per NAD(P)H) from a few solves
+per pathway, as the optimum is piecewise linear in the objective weights.
+It minimizes the reducing equivalents at each ratio, a different LP from
+the minimal ATP of variant_costs; fixed_flux_segments gives the same table
+for the fluxes of a cost table, which cost_summary prices.
+"""
+import math
+import pickle
+import itertools
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import cobra
+from optlang.symbolics import Zero
+from cobra.core.solution import get_solution
+from cobra.util.context import get_context
+
+from fba_utils import AddRxn, read_rxn_table, flux2file
+from parallel import pool_size
+
+COSTS = ['DM_atp', 'DM_e', 'Fdr', 'EX_co2', 'RBPC', 'RBPO', 'sink_3pg']
+
+_worker = {}
+
+
+def _init_worker(data, pathways, axes, costs, save, output_dir, fmt):
+    model = pickle.loads(data) if isinstance(data, bytes) else data
+    model.__enter__()
+    _worker.update(model=model, pathways=pathways, axes=axes, costs=costs,
+                   save=save, output_dir=output_dir, fmt=fmt, psw=None)
+
+
+def _leave_pathway():
+    if _worker.get('psw') is not None:
+        _worker['model'].__exit__(None, None, None)
+        _worker['psw'] = None
+
+
+def _close_worker():
+    _leave_pathway()
+    _worker['model'].__exit__(None, None, None)
+    _worker.clear()
+
+
+def _set_coefficients(coefs):
+    for constraint, terms in coefs.items():
+        constraint.set_linear_coefficients(terms)
+
+
+def _enter_pathway(psw):
+    """Add the pathway reactions, undoing the previous pathway."""
+    model = _worker['model']
+    if _worker['psw'] == psw:
+        return model
+    _leave_pathway()
+    model.__enter__()
+    _worker['psw'] = psw
+    AddRxn(model, _worker['pathways'][psw])
+    # the LP coefficients of every axis term, restored with the pathway
+    terms, original = [], {}
+    constraints = model.solver.constraints
+    for name, (signs, values) in _worker['axes'].items():
+        axis = []
+        for (constraint, ID), sign in signs.items():
+            if ID not in model.reactions:
+                continue
+            if constraint not in constraints:
+                raise ValueError(f"Axis '{name}': no constraint '{constraint}'")
+            rxn = model.reactions.get_by_id(ID)
+            constraint = constraints[constraint]
+            coefs = constraint.get_linear_coefficients(
+                [rxn.forward_variable, rxn.reverse_variable])
+            original.setdefault(constraint, {}).update(coefs)
+            axis.append((constraint, rxn, sign))
+        terms.append(axis)
+    get_context(model)(partial(_set_coefficients, original))
+    _worker['terms'] = terms
+    return model
+
+
+def _save(model, key, values):
+    """flux2file, with the variant stoichiometry in the reaction formulas."""
+    solution = get_solution(model)
+    with model:
+        for axis, value in zip(_worker['terms'], values):
+            for constraint, rxn, sign in axis:
+                if constraint.name in model.metabolites:
+                    met = model.metabolites.get_by_id(constraint.name)
+                    rxn.add_metabolites(
+                        {met: sign * value - rxn._metabolites.get(met, 0)})
+        flux2file(model, *_worker['save'][key], _worker['output_dir'],
+                  fmt=_worker['fmt'], solution=solution)
+
+
+def _solve_variant(psw, values):
+    model = _enter_pathway(psw)
+    coefs = {}
+    for axis, value in zip(_worker['terms'], values):
+        for constraint, rxn, sign in axis:
+            c = sign * value
+            coefs.setdefault(constraint, {}).update(
+                {rxn.forward_variable: c, rxn.reverse_variable: -c})
+    _set_coefficients(coefs)
+    if np.isnan(model.slim_optimize(error_value=np.nan)):
+        return [np.nan] * len(_worker['costs'])
+    key = (psw,) + tuple(values)
+    if key in _worker['save']:
+        _save(model, key, values)
+    primals = model.solver.primal_values
+    return [abs(primals[ID] - primals[model.reactions.get_by_id(ID).reverse_id])
+            for ID in _worker['costs']]
+
+
+def variant_costs(model: cobra.Model,
+                  pathways: dict,
+                  axes: dict = None,
+                  costs=COSTS,
+                  save: dict = None,
+                  output_dir='output',
+                  fmt='xlsx',
+                  processes=None) -> pd.DataFrame:
+    """Absolute fluxes of the cost reactions for every pathway and variant.
+
+    pathways maps a pathway name to its reaction file. axes maps an axis name
+    to ({(constraint, reaction ID): sign}, values), e.g.
+    {'GCC ATP': ({('atp', 'GCC'): -1, ('adp', 'GCC'): 1, ('pi', 'GCC'): 1},
+    [1, 3.9, 1.7])}; every combination of the axis values is solved. The
+    columns are (pathway, *axis values), or the pathways without axes.
+    save maps columns to the flux2file (psw, product) names of their fluxes.
+    """
+    axes = axes or {}
+    save = {(k,) if isinstance(k, str) else tuple(k): v
+            for k, v in (save or {}).items()}
+    grid = list(itertools.product(*(values for _, values in axes.values())))
+
+    # axes touching a pathway; the others are fixed to their first value
+    base = {r.id for r in model.reactions}
+    columns, tasks = [], {}
+    for psw, path in pathways.items():
+        IDs = base | {row[0] for row in read_rxn_table(path)}
+        used = [any(ID in IDs for _, ID in signs) for signs, _ in axes.values()]
+        for values in grid:
+            key = tuple(v if u else first for v, u, (_, (first, *_))
+                        in zip(values, used, axes.values()))
+            if (psw,) + values in save:
+                # the saved variant itself has to be solved
+                key = values
+            columns.append(((psw,) + values, (psw, key)))
+            tasks.setdefault((psw, key), None)
+    tasks = list(tasks)
+    processes = pool_size(processes, len(tasks))
+
+    initargs = (pathways, axes, list(costs), save, output_dir, fmt)
+    if processes <= 1:
+        _init_worker(model, *initargs)
+        try:
+            results = [_solve_variant(*task) for task in tasks]
+        finally:
+            _close_worker()
+    else:
+        data = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        chunksize = max(1, math.ceil(len(tasks) / (4 * processes)))
+        with ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_worker,
+                initargs=(data,) + initargs) as pool:
+            results = list(pool.map(_solve_variant, *zip(*tasks),
+                                    chunksize=chunksize))
+
+    results = dict(zip(tasks, results))
+    df = pd.DataFrame({col: results[task] for col, task in columns},
+                      index=list(costs), dtype=float)
+    if axes:
+        df.columns = pd.MultiIndex.from_tuples(
+            [col for col, _ in columns], names=['Pathway', *axes])
+    else:
+        df.columns = [col[0] for col, _ in columns]
+    return df
+
+
+def cost_summary(cost_df: pd.DataFrame,
+                 atp_per_nadh=2.5,
+                 fd_per_nadh=2,
+                 reference='NPR') -> pd.DataFrame:
+    """Add the reducing equivalents, Yield and Rel_yield rows to a cost table.
+
+    One NAD(P)H counts as atp_per_nadh ATP and fd_per_nadh ferredoxin; with
+    lists of ratios every combination is given, as two more column levels.
+    Rel_yield is the yield relative to the reference pathway of the same
+    variant, in %.
+    """
+    ratios = list(itertools.product(np.atleast_1d(atp_per_nadh),
+                                    np.atleast_1d(fd_per_nadh)))
+    frames = {}
+    for atp, fd in ratios:
+        df = cost_df.copy()
+        df.loc['reducing_eq', :] = (df.loc['DM_atp', :] / atp + df.loc['DM_e']
+                                    + df.loc['Fdr'] / fd)
+        df.loc['Yield', :] = 1 / df.loc['reducing_eq', :]  # per reducing equivalent
+        yields = df.loc['Yield', :]
+        if isinstance(df.columns, pd.MultiIndex):
+            ref = yields.xs(reference, level=0)
+            ref = ref.reindex(yields.index.droplevel(0)).values
+        else:
+            ref = yields[reference]
+        df.loc['Rel_yield', :] = yields / ref * 100
+        frames[atp, fd] = df
+    if len(ratios) == 1:
+        return frames[ratios[0]]
+    return pd.concat(frames, axis=1, names=['ATP/NAD(P)H', 'Fd/NAD(P)H'])
+
+
+def _weighted_solve(model, variables, weights):
+    """Minimal reducing equivalents per 3pg and the DM_atp, DM_e, Fdr fluxes."""
+    coefs = {}
+    for (fwd, rev), w in zip(variables, weights):
+        coefs[fwd], coefs[rev] = w, -w
+    model.solver.objective.set_linear_coefficients(coefs)
+    if np.isnan(model.slim_optimize(error_value=np.nan)):
+        return None
+    primals = model.solver.primal_values
+    sink = abs(model.reactions.get_by_id('sink_3pg').flux)
+    # the fluxes are the slopes of the optimum in the weights
+    fluxes = np.array([primals[fwd.name] - primals[rev.name]
+                       for fwd, rev in variables])
+    return model.solver.objective.value / sink, fluxes / sink
+
+
+def _solve_segments(psw, factor, low, high, atp_per_nadh, fd_per_nadh, tol):
+    """Piecewise-linear minimal reducing equivalents over 1/factor.
+
+    The minimum is concave and piecewise linear in the weight w = 1/factor,
+    one segment per optimal flux distribution. Lines are intersected and
+    solved at the intersection until no lower line is found, which takes
+    two solves per segment.
+    """
+    model = _enter_pathway(psw)
+    k = 0 if factor == 'atp_per_nadh' else 2
+    with model:
+        model.objective = model.problem.Objective(Zero, direction='min',
+                                                  sloppy=True)
+        variables = [(r.forward_variable, r.reverse_variable) for r in
+                     (model.reactions.get_by_id(ID)
+                      for ID in ('DM_atp', 'DM_e', 'Fdr'))]
+        weights = np.array([1 / atp_per_nadh, 1, 1 / fd_per_nadh])
+
+        def solve(w):
+            weights[k] = w
+            return _weighted_solve(model, variables, weights)
+
+        lo, hi = 1 / high, 1 / low
+        points = {lo: solve(lo), hi: solve(hi)}
+        if points[lo] is None or points[hi] is None:
+            return []
+        stack = [(lo, hi)]
+        while stack:
+            a, b = stack.pop()
+            (va, fa), (vb, fb) = points[a], points[b]
+            if abs(fa[k] - fb[k]) <= tol:
+                continue
+            w = a + (vb - va - (b - a) * fb[k]) / (fa[k] - fb[k])
+            if not a + tol < w < b - tol or w in points:
+                continue
+            points[w] = solve(w)
+            if points[w][0] < va + (w - a) * fa[k] - tol * (1 + abs(va)):
+                stack.extend([(a, w), (w, b)])
+            else:
+                # a breakpoint of the two lines; the optimum at w is
+                # degenerate, so it belongs to neither segment
+                points[w] = None
+    segments, w_sorted = [], sorted(points)
+    for a, b in zip(w_sorted, w_sorted[1:]):
+        # the lower of the two end lines in the middle of the range
+        mid = (a + b) / 2
+        v, fluxes = min(((points[w][0] + (mid - w) * points[w][1][k],
+                          points[w][1]) for w in (a, b) if points[w] is not None),
+                        key=lambda line: line[0])
+        if segments and np.allclose(segments[-1][2], fluxes, atol=tol):
+            segments[-1][1] = b
+            continue
+        segments.append([a, b, fluxes])
+    segments = [[1 / b, 1 / a, fluxes] for a, b, fluxes in reversed(segments)]
+    segments[0][0], segments[-1][1] = low, high
+    return segments
+
+
+def reducing_eq_segments(model: cobra.Model,
+                         pathways: dict,
+                         factor='atp_per_nadh',
+                         ratios=(1, 5),
+                         atp_per_nadh=2.5,
+                         fd_per_nadh=2,
+                         tol=1e-9,
+                         processes=None) -> pd.DataFrame:
+    """Optimal flux segments over a range of one conversion factor.
+
+    The LP minimizes the reducing equivalents DM_atp / atp_per_nadh + DM_e
+    + Fdr / fd_per_nadh per 3pg, instead of ATP alone, while factor
+    ('atp_per_nadh' or 'fd_per_nadh') runs over ratios (low, high). Every
+    row is a range of the factor with one optimal flux distribution, so
+    the reducing equivalents are linear in 1 / factor within a row; see
+    sensitivity_table. A pathway needs one LP per segment and one per
+    breakpoint instead of one per ratio.
+
+    The fluxes may differ from those of a cost table, whose LP minimizes
+    DM_atp, so the Rel_yield at atp_per_nadh=2.5 and fd_per_nadh=2 need not
+    be that of cost_summary; the reducing equivalents are at most those of
+    cost_summary. fixed_flux_segments keeps the cost table fluxes instead.
+    """
+    if factor not in ('atp_per_nadh', 'fd_per_nadh'):
+        raise ValueError(f"Unknown conversion factor '{factor}'")
+    tasks = [(psw, factor, *ratios, atp_per_nadh, fd_per_nadh, tol)
+             for psw in pathways]
+    processes = pool_size(processes, len(tasks))
+
+    initargs = (pathways, {}, [], {}, None, None)
+    if processes <= 1:
+        _init_worker(model, *initargs)
+        try:
+            results = [_solve_segments(*task) for task in tasks]
+        finally:
+            _close_worker()
+    else:
+        data = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        with ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_worker,
+                initargs=(data,) + initargs) as pool:
+            results = list(pool.map(_solve_segments, *zip(*tasks)))
+
+    rows = [(psw, low, high, *fluxes)
+            for psw, segments in zip(pathways, results)
+            for low, high, fluxes in segments]
+    df = pd.DataFrame(rows, columns=['Pathway', 'From', 'To',
+                                     'DM_atp', 'DM_e', 'Fdr'])
+    df.attrs.update(factor=factor, atp_per_nadh=atp_per_nadh,
+                    fd_per_nadh=fd_per_nadh)
+    return df
+
+
+def fixed_flux_segments(cost_df: pd.DataFrame,
+                        factor='atp_per_nadh',
+                        ratios=(1, 5),
+                        atp_per_nadh=2.5,
+                        fd_per_nadh=2) -> pd.DataFrame:
+    """Segments of reducing_eq_segments for the fluxes of a cost table.
+
+    Every column of cost_df (from variant_costs, possibly with the rows of
+    cost_summary) is one segment over the whole range, so sensitivity_table
+    prices the minimal-ATP fluxes at every ratio, as cost_summary does at
+    one ratio.
+    """
+    if factor not in ('atp_per_nadh', 'fd_per_nadh'):
+        raise ValueError(f"Unknown conversion factor '{factor}'")
+    fluxes = cost_df.loc[['DM_atp', 'DM_e', 'Fdr']] / cost_df.loc['sink_3pg']
+    df = pd.DataFrame([(psw, *ratios, *fluxes[psw])
+                       for psw in fluxes.columns],
+                      columns=['Pathway', 'From', 'To',
+                               'DM_atp', 'DM_e', 'Fdr'])
+    df.attrs.update(factor=factor, atp_per_nadh=atp_per_nadh,
+                    fd_per_nadh=fd_per_nadh)
+    return df
+
+
+def sensitivity_table(segments: pd.DataFrame,
+                      ratios,
+                      reference='NPR') -> pd.DataFrame:
+    """reducing_eq, Yield and Rel_yield of every pathway at the given ratios.
+
+    The values follow from the segments of reducing_eq_segments or
+    fixed_flux_segments without solving. Columns are (quantity, pathway).
+    """
+    factor = segments.attrs['factor']
+    ratios = np.asarray(ratios, dtype=float)
+    atp = np.full_like(ratios, segments.attrs['atp_per_nadh'])
+    fd = np.full_like(ratios, segments.attrs['fd_per_nadh'])
+    if factor == 'atp_per_nadh':
+        atp = ratios
+    else:
+        fd = ratios
+    reducing_eq = {}
+    for psw, seg in segments.groupby('Pathway', sort=False):
+        values = np.full_like(ratios, np.nan)
+        for row in seg.itertuples():
+            inside = (ratios >= row.From) & (ratios <= row.To)
+            values[inside] = (row.DM_atp / atp + row.DM_e + row.Fdr / fd)[inside]
+        reducing_eq[psw] = values
+    reducing_eq = pd.DataFrame(reducing_eq, index=pd.Index(ratios, name=factor))
+    yields = 1 / reducing_eq
+    return pd.concat({
+        'reducing_eq': reducing_eq,
+        'Yield': yields,
+        'Rel_yield': yields.div(yields[reference], axis=0) * 100,
+    }, axis=1)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""On-disk cache of component-contribution estimates per compound.
+
+Standard ΔG'° of reactions are linear in per-compound terms: the formation
+energy estimate (mean and uncertainty vectors), its Legendre transform, or a
+stored formation energy. These terms are kept in 0_tools/.cache, one file
+per (p_h, ionic_strength, p_mg, temperature), keyed by compound and phase, so
+every pathway and later run only estimates compounds it has not seen yet.
+update_standard_dgs(model) replaces model.update_standard_dgs().
+
+The estimates use internals of component-contribution, so the result is
+only known to equal equilibrator's for the TESTED_VERSIONS. With other
+versions the first model of a cache file is checked against
+model.update_standard_dgs() (see check), with a warning.
+"""
+import os
+import hashlib
+import pickle
+import warnings
+from importlib.metadata import version
+import numpy as np
+from equilibrator_api import Q_
+from equilibrator_cache import PROTON_INCHI
+from equilibrator_cache.exceptions import MissingDissociationConstantsException
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+TESTED_VERSIONS = {
+    'equilibrator-api': '0.8.1',
+    'equilibrator-cache': '0.8.1',
+    'component-contribution': '0.8.0',
+}
+
+_caches = {}
+_checked = set()
+
+
+def conditions(comp_contrib) -> tuple:
+    """(p_h, ionic_strength [M], p_mg, temperature [K]) of comp_contrib."""
+    return (
+        round(float(comp_contrib.p_h.m_as('')), 6),
+        round(float(comp_contrib.ionic_strength.m_as('M')), 6),
+        round(float(comp_contrib.p_mg.m_as('')), 6),
+        round(float(comp_contrib.temperature.m_as('K')), 6),
+    )
+
+
+def cache_file(comp_contrib, cache_dir=CACHE_DIR):
+    """Cache file of the conditions and equilibrator version of comp_contrib."""
+    spec = repr((conditions(comp_contrib), version('equilibrator-api'),
+                 version('component-contribution')))
+    key = hashlib.sha256(spec.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'dgf_{key}.pkl')
+
+
+def _read(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _write(path, entries):
+    # merge with entries written by other runs in the meantime
+    merged = _read(path)
+    merged.update(entries)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(merged, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return merged
+
+
+def estimate(comp_contrib, phased_compound):
+    """Terms of one compound in the standard ΔG'° of a reaction.
+
+    Returns ('stored', dgf_prime), ('unknown', transform) for compounds that
+    cannot be decomposed, ('predicted', (mu, sigma_fin, sigma_inf, transform))
+    or None for protons. Energies are in kJ/mol.
+    """
+    cc = comp_contrib
+    stored = phased_compound.get_stored_standard_dgf_prime(
+        p_h=cc.p_h, ionic_strength=cc.ionic_strength,
+        temperature=cc.temperature, p_mg=cc.p_mg)
+    if stored is not None:
+        return 'stored', float(stored.m_as('kJ/mol'))
+    compound = phased_compound.compound
+    if compound.inchi == PROTON_INCHI:
+        return None
+    try:
+        transform = float(compound.transform(
+            p_h=cc.p_h, ionic_strength=cc.ionic_strength,
+            temperature=cc.temperature, p_mg=cc.p_mg).m_as('kJ/mol'))
+    except MissingDissociationConstantsException as e:
+        warnings.warn(f'Cannot calculate Legendre transform: {e}')
+        transform = 0.0
+    mu, sigma_fin, sigma_inf = cc.predictor.get_compound_prediction(compound)
+    if mu is None:
+        return 'unknown', transform
+    return 'predicted', (float(mu), np.asarray(sigma_fin, dtype=float),
+                         np.asarray(sigma_inf, dtype=float), transform)
+
+
+def check(model, cache_dir=CACHE_DIR, rtol=1e-6, atol=1e-6):
+    """Raise if the cached ΔG'° of model differ from model.update_standard_dgs().
+
+    The model is left with the result of model.update_standard_dgs().
+    """
+    _update(model, cache_dir)
+    dg, sigma = model.standard_dg_primes.m_as('kJ/mol'), model.dg_sigma
+    model.update_standard_dgs()
+    ref, ref_sigma = model.standard_dg_primes.m_as('kJ/mol'), model.dg_sigma
+    # the factor of the covariance need not be unique
+    cov, ref_cov = [np.zeros((0, 0)) if x is None else
+                    x.m_as('kJ/mol') @ x.m_as('kJ/mol').T for x in (sigma, ref_sigma)]
+    if not (np.allclose(dg, ref, rtol=rtol, atol=atol) and cov.shape == ref_cov.shape
+            and np.allclose(cov, ref_cov, rtol=rtol, atol=atol)):
+        raise RuntimeError(
+            "The cached ΔG'° differ from model.update_standard_dgs() with "
+            f"{_versions()}; dgf_cache was written for {TESTED_VERSIONS}")
+
+
+def _versions():
+    return {name: version(name) for name in TESTED_VERSIONS}
+
+
+def update_standard_dgs(model, cache_dir=CACHE_DIR):
+    """Set standard_dg_primes and dg_sigma of a ThermodynamicModel.
+
+    Gives the result of model.update_standard_dgs(), estimating only the
+    compounds missing from the cache of the current conditions.
+    """
+    path = cache_file(model.comp_contrib, cache_dir)
+    if path not in _checked and _versions() != TESTED_VERSIONS:
+        _checked.add(path)
+        warnings.warn(f'dgf_cache was written for {TESTED_VERSIONS}, not '
+                      f'{_versions()}; checking it against equilibrator')
+        check(model, cache_dir)
+        return model
+    return _update(model, cache_dir)
+
+
+def _update(model, cache_dir):
+    cc = model.comp_contrib
+    path = cache_file(cc, cache_dir)
+    if path not in _caches:
+        _caches[path] = _read(path)
+    entries = _caches[path]
+    new = {}
+
+    preprocess = cc.predictor.preprocess
+    n_fin, n_inf = preprocess.L_c.shape[0], preprocess.L_inf.shape[0]
+    mus, sigma_fin, sigma_inf, residuals = [], [], [], []
+    for reaction in model.reactions:
+        mu, fin, inf, residual = 0.0, np.zeros(n_fin), np.zeros(n_inf), {}
+        for phased_compound, coeff in reaction.sparse_with_phases.items():
+            key = (phased_compound.compound.id, phased_compound.phase)
+            if key not in entries:
+                entries[key] = new[key] = estimate(cc, phased_compound)
+            entry = entries[key]
+            if entry is None:
+                continue
+            kind, value = entry
+            if kind == 'stored':
+                mu += coeff * value
+            elif kind == 'unknown':
+                mu += coeff * value
+                residual[key[0]] = residual.get(key[0], 0) + coeff
+            else:
+                mu += coeff * (value[0] + value[3])
+                fin += coeff * value[1]
+                inf += coeff * value[2]
+        mus.append(mu)
+        sigma_fin.append(fin)
+        sigma_inf.append(inf)
+        residuals.append(residual)
+    if new:
+        _caches[path] = _write(path, new)
+
+    model.standard_dg_primes = Q_(np.array(mus), 'kJ/mol')
+    model.dg_sigma = cc.predictor.combine_uncertainties(
+        np.vstack(sigma_fin), np.vstack(sigma_inf),
+        preprocess._residuals_to_matrix(residuals),
+        uncertainty_representation='fullrank')
+    return model
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""Helpers shared by the FBA scripts."""
+import os
+import re
+import weakref
+import warnings
+import importlib.util
+from functools import lru_cache, partial
+import numpy as np
+import pandas as pd
+import cobra
+from cobra.core.solution import get_solution
+from cobra.util.context import get_context
+from cobra.util.solver import linear_reaction_coefficients
+
+from instrument import span, traced
+
+# Arrows as understood by cobra.Reaction.build_reaction_from_string
+_reversible_arrow = re.compile('<(-+|=+)>')
+_forward_arrow = re.compile('(-+|=+)>')
+_reverse_arrow = re.compile('<(-+|=+)')
+
+
+def parse_formula(formula: str):
+    """Parse a reaction formula into a {metabolite ID: coefficient} dict."""
+    arrow = (_reversible_arrow.search(formula)
+             or _forward_arrow.search(formula)
+             or _reverse_arrow.search(formula))
+    if arrow is None:
+        raise ValueError(f"no suitable arrow found in '{formula}'")
+    stoich = {}
+    for side, factor in ((formula[:arrow.start()], -1),
+                         (formula[arrow.end():], 1)):
+        side = side.strip()
+        if not side:
+            continue
+        for term in side.split('+'):
+            term = term.strip()
+            if term.lower() == 'nothing':
+                continue
+            if ' ' in term:
+                num, ID = term.split()
+                num = float(num.lstrip('(').rstrip(')')) * factor
+            else:
+                num, ID = factor, term
+            stoich[ID] = stoich.get(ID, 0) + num
+    return stoich
+
+
+@lru_cache(maxsize=None)
+def _read_rxn_table(path, mtime):
+    AllAddRxn = pd.read_csv(path, sep=',', index_col='RxnID', skipinitialspace=True)
+    rows = []
+    for ID, row in AllAddRxn.iterrows():
+        rows.append((
+            ID, row['RxnName'], row['Subsystem'],
+            float(row['LowerBound']), float(row['UpperBound']),
+            parse_formula(row['RxnFormula']),
+        ))
+    return tuple(rows)
+
+
+@traced('parse', 'parse')
+def read_rxn_table(newRxnFile):
+    """Parse a NewRxns4Full_*.csv file, reusing the result until it changes.
+
+    Returns a tuple of (ID, name, subsystem, lower bound, upper bound,
+    stoichiometry) per reaction.
+    """
+    path = os.path.abspath(newRxnFile)
+    return _read_rxn_table(path, os.path.getmtime(path))
+
+
+@traced
+def AddRxn(model: cobra.Model,
+           newRxnFile):
+    """Function of adding new reactions to the model.
+
+    All reactions of the file are built first and added with a single
+    `add_reactions` call, bounds included, so the solver is updated once.
+    """
+    newMets = {}
+    addRxns = []
+    for ID, name, subsystem, lb, ub, stoich in read_rxn_table(newRxnFile):
+        if ID in model.reactions:
+            continue
+        addRxn = cobra.Reaction(ID, name=name, subsystem=subsystem,
+                                lower_bound=lb, upper_bound=ub)
+        mets = {}
+        for metID, coef in stoich.items():
+            if metID in model.metabolites:
+                met = model.metabolites.get_by_id(metID)
+            else:
+                met = newMets.setdefault(metID, cobra.Metabolite(metID))
+            mets[met] = coef
+        addRxn.add_metabolites(mets)
+        addRxns.append(addRxn)
+    model.add_reactions(addRxns)
+    return model
+
+
+@traced
+def KORxn(model: cobra.Model,
+          rxns2KO: list):
+    """Function for knocking out reactions."""
+    knock_out(model, reactions=rxns2KO)
+
+
+def _restore_genes(genes):
+    for gene in genes:
+        gene._functional = True
+
+
+def _restore_bounds(bounds):
+    for reaction, lb, ub in bounds:
+        reaction._lower_bound, reaction._upper_bound = lb, ub
+        reaction.update_variable_bounds()
+
+
+def set_bounds(model: cobra.Model, bounds: dict):
+    """Set the bounds of many reactions, {reaction or ID: (lb, ub)}.
+
+    Only reactions whose bounds change are updated, and inside a model
+    context all of them are restored by a single undo entry.
+    """
+    changed = []
+    for ID, (lb, ub) in bounds.items():
+        rxn = model.reactions.get_by_id(ID) if isinstance(ID, str) else ID
+        if lb > ub:
+            raise ValueError(f"{rxn.id}: lower bound {lb} must not be larger "
+                             f"than upper bound {ub}")
+        if (rxn._lower_bound, rxn._upper_bound) == (lb, ub):
+            continue
+        changed.append((rxn, rxn._lower_bound, rxn._upper_bound))
+        rxn._lower_bound, rxn._upper_bound = lb, ub
+        rxn.update_variable_bounds()
+    context = get_context(model)
+    if context and changed:
+        context(partial(_restore_bounds, changed))
+    return [rxn.id for rxn, _, _ in changed]
+
+
+def knock_out(model: cobra.Model, reactions=(), genes=()):
+    """Knock out reactions and genes together.
+
+    Genes are marked non-functional first and the GPR of every reaction
+    they touch is evaluated once against the full set of knocked-out genes.
+    The bounds are set with set_bounds, and inside a model context the
+    knock-out is undone with the context. Returns the IDs of the reactions
+    knocked out.
+    """
+    genes = [model.genes.get_by_id(g) if isinstance(g, str) else g for g in genes]
+    closing = {}
+    for ID in reactions:
+        rxn = model.reactions.get_by_id(ID) if isinstance(ID, str) else ID
+        closing[rxn.id] = rxn
+    genes = [g for g in genes if g._functional]
+    for gene in genes:
+        gene._functional = False
+    for gene in genes:
+        for rxn in gene.reactions:
+            if rxn.id not in closing and not rxn.functional:
+                closing[rxn.id] = rxn
+
+    set_bounds(model, {r: (0, 0) for r in closing.values()})
+    context = get_context(model)
+    if context and genes:
+        context(partial(_restore_genes, genes))
+    return list(closing)
+
+
+def change_objective(model, product):
+    """change objective function"""
+    if product in ['accoa_c', 'succoa_c']:
+        rxn = cobra.Reaction(id=f"EX_{product}", lower_bound=-1000, upper_bound=1000)
+        model.add_reactions([rxn])
+        rxn.add_metabolites({product: -1, 'coa_c': 1})
+    elif product in ['g6p_c', 'f6p_c', 'e4p_c', 'r5p_c', 'g3p_c', '3pg_c', 'pep_c']:
+        rxn = cobra.Reaction(id=f"EX_{product}", lower_bound=-1000, upper_bound=1000)
+        model.add_reactions([rxn])
+        rxn.add_metabolites({product: -1, 'pi_c': 1})
+    elif f"EX_{product}" not in model.reactions:
+        rxn = cobra.Reaction(id=f"EX_{product}", lower_bound=-1000, upper_bound=1000)
+        model.add_reactions([rxn])
+        rxn.add_metabolites({product: -1})
+    model.objective = f"EX_{product}"
+
+
+def add_precursor_drains(model: cobra.Model, precursors):
+    """Install closed EX_{precursor} drains for all precursors at once.
+
+    Drains are built as in change_objective, but closed while they are not
+    the objective. A precursor with an EX_{precursor} reaction in the model
+    uses it with its own bounds, as in change_objective, and 'biomass' maps
+    to the current objective reaction. Returns {precursor: (reaction, open
+    bounds)} for set_precursor_objective; the bounds are None for the
+    reactions that were already in the model.
+    """
+    biomass = list(linear_reaction_coefficients(model))
+    drains, addRxns = {}, []
+    for product in precursors:
+        if product == 'biomass':
+            drains[product] = (biomass[0], None)
+            continue
+        ID = f"EX_{product}"
+        if ID in model.reactions:
+            drains[product] = (model.reactions.get_by_id(ID), None)
+            continue
+        rxn = cobra.Reaction(id=ID, lower_bound=-1000, upper_bound=1000)
+        mets = {model.metabolites.get_by_id(product): -1}
+        if product in ['accoa_c', 'succoa_c']:
+            mets[model.metabolites.get_by_id('coa_c')] = 1
+        elif product in ['g6p_c', 'f6p_c', 'e4p_c', 'r5p_c', 'g3p_c', '3pg_c', 'pep_c']:
+            mets[model.metabolites.get_by_id('pi_c')] = 1
+        rxn.add_metabolites(mets)
+        # the bounds of change_objective, restored while the drain is the objective
+        drains[product] = (rxn, rxn.bounds)
+        rxn.bounds = (0, 0)
+        addRxns.append(rxn)
+    model.add_reactions(addRxns)
+    return drains
+
+
+def set_precursor_objective(model: cobra.Model, drains, product):
+    """Maximize one precursor drain installed by add_precursor_drains.
+
+    Only objective coefficients and the bounds of the new drains change,
+    the solver problem is not rebuilt.
+    """
+    coefs = {}
+    for p, (rxn, bounds) in drains.items():
+        c = 1 if p == product else 0
+        coefs[rxn.forward_variable] = c
+        coefs[rxn.reverse_variable] = -c
+        if bounds is not None:
+            bounds = bounds if p == product else (0, 0)
+            if rxn.bounds != bounds:
+                rxn.bounds = bounds
+    model.objective.set_linear_coefficients(coefs)
+    model.objective.direction = 'max'
+
+
+_rxn_tables = weakref.WeakKeyDictionary()
+
+
+def reaction_table(model: cobra.Model) -> pd.DataFrame:
+    """Static reaction data (N, ID, name, formula, subsystem) of the model.
+
+    The table is kept per model and rebuilt only when reactions are added,
+    removed or their stoichiometry changes.
+    """
+    rxns = model.reactions
+    key = tuple(
+        (r.id, frozenset((m.id, c) for m, c in r._metabolites.items()))
+        for r in rxns
+    )
+    cached = _rxn_tables.get(model)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    df = pd.DataFrame({
+        'N': np.arange(1, len(rxns) + 1),
+        'RxnID': [r.id for r in rxns],
+        'RxnName': [r.name for r in rxns],
+        'Reaction': [r.reaction for r in rxns],
+        'SubSystem': [r.subsystem for r in rxns],
+    })
+    _rxn_tables[model] = (key, df)
+    return df
+
+
+def flux_table(model: cobra.Model, solution=None) -> pd.DataFrame:
+    """Reaction data, bounds and fluxes in the layout of flux2file.
+
+    Fluxes are taken in one call from `solution`, or from the last solver
+    result when no solution is given.
+    """
+    if solution is None:
+        solution = get_solution(model)
+    df = reaction_table(model).copy()
+    df['LowerBound'] = [r.lower_bound for r in model.reactions]
+    df['UpperBound'] = [r.upper_bound for r in model.reactions]
+    flux = solution.fluxes.reindex(df['RxnID']).values
+    df['Flux-core'] = flux
+    df['abs(Flux)'] = np.abs(flux)
+    return df
+
+
+def _has_arrow(fmt) -> bool:
+    """Whether pandas can write fmt; parquet and feather need pyarrow."""
+    engines = {'parquet': ('pyarrow', 'fastparquet'), 'feather': ('pyarrow',)}
+    return any(importlib.util.find_spec(name) is not None
+               for name in engines.get(fmt, ('pandas',)))
+
+
+@traced
+def flux2file(model: cobra.Model,
+              psw, product, output_dir='tmp',
+              fmt='xlsx', solution=None):
+    """Function of exporting flux data.
+
+    fmt is 'xlsx' (default), 'parquet' or 'feather' (Arrow IPC); the
+    Excel writer is much slower, so large batches of files are better
+    written as parquet. Parquet needs pyarrow or fastparquet, feather
+    pyarrow; without them the file is written as xlsx, with a warning.
+    """
+    if not _has_arrow(fmt):
+        warnings.warn(f'{fmt} needs pyarrow (pip install pyarrow); '
+                      f'writing {psw}_{product} as xlsx instead')
+        fmt = 'xlsx'
+    df = flux_table(model, solution)
+    if not os.path.exists(output_dir):
+        os.mkdir(output_dir)
+    filepath = os.path.join(output_dir, '{}_{}.{}'.format(psw, product, fmt))
+    with span(f'write_{fmt}', 'export'):
+        if fmt == 'parquet':
+            df.to_parquet(filepath, index=False)
+        elif fmt == 'feather':
+            df.to_feather(filepath)
+        elif fmt == 'xlsx':
+            df.to_excel(filepath, index=False)
+        else:
+            raise ValueError(f"Unknown flux file format '{fmt}'")
+
+
+@traced
+def prodFBA(model, psw, product, saveif, keep_solution=False):
+    solution = model.optimize()
+    # export results
+    if saveif:
+        flux2file(model, psw, product, solution=solution)
+    value = round(solution.objective_value, 3)
+    # yield_matrix also hands the fluxes to a FluxStore
+    if keep_solution:
+        return value, solution
+    return value
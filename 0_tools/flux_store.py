@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Append-only store of flux vectors from many scenarios.
+
+A store is a directory with
+ * reactions.csv - reaction data, one line per reaction, written once;
+ * scenarios.csv - one line per stored flux vector with its scenario keys;
+ * blocks.csv and fluxes_<k>.f8 - raw float64 matrices (scenarios x
+   reactions) that are only appended to and read back memory-mapped.
+A new block is started when a flux vector has more reactions than the
+current block has columns for, so earlier rows never need rewriting.
+"""
+import os
+import csv
+import numpy as np
+import pandas as pd
+import cobra
+
+from fba_utils import reaction_table
+
+KEYS = ['pathway', 'precursor', 'knockouts', 'variant', 'medium', 'growth_rate',
+        'label']
+_SCENARIO_COLUMNS = ['row', 'block', 'block_row'] + KEYS + ['objective', 'status']
+_REACTION_COLUMNS = ['RxnID', 'RxnName', 'Reaction', 'SubSystem']
+SPARE_COLUMNS = 256
+
+
+class FluxStore:
+    """Flux vectors indexed by pathway, precursor, knock-outs, variant, medium and growth rate."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        for name, header in (('reactions.csv', _REACTION_COLUMNS),
+                             ('scenarios.csv', _SCENARIO_COLUMNS),
+                             ('blocks.csv', ['block', 'width'])):
+            if not os.path.exists(self._file(name)):
+                self._append_rows(name, [header])
+        self._rxn_index = {ID: i for i, ID in
+                           enumerate(self._read('reactions.csv')['RxnID'])}
+        self._blocks = self._read('blocks.csv')['width'].tolist()
+        scenarios = self._read('scenarios.csv')
+        if list(scenarios.columns) != _SCENARIO_COLUMNS:
+            raise ValueError(f'{path} was written with the scenario keys '
+                             f'{list(scenarios.columns)[3:-2]}, not {KEYS}')
+        self._n_rows = len(scenarios)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read(self, name):
+        return pd.read_csv(self._file(name), keep_default_na=False,
+                           na_values=[''], dtype={'RxnID': str})
+
+    def _append_rows(self, name, rows):
+        with open(self._file(name), 'a', newline='') as f:
+            csv.writer(f).writerows(rows)
+
+    def _block_rows(self, block):
+        filepath = self._file(f'fluxes_{block}.f8')
+        if not os.path.exists(filepath):
+            return 0
+        return os.path.getsize(filepath) // (8 * self._blocks[block])
+
+    def _add_reactions(self, model, fluxes):
+        new = [ID for ID in fluxes.index if ID not in self._rxn_index]
+        if not new:
+            return
+        table = reaction_table(model).set_index('RxnID') if model is not None else None
+        rows = []
+        for ID in new:
+            self._rxn_index[ID] = len(self._rxn_index)
+            if table is not None and ID in table.index:
+                rows.append([ID] + table.loc[ID, _REACTION_COLUMNS[1:]].tolist())
+            else:
+                rows.append([ID, '', '', ''])
+        self._append_rows('reactions.csv', rows)
+
+    def append(self, fluxes, model: cobra.Model = None,
+               objective=np.nan, status='optimal', **keys):
+        """Append one flux vector with its scenario keys; returns its row.
+
+        fluxes is a Solution or a Series indexed by reaction ID. The model is
+        used to record the data of reactions not yet in the store. Scenario
+        keys are those in KEYS; knockouts may be given as a list.
+        """
+        if isinstance(fluxes, cobra.Solution):
+            objective, status = fluxes.objective_value, fluxes.status
+            fluxes = fluxes.fluxes
+        unknown = set(keys).difference(KEYS)
+        if unknown:
+            raise ValueError(f"Unknown scenario keys: {', '.join(sorted(unknown))}")
+        self._add_reactions(model, fluxes)
+
+        width = len(self._rxn_index)
+        if not self._blocks or self._blocks[-1] < width:
+            # spare columns let later pathways add reactions to the same block
+            self._blocks.append(width + SPARE_COLUMNS)
+            self._append_rows('blocks.csv', [[len(self._blocks) - 1, self._blocks[-1]]])
+        block = len(self._blocks) - 1
+        vector = np.full(self._blocks[block], np.nan)
+        vector[[self._rxn_index[ID] for ID in fluxes.index]] = fluxes.values
+        block_row = self._block_rows(block)
+        with open(self._file(f'fluxes_{block}.f8'), 'ab') as f:
+            f.write(vector.astype('<f8').tobytes())
+
+        knockouts = keys.get('knockouts', '')
+        if not isinstance(knockouts, str):
+            keys['knockouts'] = ';'.join(knockouts)
+        row = self._n_rows
+        self._append_rows('scenarios.csv', [
+            [row, block, block_row] + [keys.get(k, '') for k in KEYS]
+            + [objective, status]
+        ])
+        self._n_rows += 1
+        return row
+
+    def reactions(self) -> pd.DataFrame:
+        """Reaction data in the column order of the flux matrices."""
+        return self._read('reactions.csv')
+
+    def scenarios(self, **keys) -> pd.DataFrame:
+        """Scenario table, filtered by keys (a value or a list of values)."""
+        df = self._read('scenarios.csv').set_index('row')
+        for key, value in keys.items():
+            if isinstance(value, (list, tuple, set)):
+                df = df[df[key].isin(value)]
+            else:
+                df = df[df[key] == value]
+        return df
+
+    def _memmap(self, block):
+        if not self._block_rows(block):
+            return np.empty((0, self._blocks[block]))
+        return np.memmap(self._file(f'fluxes_{block}.f8'), dtype='<f8', mode='r',
+                         shape=(self._block_rows(block), self._blocks[block]))
+
+    def column(self, rxnID, **keys) -> pd.Series:
+        """Flux of one reaction across the scenarios selected by keys."""
+        sc = self.scenarios(**keys)
+        j = self._rxn_index[rxnID]
+        values = np.full(len(sc), np.nan)
+        for block, rows in sc.groupby('block').indices.items():
+            if j < self._blocks[block]:
+                values[rows] = self._memmap(block)[sc['block_row'].values[rows], j]
+        return pd.Series(values, index=sc.index, name=rxnID)
+
+    def fluxes(self, **keys) -> pd.DataFrame:
+        """Flux matrix (scenarios x reactions) of the scenarios selected by keys."""
+        sc = self.scenarios(**keys)
+        ids = list(self._rxn_index)
+        values = np.full((len(sc), len(ids)), np.nan)
+        for block, rows in sc.groupby('block').indices.items():
+            width = min(self._blocks[block], len(ids))
+            block_rows = sc['block_row'].values[rows]
+            values[rows, :width] = self._memmap(block)[block_rows, :width]
+        return pd.DataFrame(values, index=sc.index, columns=ids)
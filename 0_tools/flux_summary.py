@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Uptake and secretion summary of a flux vector, without re-solving.
+
+cobra's model.summary() solves a new pFBA, copies the boundary reactions
+and their metabolites and rebuilds its tables on every call. Here the
+boundary reactions, the coefficient and the carbon number of their
+metabolite are indexed once per model, and a summary is a few vector
+operations on the fluxes of a solution that is already at hand. Printing a
+summary gives the tables of model.summary(); with top only the largest
+uptakes and secretions are kept. With a store, nothing is formatted: the
+boundary fluxes are appended to the FluxStore, from where a row can be
+summarised again with flux_summary(model, store.fluxes(...).loc[row]).
+"""
+import weakref
+import numpy as np
+import pandas as pd
+import cobra
+from cobra.core import get_solution
+
+from medium import composition_matrix
+from flux_store import FluxStore
+from instrument import traced
+
+COLUMNS = ['Metabolite', 'Reaction', 'Flux', 'C-Number', 'C-Flux']
+
+_indexes = weakref.WeakKeyDictionary()
+
+
+def boundary_index(model: cobra.Model) -> pd.DataFrame:
+    """Boundary reactions with the metabolite, its coefficient and carbon number.
+
+    One row per boundary reaction, sorted by ID as in model.summary(). The
+    index is kept per model until reactions, their number of metabolites or
+    metabolite formulas change.
+    """
+    key = (tuple((r.id, len(r._metabolites)) for r in model.reactions),
+           tuple((m.id, m.formula) for m in model.metabolites))
+    cached = _indexes.get(model)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    elements, E = composition_matrix(model)
+    carbon = (E[elements.index('C')].toarray().ravel() if 'C' in elements
+              else np.zeros(len(model.metabolites)))
+    rows = []
+    for rxn in sorted(model.boundary, key=lambda r: r.id):
+        (met, coef), = rxn._metabolites.items()
+        rows.append((rxn.id, met.id, coef,
+                     carbon[model.metabolites.index(met)]))
+    index = pd.DataFrame(rows, columns=['reaction', 'metabolite', 'factor', 'carbon'])
+    _indexes[model] = (key, index)
+    return index
+
+
+class FluxSummary:
+    """Objective, uptake and secretion of one flux vector.
+
+    uptake and secretion are DataFrames with the COLUMNS, C-Flux as the
+    fraction of the carbon taken up or secreted. str() gives the text of
+    model.summary().
+    """
+
+    def __init__(self, objective: dict, objective_value, uptake, secretion):
+        self.objective = objective
+        self.objective_value = objective_value
+        self.uptake = uptake
+        self.secretion = secretion
+
+    def _string_table(self, frame, float_format):
+        return frame.to_string(index=False, formatters={
+            'Flux': f'{{:{float_format}}}'.format,
+            'C-Flux': '{:.2%}'.format,
+        })
+
+    def to_string(self, float_format='.4G') -> str:
+        objective = ' + '.join(f'{coef} {ID}' for ID, coef in self.objective.items())
+        return (f'Objective\n=========\n{objective} = {self.objective_value}\n\n'
+                f'Uptake\n------\n{self._string_table(self.uptake, float_format)}\n\n'
+                f'Secretion\n---------\n{self._string_table(self.secretion, float_format)}\n')
+
+    def __str__(self):
+        return self.to_string()
+
+    def __repr__(self):
+        return self.to_string()
+
+
+def _table(index, flux, selected, top):
+    frame = index.loc[selected, ['metabolite', 'reaction']]
+    frame.columns = COLUMNS[:2]
+    frame['Flux'] = flux[selected]
+    frame['C-Number'] = index['carbon'].values[selected]
+    c_flux = frame['C-Number'] * frame['Flux'].abs()
+    total = c_flux.sum()
+    frame['C-Flux'] = c_flux / total if total > 0 else c_flux
+    if top is not None:
+        frame = frame.iloc[np.lexsort((-frame['Flux'].abs().values,
+                                       -frame['C-Flux'].values))[:top]]
+    return frame.reset_index(drop=True)
+
+
+@traced('flux_summary', 'summary')
+def flux_summary(model: cobra.Model, solution=None, top=None, threshold=None,
+                 store=None, **keys):
+    """Summary of the exchange fluxes of solution, as model.summary().
+
+    solution is a Solution or a Series of fluxes by reaction ID; without
+    one, the fluxes of the boundary and objective reactions are read from
+    the last solve of the model, which is not solved again. top keeps the
+    top uptakes and secretions by carbon flux, then by flux; the C-Flux
+    fractions stay those of all fluxes above threshold (default the model
+    tolerance). With store (a FluxStore or its directory) the summary is not
+    built: the boundary and objective fluxes are appended to the store with
+    the scenario keys, and the row is returned.
+    """
+    index = boundary_index(model)
+    # the forward variables of the objective; linear_reaction_coefficients
+    # looks at every reaction
+    coefficients = {
+        v.name: float(c) for v, c in
+        model.solver.objective.expression.as_coefficients_dict().items()
+        if getattr(v, 'name', None) in model.reactions}
+    if solution is None:
+        reactions = [model.reactions.get_by_id(ID) for ID in
+                     dict.fromkeys(list(index['reaction']) + list(coefficients))]
+        solution = get_solution(model, reactions=reactions)
+    if isinstance(solution, cobra.Solution):
+        objective, status = solution.objective_value, solution.status
+        fluxes = solution.fluxes
+    else:
+        objective, status = np.nan, 'optimal'
+        fluxes = solution
+    if coefficients:
+        objective = sum(fluxes[ID] * coef for ID, coef in coefficients.items())
+
+    if store is not None:
+        if not isinstance(store, FluxStore):
+            store = FluxStore(store)
+        IDs = list(dict.fromkeys(list(index['reaction']) + list(coefficients)))
+        return store.append(fluxes.reindex(IDs), model, objective=objective,
+                            status=status, **keys)
+
+    flux = fluxes.reindex(index['reaction']).to_numpy() * index['factor'].values
+    threshold = max(threshold or 0, model.tolerance)
+    flux[np.abs(flux) < threshold] = 0
+    # zero instead of negative zero for display
+    flux += 0
+    return FluxSummary(coefficients, objective,
+                       _table(index, flux, flux > 0, top),
+                       _table(index, flux, flux < 0, top))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Cached loader of the curated iML1515 model.
+
+The curation follows 0_ecoli_models/ReadMe.md. The curated model is pickled
+once into 0_ecoli_models/.cache, keyed by the hash of the JSON file, the
+patches, the knock-outs and the solver, so later runs skip JSON parsing
+and rebuilding the solver problem. load_snapshot keeps the array snapshot
+of the same curated model (see snapshot.py) next to it.
+"""
+import os
+import hashlib
+import pickle
+import optlang
+import cobra
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '..', '0_ecoli_models')
+MODEL_FILE = os.path.join(MODEL_DIR, 'iML1515.json')
+CACHE_DIR = os.path.join(MODEL_DIR, '.cache')
+
+# Corrections of iML1515, see 0_ecoli_models/ReadMe.md
+PATCHES = {
+    # transhydrogenase translocates one proton instead of two
+    'THD2pp': ('add_metabolites', {'h_p': 1, 'h_c': -1}),
+    # homoserine dehydrogenase irreversible, towards homoserine
+    'HSDy': ('bounds', (-1000, 0)),
+    # methylmalonyl-CoA mutase reversible
+    'MMM': ('bounds', (-1000, 1000)),
+    # isocitrate lyase reversible
+    'ICL': ('bounds', (-1000, 1000)),
+    # tryptophanase irreversible, towards tryptophan degradation
+    'TRPAS2': ('bounds', (0, 1000)),
+}
+
+_models = {}
+
+
+def apply_patches(model: cobra.Model, patches):
+    """Apply the named corrections of PATCHES to the model."""
+    for ID in patches:
+        kind, value = PATCHES[ID]
+        reaction = model.reactions.get_by_id(ID)
+        if kind == 'add_metabolites':
+            reaction.add_metabolites(value)
+        elif kind == 'bounds':
+            reaction.bounds = value
+        else:
+            raise ValueError(f"Unknown patch type '{kind}' for {ID}")
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(model_file, patches, knockouts):
+    """Key of a curated model: content of the JSON, patches and knock-outs.
+
+    The cobra and optlang versions and the configured solver are part of
+    the key, as the pickle holds the solver problem.
+    """
+    spec = repr((
+        _file_hash(model_file),
+        [(ID, PATCHES[ID]) for ID in patches],
+        list(knockouts),
+        cobra.__version__,
+        optlang.__version__,
+        cobra.Configuration().solver.__name__,
+    ))
+    return hashlib.sha256(spec.encode()).hexdigest()[:16]
+
+
+def build_model(model_file=MODEL_FILE,
+                patches=('THD2pp', 'HSDy'),
+                knockouts=()):
+    """Load the JSON model and apply patches and knock-outs, without caching."""
+    model = cobra.io.load_json_model(model_file)
+    apply_patches(model, patches)
+    for ID in knockouts:
+        model.reactions.get_by_id(ID).knock_out()
+    return model
+
+
+def load_model(model_file=MODEL_FILE,
+               patches=('THD2pp', 'HSDy'),
+               knockouts=(),
+               cache_dir=CACHE_DIR,
+               copy=True) -> cobra.Model:
+    """Return the curated model, built once and then read from the cache.
+
+    With copy=False the model kept in memory is returned as is, which is
+    fast but shared between callers; use it as a base inside `with model:`.
+    """
+    key = cache_key(model_file, patches, knockouts)
+    if key not in _models:
+        cache_file = os.path.join(cache_dir, f'{key}.pkl')
+        if os.path.exists(cache_file):
+            with open(cache_file, 'rb') as f:
+                data = f.read()
+        else:
+            model = build_model(model_file, patches, knockouts)
+            data = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f'{cache_file}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, cache_file)
+        _models[key] = [data, None]
+    entry = _models[key]
+    if not copy:
+        if entry[1] is None:
+            entry[1] = pickle.loads(entry[0])
+        return entry[1]
+    return pickle.loads(entry[0])
+
+
+def load_snapshot(model_file=MODEL_FILE,
+                  patches=('THD2pp', 'HSDy'),
+                  knockouts=(),
+                  cache_dir=CACHE_DIR) -> 'Snapshot':
+    """Return the memory-mapped array snapshot of the curated model.
+
+    The snapshot is compiled once into cache_dir, under the key of the
+    pickled model, and opened without loading the model afterwards.
+    """
+    # scipy and the composition matrix only when a snapshot is asked for
+    from snapshot import Snapshot, compile_snapshot
+    key = cache_key(model_file, patches, knockouts)
+    path = os.path.join(cache_dir, f'{key}.snapshot')
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        model = load_model(model_file, patches, knockouts, cache_dir, copy=False)
+        return compile_snapshot(model, path)
+    return Snapshot(path)
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Opt-in timing of the parse, build, solve and export phases of a script.
+
+With the environment variable TRACE set to a file name, e.g.
+`TRACE=trace.json python EuMP_FBA.py`, the helpers (AddRxn, KORxn, pfba,
+prodFBA, flux2file, MDF) and the phases inside them are timed as nested
+spans:
+ * parse - reading NewRxns4Full_*.csv files (read_rxn_table);
+ * build - cobra's add_reactions and the optlang problem updates that
+   flush added or removed variables and constraints;
+ * solve - optlang solves (LP and MILP) and cvxpy solves (MDF);
+ * summary - model.summary() and flux_summary;
+ * export - the file writers of flux2file.
+Each span carries the number of solves and problem updates made inside it.
+Spans are grouped by scenario, the script name unless set with
+`with scenario(name):`. At exit the trace is written as Chrome trace-event
+JSON (open in chrome://tracing or Perfetto), or as a flat CSV if the file
+name ends with .csv. Without TRACE, or before enable(), the hooks only
+call through, and results are the same either way. Spans of process pool
+workers are not collected; use processes=1 for a full trace.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import contextlib
+import multiprocessing
+import pandas as pd
+
+COUNTERS = ['solves', 'updates', 'cvxpy_solves']
+_CSV_COLUMNS = ['scenario', 'name', 'cat', 'depth', 'start', 'duration'] + COUNTERS
+
+_trace = None
+
+
+class _Trace:
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.t0 = time.perf_counter()
+        self.scenario = os.path.splitext(os.path.basename(sys.argv[0] or ''))[0] or 'main'
+        self.depth = 0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.events = []
+
+
+def enabled() -> bool:
+    """Whether spans are being recorded."""
+    return _trace is not None
+
+
+@contextlib.contextmanager
+def span(name, cat='helper'):
+    """Time the enclosed block as one span of the current scenario."""
+    if _trace is None:
+        yield
+        return
+    trace = _trace
+    counters = dict(trace.counters)
+    trace.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        trace.depth -= 1
+        trace.events.append({
+            'scenario': trace.scenario, 'name': name, 'cat': cat,
+            'depth': trace.depth, 'start': start - trace.t0,
+            'duration': end - start,
+            **{k: trace.counters[k] - counters[k] for k in COUNTERS},
+        })
+
+
+def traced(name=None, cat='helper'):
+    """Decorator recording every call of a function as a span."""
+    def decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _trace is None:
+                return func(*args, **kwargs)
+            with span(label, cat):
+                return func(*args, **kwargs)
+        return wrapper
+    if callable(name):
+        func, name = name, None
+        return decorate(func)
+    return decorate
+
+
+@contextlib.contextmanager
+def scenario(name):
+    """Attribute the spans of the enclosed block to the scenario name."""
+    if _trace is None:
+        yield
+        return
+    previous, _trace.scenario = _trace.scenario, str(name)
+    try:
+        yield
+    finally:
+        _trace.scenario = previous
+
+
+def _count(key, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _trace is not None:
+            _trace.counters[key] += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _patch_libraries():
+    """Hooks in optlang, cobra and cvxpy, installed once."""
+    import optlang.interface
+    import cobra
+    Model = optlang.interface.Model
+    if getattr(Model.optimize, '_instrumented', False):
+        return
+    update = Model.update
+
+    def counted_update(self, *args, **kwargs):
+        if _trace is None:
+            return update(self, *args, **kwargs)
+        # private to optlang; without it every update is counted
+        pending = getattr(self, '_pending_modifications', None)
+        if pending is not None and not any(
+                getattr(pending, k, True) for k in ('add_var', 'add_constr',
+                                                    'add_constr_sloppy', 'rm_var',
+                                                    'rm_constr')):
+            return update(self, *args, **kwargs)
+        with span('update', 'build'):
+            _trace.counters['updates'] += 1
+            return update(self, *args, **kwargs)
+
+    Model.update = functools.wraps(update)(counted_update)
+    Model.optimize = traced('solve', 'solve')(_count('solves', Model.optimize))
+    Model.optimize._instrumented = True
+    cobra.Model.add_reactions = traced('add_reactions', 'build')(cobra.Model.add_reactions)
+    cobra.Model.summary = traced('summary', 'summary')(cobra.Model.summary)
+    try:
+        import cvxpy
+    except ImportError:
+        return
+    cvxpy.Problem.solve = traced('cvxpy_solve', 'solve')(
+        _count('cvxpy_solves', cvxpy.Problem.solve))
+
+
+def enable(path=None):
+    """Start recording spans; the trace is written to path at exit."""
+    global _trace
+    _patch_libraries()
+    _trace = _Trace(path)
+    if path:
+        atexit.register(_write_at_exit)
+
+
+def disable():
+    """Stop recording and return the recorded spans as a DataFrame."""
+    global _trace
+    df = events()
+    _trace = None
+    return df
+
+
+def _write_at_exit():
+    # only the process that enabled the trace writes it
+    if _trace is not None and _trace.path and _trace.pid == os.getpid():
+        write_trace(_trace.path)
+
+
+def events() -> pd.DataFrame:
+    """The recorded spans, one row each, times in seconds."""
+    rows = [] if _trace is None else _trace.events
+    return pd.DataFrame(rows, columns=_CSV_COLUMNS)
+
+
+def summary() -> pd.DataFrame:
+    """Calls, total time and counts per scenario and span name."""
+    df = events()
+    grouped = df.groupby(['scenario', 'cat', 'name'], sort=False)
+    return grouped.agg(calls=('duration', 'size'), time=('duration', 'sum'),
+                       **{k: (k, 'sum') for k in COUNTERS})
+
+
+def write_trace(path):
+    """Write the spans as Chrome trace-event JSON, or CSV for a .csv path."""
+    df = events()
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+        return
+    scenarios = list(dict.fromkeys(df['scenario']))
+    trace_events = [
+        {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid,
+         'args': {'name': name}} for tid, name in enumerate(scenarios)]
+    tids = {name: tid for tid, name in enumerate(scenarios)}
+    for row in df.itertuples(index=False):
+        trace_events.append({
+            'name': row.name, 'cat': row.cat, 'ph': 'X', 'pid': 1,
+            'tid': tids[row.scenario], 'ts': row.start * 1e6,
+            'dur': row.duration * 1e6,
+            'args': {k: int(getattr(row, k)) for k in COUNTERS},
+        })
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+
+# the trace of the main process only, not of pool workers that import this
+if os.environ.get('TRACE') and multiprocessing.parent_process() is None:
+    enable(os.environ['TRACE'])
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Screening of reaction knock-outs that make growth depend on a substrate.
+
+A knock-out set is a hit when the strain grows (at least `min_growth`) with
+the substrate uptake open and cannot grow with it closed. Sets are built
+level by level: a set is only extended by reactions that carry flux in the
+substrate-free optimum of that set, as knocking out any other reaction
+leaves that optimum unchanged, and never by reactions essential for growth
+with the substrate. Supersets of hits are not tested. Hits are ranked by
+the dependency slope of `req_calc`, the minimal uptake per biomass.
+"""
+import math
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import cobra
+
+from fba_utils import knock_out
+from sweep import BIOMASS, growth_sweep, dependency_slope
+from parallel import pool_size
+
+_worker = {}
+
+
+def _init_worker(data, uptake, uptake_lb, biomass, min_growth, tol, candidates):
+    model = pickle.loads(data) if isinstance(data, bytes) else data
+    model.__enter__()
+    model.objective = biomass
+    model.objective.direction = 'max'
+    _worker.update(
+        model=model, uptake=model.reactions.get_by_id(uptake),
+        biomass=biomass, uptake_lb=uptake_lb, min_growth=min_growth, tol=tol,
+        candidates=[(ID, model.reactions.get_by_id(ID).reverse_id)
+                    for ID in candidates],
+    )
+
+
+def _close_worker():
+    _worker['model'].__exit__(None, None, None)
+    _worker.clear()
+
+
+def _support(model):
+    """Candidate reactions carrying flux in the last solution."""
+    primals = model.solver.primal_values
+    tol = _worker['tol']
+    return [ID for ID, reverse_id in _worker['candidates']
+            if abs(primals[ID] - primals[reverse_id]) > tol]
+
+
+def _evaluate(ko):
+    """Growth with and without the substrate, and the substrate-free support."""
+    model, uptake = _worker['model'], _worker['uptake']
+    with model:
+        knock_out(model, reactions=ko)
+        uptake.lower_bound = _worker['uptake_lb']
+        growth = model.slim_optimize(error_value=0.0)
+        if growth < _worker['min_growth']:
+            return growth, np.nan, None
+        uptake.lower_bound = 0
+        growth_without = model.slim_optimize(error_value=0.0)
+        if growth_without <= _worker['tol']:
+            return growth, growth_without, None
+        return growth, growth_without, _support(model)
+
+
+def _slope(ko, growth_rates):
+    model, uptake = _worker['model'], _worker['uptake']
+    with model:
+        knock_out(model, reactions=ko)
+        uptake.lower_bound = _worker['uptake_lb']
+        sweep = growth_sweep(model, uptake.id, growth_rates,
+                             biomass=_worker['biomass'])
+    uptakes = sweep[uptake.id].abs()
+    if uptakes.notna().sum() < 2:
+        return np.nan
+    return dependency_slope(sweep['Growth rate'], uptakes)
+
+
+def ko_screen(model: cobra.Model,
+              uptake: str,
+              max_size=2,
+              candidates=None,
+              uptake_lb=-1000,
+              min_growth=0.1,
+              growth_rates=np.arange(0.5, step=0.1),
+              biomass=BIOMASS,
+              tol=1e-6,
+              processes=None) -> pd.DataFrame:
+    """Minimal knock-out sets (up to max_size) that make growth need `uptake`.
+
+    candidates are the reactions that may be knocked out, by default all
+    reactions with a GPR except boundary reactions. The uptake reaction is
+    opened to uptake_lb for growth and closed for the dependency test; the
+    rest of the medium is taken from the model. Returns one row per hit with
+    the knock-outs, the maximal growth rate and the dependency slope
+    (mmol/gCDW) over growth_rates, highest slope first.
+    """
+    if candidates is None:
+        candidates = [r.id for r in model.reactions
+                      if r.genes and not r.boundary]
+    candidates = [ID for ID in candidates if ID != uptake]
+    processes = pool_size(processes, len(candidates))
+    initargs = (model, uptake, uptake_lb, biomass, min_growth, tol, candidates)
+
+    if processes <= 1:
+        _init_worker(*initargs)
+        pool = None
+        run = lambda func, *args: list(map(func, *args))
+    else:
+        data = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                   initargs=(data,) + initargs[1:])
+        run = lambda func, *args: list(pool.map(
+            func, *args,
+            chunksize=max(1, math.ceil(len(args[0]) / (4 * processes)))))
+    try:
+        growth, growth_without, support = (
+            _evaluate([]) if pool is None else pool.submit(_evaluate, []).result())
+        if growth < min_growth:
+            raise ValueError(f'The parent strain does not grow with {uptake}')
+        if support is None:
+            raise ValueError(f'Growth of the parent strain already depends on {uptake}')
+
+        essential, hits, tested = set(), {}, set()
+        level = {(): support}
+        for size in range(1, max_size + 1):
+            # essentiality of the reactions that may extend the current sets
+            new = sorted({ID for sup in level.values() for ID in sup}
+                         - essential - {ID for ko in tested if len(ko) == 1 for ID in ko})
+            singles = [(ID,) for ID in new]
+            for ko, (g, g0, sup) in zip(singles, run(_evaluate, singles)):
+                tested.add(frozenset(ko))
+                if g < min_growth:
+                    essential.add(ko[0])
+                elif sup is None:
+                    hits[ko] = g
+                elif size == 1:
+                    level.setdefault(ko, sup)
+            if size == 1:
+                level = {ko: sup for ko, sup in level.items() if len(ko) == 1}
+                continue
+
+            sets = []
+            for ko, sup in level.items():
+                for ID in sup:
+                    if ID in essential or ID in ko:
+                        continue
+                    new_ko = frozenset(ko + (ID,))
+                    if new_ko in tested or any(set(h) <= new_ko for h in hits):
+                        continue
+                    tested.add(new_ko)
+                    sets.append(tuple(sorted(new_ko)))
+            level = {}
+            for ko, (g, g0, sup) in zip(sets, run(_evaluate, sets)):
+                if g < min_growth:
+                    continue
+                if sup is None:
+                    hits[ko] = g
+                else:
+                    level[ko] = sup
+
+        kos = list(hits)
+        slopes = run(_slope, kos, [list(growth_rates)] * len(kos))
+    finally:
+        if pool is None:
+            _close_worker()
+        else:
+            pool.shutdown()
+
+    df = pd.DataFrame({
+        'Knockouts': kos,
+        'Size': [len(ko) for ko in kos],
+        'Growth rate': [hits[ko] for ko in kos],
+        'Slope': slopes,
+    })
+    return df.sort_values('Slope', ascending=False, ignore_index=True)
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""Batch MDF analysis over concentration bounds.
+
+The standard ΔG'° of a ThermodynamicModel are estimated once and the
+pathway is reduced to plain arrays (see mdf_arrays). The MDF problem is then
+built once per pathway with the concentration bounds as cvxpy parameters,
+so a sweep point only updates the bound vector and re-solves.
+
+Without the uncertainty of the ΔG'° the MDF problem is a linear program and
+the MDF piecewise linear in the ln of a concentration bound; mdf_parametric
+traces it exactly, with the breakpoints and the bottleneck reactions of
+every segment, from a few solves.
+"""
+import itertools
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import cvxpy as cp
+from scipy import stats
+from scipy.optimize import linprog
+
+from parallel import pool_size
+
+
+def mdf_arrays(model) -> dict:
+    """Arrays of a ThermodynamicModel needed to solve its MDF problem.
+
+    The standard ΔG'° are those of the model; update_standard_dgs() is
+    not called again.
+    """
+    dg_sigma = model.dg_sigma
+    return {
+        'compounds': list(model.S.index),
+        'reactions': list(model.S.columns),
+        'S': np.asarray(model.S.values, dtype=float),
+        'dg0': np.asarray(model.standard_dg_primes.m_as('kJ/mol'), dtype=float),
+        'dg_sigma': None if dg_sigma is None else np.asarray(dg_sigma.m_as('kJ/mol')),
+        'dg_confidence': float(model.dg_confidence),
+        'directions': np.diag(model.I_dir),
+        'ln_lb': np.asarray(model.ln_conc_lb, dtype=float),
+        'ln_ub': np.asarray(model.ln_conc_ub, dtype=float),
+        'RT': float(model.comp_contrib.RT.m_as('kJ/mol')),
+    }
+
+
+def _mdf_problem(arrays, ratios=()):
+    """MDF problem with the ln-concentration bounds as parameters."""
+    S, directions = arrays['S'], arrays['directions']
+    Nc = S.shape[0]
+    ln_conc = cp.Variable(Nc, name='log concentrations')
+    B = cp.Variable(name='minimum driving force')
+    ln_lb = cp.Parameter(Nc, name='ln_lb')
+    ln_ub = cp.Parameter(Nc, name='ln_ub')
+
+    dg_prime = arrays['dg0'] + arrays['RT'] * S.T @ ln_conc
+    constraints = [ln_conc >= ln_lb, ln_conc <= ln_ub]
+    dg_sigma = arrays['dg_sigma']
+    if dg_sigma is not None and arrays['dg_confidence'] > 0:
+        Nq = dg_sigma.shape[1]
+        y = cp.Variable(Nq, name='covariance eigenvalues')
+        constraints.append(
+            cp.norm2(y) <= stats.chi2.ppf(arrays['dg_confidence'], Nq) ** 0.5)
+        dg_prime = dg_prime + dg_sigma @ y
+    active = np.flatnonzero(directions)
+    constraints.append(
+        cp.multiply(directions[active], dg_prime[active]) <= -B)
+
+    ratio_params = []
+    for a, b in ratios:
+        if a not in arrays['compounds'] or b not in arrays['compounds']:
+            ratio_params.append(None)
+            continue
+        r = cp.Parameter(name=f'ln_{a}_{b}')
+        i, j = arrays['compounds'].index(a), arrays['compounds'].index(b)
+        constraints.append(ln_conc[i] - ln_conc[j] == r)
+        ratio_params.append(r)
+
+    problem = cp.Problem(cp.Maximize(B), constraints)
+    return problem, B, ln_lb, ln_ub, ratio_params
+
+
+def _sweep_pathway(arrays, axes, solver=None):
+    """MDF at every point of the grid spanned by the axes."""
+    ratios = [target for kind, target, _ in axes if kind == 'ratio']
+    problem, B, ln_lb, ln_ub, ratio_params = _mdf_problem(arrays, ratios)
+    compounds = arrays['compounds']
+    scores = []
+    for point in itertools.product(*(values for _, _, values in axes)):
+        lb, ub = arrays['ln_lb'].copy(), arrays['ln_ub'].copy()
+        r = iter(ratio_params)
+        for (kind, target, _), value in zip(axes, point):
+            if kind == 'ratio':
+                param = next(r)
+                if param is None:
+                    continue
+                # the bounds of the numerator follow those of the denominator
+                i, j = compounds.index(target[0]), compounds.index(target[1])
+                param.value = np.log(value)
+                lb[i], ub[i] = lb[j] + param.value, ub[j] + param.value
+            elif target not in compounds:
+                continue
+            elif kind == 'ub':
+                ub[compounds.index(target)] = np.log(value * 1e-3)
+            else:
+                lb[compounds.index(target)] = np.log(value * 1e-3)
+        ln_lb.value, ln_ub.value = lb, ub
+        try:
+            problem.solve(solver=solver, warm_start=True)
+        except cp.error.SolverError:
+            scores.append(np.nan)
+            continue
+        scores.append(float(B.value) if problem.status == 'optimal' else np.nan)
+    return scores
+
+
+def mdf_sweep(models: dict, axes, solver=None, processes=None) -> pd.DataFrame:
+    """MDF of several pathways over a grid of concentration bounds.
+
+    models maps a pathway name to a ThermodynamicModel (or to mdf_arrays of
+    one). Each axis is (kind, target, values): ('ub', cid, mM values) or
+    ('lb', cid, mM values) for a concentration bound, or
+    ('ratio', (cid_a, cid_b), values) to fix [a]/[b], e.g. NADPH/NADP+,
+    with the bounds of cid_a replaced by those of cid_b times the ratio.
+    An axis on compounds missing from a pathway leaves that pathway as is,
+    with a warning; an axis on compounds missing from all pathways raises
+    ValueError.
+    Returns the MDF (kJ/mol) with one column per pathway and one row per
+    grid point; infeasible points are NaN. Pathways are solved in parallel.
+    """
+    names = list(models)
+    arrays = [m if isinstance(m, dict) else mdf_arrays(m) for m in models.values()]
+    axes = [(kind, target, list(values)) for kind, target, values in axes]
+    for kind, target, _ in axes:
+        cids = target if kind == 'ratio' else (target,)
+        missing = [name for name, a in zip(names, arrays)
+                   if any(cid not in a['compounds'] for cid in cids)]
+        if len(missing) == len(names):
+            raise ValueError(f'{target} is in none of the pathways')
+        for name in missing:
+            warnings.warn(f'{target} is not in {name}; its MDF does not '
+                          f'change along the {kind} axis')
+    processes = pool_size(processes, len(names))
+    if processes <= 1:
+        scores = [_sweep_pathway(a, axes, solver) for a in arrays]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            scores = list(pool.map(_sweep_pathway, arrays,
+                                   [axes] * len(names), [solver] * len(names)))
+
+    index_names = [f'{t}_{k}' if k != 'ratio' else '{}/{}'.format(*t)
+                   for k, t, _ in axes]
+    if len(axes) == 1:
+        index = pd.Index(axes[0][2], name=index_names[0])
+    else:
+        index = pd.MultiIndex.from_product([v for _, _, v in axes],
+                                           names=index_names)
+    return pd.DataFrame(dict(zip(names, scores)), index=index)
+
+
+def _mdf_lp(arrays):
+    """Objective, constraints and bounds of the MDF linear program.
+
+    The variables are the ln-concentrations and B; a row per reaction with
+    a direction, d (ΔG'° + RT S'x) + B <= 0.
+    """
+    if arrays['dg_sigma'] is not None and arrays['dg_confidence'] > 0:
+        raise ValueError("The MDF problem is linear only without the "
+                         "uncertainty of the ΔG'°, set dg_confidence to 0")
+    S, directions = arrays['S'], arrays['directions']
+    active = np.flatnonzero(directions)
+    d = directions[active]
+    A = np.hstack([(d * arrays['RT'])[:, None] * S[:, active].T,
+                   np.ones((len(active), 1))])
+    b = -d * arrays['dg0'][active]
+    c = np.zeros(S.shape[0] + 1)
+    c[-1] = -1
+    return c, A, b, active
+
+
+def _solve_point(lp, arrays, i, kind, t):
+    """MDF, its slope in the ln-bound t and the bottlenecks at t."""
+    c, A, b, active = lp
+    lb, ub = arrays['ln_lb'].copy(), arrays['ln_ub'].copy()
+    if i is not None:
+        (ub if kind == 'ub' else lb)[i] = t
+    bounds = list(zip(lb, ub)) + [(None, None)]
+    # dual simplex, so the duals are those of an optimal basis
+    res = linprog(c, A_ub=A, b_ub=b, bounds=bounds, method='highs-ds')
+    if res.status != 0:
+        raise ValueError(f'MDF problem not solved at ln bound {t}: {res.message}')
+    if i is None:
+        slope = 0.0
+    else:
+        marginals = res.upper.marginals if kind == 'ub' else res.lower.marginals
+        slope = -float(marginals[i])
+    shadow = -res.ineqlin.marginals
+    bottlenecks = [arrays['reactions'][r] for r in active[shadow > 1e-9]]
+    return t, -res.fun, slope, bottlenecks
+
+
+def _parametric_pathway(arrays, cid, kind, lo, hi, tol):
+    """Segments of the MDF over the ln-bound of cid in [lo, hi]."""
+    compounds = arrays['compounds']
+    i = compounds.index(cid) if cid in compounds else None
+    if i is not None:
+        # the bound cannot cross the other bound of the compound
+        if kind == 'ub':
+            lo = max(lo, arrays['ln_lb'][i])
+        else:
+            hi = min(hi, arrays['ln_ub'][i])
+    lp = _mdf_lp(arrays)
+    if hi < lo:
+        return [], 0
+    points = {lo: _solve_point(lp, arrays, i, kind, lo),
+              hi: _solve_point(lp, arrays, i, kind, hi)}
+    # MDF is concave in t: the tangents at the ends of an interval meet
+    # above the curve, unless the interval holds one breakpoint there
+    stack = [(lo, hi)] if hi > lo else []
+    while stack:
+        a, b = stack.pop()
+        _, fa, ga, _ = points[a]
+        _, fb, gb, _ = points[b]
+        if ga - gb <= tol:
+            continue
+        t = (fb - fa + ga * a - gb * b) / (ga - gb)
+        if not a < t < b:
+            continue
+        points[t] = _solve_point(lp, arrays, i, kind, t)
+        if fa + ga * (t - a) - points[t][1] > tol:
+            stack += [(a, t), (t, b)]
+    # the breakpoints are the points where the slope changes
+    ts = sorted(points)
+    knots = [ts[0]] + [t for t0, t, t1 in zip(ts, ts[1:], ts[2:])
+                       if abs((points[t1][1] - points[t][1]) / (t1 - t)
+                              - (points[t][1] - points[t0][1]) / (t - t0)) > tol] + [ts[-1]]
+    segments = []
+    for t0, t1 in zip(knots, knots[1:] or knots):
+        slope = 0.0 if t1 == t0 else (points[t1][1] - points[t0][1]) / (t1 - t0)
+        # the bottlenecks of the basis that is optimal along the segment
+        inner = [p for p in points.values() if t0 <= p[0] <= t1]
+        best = min(inner, key=lambda p: abs(p[2] - slope))
+        segments.append({'ln_start': t0, 'ln_end': t1,
+                         'mdf_start': points[t0][1], 'mdf_end': points[t1][1],
+                         'slope': slope, 'bottlenecks': best[3]})
+    return segments, len(points)
+
+
+def mdf_parametric(models: dict, cid, kind='ub', bounds=(1, 50),
+                   tol=1e-6) -> pd.DataFrame:
+    """Exact MDF of several pathways as a function of a concentration bound.
+
+    The upper (kind='ub') or lower ('lb') bound of the compound cid runs
+    over bounds (mM); the other bounds are those of the model. The MDF is
+    piecewise linear in the ln of the bound, and concave. The segments are
+    found from the MDF and its slope, the dual of the bound, in a few
+    solves of the linear program: the tangents of two solves meet at the
+    only breakpoint between them, or a new solve there splits the interval.
+    Models need dg_confidence = 0, as the uncertainty of the ΔG'° makes the
+    problem non-linear. Returns one row per segment and pathway with its
+    bounds (mM), ln-bounds, the MDF (kJ/mol) at both ends, the slope
+    (kJ/mol per ln unit), the bottleneck reactions (positive shadow price)
+    and the number of solves of the pathway. A compound missing from a
+    pathway gives one flat segment. Bounds that cross the other bound of
+    the compound are left out.
+    """
+    lo, hi = np.log(np.asarray(bounds, dtype=float) * 1e-3)
+    rows = []
+    for name, model in models.items():
+        arrays = model if isinstance(model, dict) else mdf_arrays(model)
+        segments, solves = _parametric_pathway(arrays, cid, kind, lo, hi, tol)
+        for segment in segments:
+            rows.append({'pathway': name, **segment, 'solves': solves})
+    df = pd.DataFrame(rows, columns=['pathway', 'ln_start', 'ln_end', 'mdf_start',
+                                     'mdf_end', 'slope', 'bottlenecks', 'solves'])
+    df.insert(1, 'start', np.exp(df['ln_start']) * 1e3)
+    df.insert(2, 'end', np.exp(df['ln_end']) * 1e3)
+    return df
+
+
+def mdf_from_segments(segments: pd.DataFrame, values) -> pd.DataFrame:
+    """MDF at the bounds values (mM) from the segments of mdf_parametric."""
+    ln = np.log(np.asarray(values, dtype=float) * 1e-3)
+    curves = {}
+    for name, df in segments.groupby('pathway', sort=False):
+        t = np.append(df['ln_start'].values, df['ln_end'].values[-1])
+        f = np.append(df['mdf_start'].values, df['mdf_end'].values[-1])
+        curves[name] = np.where((ln >= t[0] - 1e-12) & (ln <= t[-1] + 1e-12),
+                                np.interp(ln, t, f), np.nan)
+    return pd.DataFrame(curves, index=pd.Index(list(values)))
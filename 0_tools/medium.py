@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Carbon-source media applied in one bulk bounds update.
+
+The elemental composition of all metabolites is parsed once per model into
+a sparse elements x metabolites matrix. The element balance of every
+boundary reaction, as in `check_mass_balance`, is then one sparse product,
+which gives the carbon-containing exchanges a medium has to close.
+"""
+import weakref
+import numpy as np
+import pandas as pd
+from scipy import sparse
+import cobra
+
+from fba_utils import set_bounds
+
+# Open carbon exchanges of the named media; all other carbon exchanges are
+# closed for uptake, (0, 1000)
+MEDIA = {
+    'carbon-free': {'EX_co2_e': (-1000, 1000)},
+    'formaldehyde': {'EX_co2_e': (-1000, 1000), 'EX_fald_e': (-10, 0)},
+    'formate': {'EX_co2_e': (-1000, 1000), 'EX_for_e': (-10, 1000)},
+    'formate+glycine': {'EX_co2_e': (-1000, 1000), 'EX_for_e': (-10, 1000),
+                        'EX_gly_e': (-10, 1000)},
+    'glycerol+FALD': {'EX_co2_e': (-1000, 1000), 'EX_glyc_e': (-10, 1000),
+                      'EX_fald_e': (-10, 0)},
+}
+
+_compositions = weakref.WeakKeyDictionary()
+_carbon = weakref.WeakKeyDictionary()
+
+
+def composition_matrix(model: cobra.Model):
+    """Elements, and the sparse elements x metabolites composition matrix.
+
+    Metabolites without a formula have no elements. The matrix is kept per
+    model and rebuilt only when metabolites or formulas change.
+    """
+    key = tuple((m.id, m.formula) for m in model.metabolites)
+    cached = _compositions.get(model)
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+    elements, rows, cols, counts = {}, [], [], []
+    for j, met in enumerate(model.metabolites):
+        for element, n in met.elements.items():
+            rows.append(elements.setdefault(element, len(elements)))
+            cols.append(j)
+            counts.append(n)
+    E = sparse.csr_matrix((counts, (rows, cols)),
+                          shape=(len(elements), len(model.metabolites)))
+    elements = list(elements)
+    _compositions[model] = (key, elements, E)
+    return elements, E
+
+
+def boundary_balance(model: cobra.Model) -> pd.DataFrame:
+    """Element imbalance (elements x boundary reactions) of the boundary reactions."""
+    elements, E = composition_matrix(model)
+    boundary = model.boundary
+    index = {met: i for i, met in enumerate(model.metabolites)}
+    rows, cols, coefs = [], [], []
+    for j, rxn in enumerate(boundary):
+        for met, coef in rxn.metabolites.items():
+            rows.append(index[met])
+            cols.append(j)
+            coefs.append(coef)
+    S = sparse.csc_matrix((coefs, (rows, cols)),
+                          shape=(len(model.metabolites), len(boundary)))
+    return pd.DataFrame((E @ S).toarray(), index=elements,
+                        columns=[rxn.id for rxn in boundary])
+
+
+def carbon_exchanges(model: cobra.Model) -> list:
+    """IDs of the boundary reactions that carry carbon.
+
+    The result is kept per model until reactions, their number of
+    metabolites or metabolite formulas change.
+    """
+    key = (tuple((r.id, len(r._metabolites)) for r in model.reactions),
+           tuple((m.id, m.formula) for m in model.metabolites))
+    cached = _carbon.get(model)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    balance = boundary_balance(model)
+    if 'C' not in balance.index:
+        carbon = []
+    else:
+        carbon = balance.columns[np.abs(balance.loc['C'].values) > 0].tolist()
+    _carbon[model] = (key, carbon)
+    return carbon
+
+
+def apply_medium(model: cobra.Model, medium) -> list:
+    """Close all carbon uptakes except those of the medium, in one update.
+
+    medium is a name in MEDIA or a {reaction ID: (lb, ub)} dict. Carbon
+    exchanges not in the medium get the bounds (0, 1000). Inside a model
+    context the medium is undone as one change. Returns the IDs of the
+    reactions whose bounds changed.
+    """
+    if isinstance(medium, str):
+        medium = MEDIA[medium]
+    bounds = dict.fromkeys(carbon_exchanges(model), (0.0, 1000))
+    bounds.update(medium)
+    return set_bounds(model, bounds)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Number of worker processes for the process pools of the tools.
+
+Without fork (Windows, macOS, and forkserver), every pool worker imports
+the main script again. The cell scripts start the pools from their
+top-level code, without an `if __name__ == '__main__':` guard, so each
+worker would rerun all cells and start pools of its own, and the run dies
+with a bootstrapping RuntimeError. By default the tasks are then solved in
+the calling process. A script that is safe to import - the calls inside a
+function or below the guard - can ask for a pool with processes=n.
+"""
+import os
+import sys
+import multiprocessing
+
+
+def _reimports_main() -> bool:
+    """Whether pool workers would rerun the top-level code calling us."""
+    # the default of the platform, without fixing it
+    method = (multiprocessing.get_start_method(allow_none=True)
+              or multiprocessing.get_all_start_methods()[0])
+    main = sys.modules.get('__main__')
+    # interactive sessions and notebooks have no script to import again
+    if method == 'fork' or getattr(main, '__file__', None) is None:
+        return False
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_globals is vars(main) and frame.f_code.co_name == '<module>':
+            return True
+        frame = frame.f_back
+    return False
+
+
+def pool_size(processes, tasks) -> int:
+    """Worker processes for tasks; 1 means solving them in this process.
+
+    processes=None uses all CPUs, or 1 when the pool is started from the
+    top-level code of a script and the workers would import it again.
+    """
+    if processes is None and _reimports_main():
+        return 1
+    return max(1, min(processes or os.cpu_count() or 1, tasks))
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Flux variability of selected reactions, e.g. those added for a pathway.
+
+Only the reactions of a NewRxns4Full_*.csv file, a subsystem or a list are
+analysed. The workers keep one model each with the objective fixed to the
+fraction of its optimum, and switch the objective coefficients of the
+target reaction for every solve. A minimum or maximum is not solved for
+when an earlier solution of the worker already reached the bound of the
+reaction, as no feasible flux lies beyond it.
+"""
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import cobra
+from optlang.symbolics import Zero
+
+from fba_utils import read_rxn_table
+from parallel import pool_size
+
+_worker = {}
+
+
+def _init_worker(data, fraction_of_optimum, tol):
+    model = pickle.loads(data) if isinstance(data, bytes) else data
+    optimum = model.slim_optimize(error_value=np.nan)
+    if np.isnan(optimum):
+        raise ValueError('The model is infeasible')
+    # the optimal solution is the first known feasible point; read before
+    # the problem changes, which may drop it
+    primals = model.solver.primal_values
+    model.__enter__()
+    objective = model.objective
+    # as in flux_variability_analysis
+    bound = 'lb' if objective.direction == 'max' else 'ub'
+    model.add_cons_vars(model.problem.Constraint(
+        objective.expression, name='fva_optimum',
+        **{bound: fraction_of_optimum * optimum}))
+    model.objective = model.problem.Objective(Zero, sloppy=True)
+    _worker.update(model=model, tol=tol, primals=primals)
+
+
+def _close_worker():
+    _worker['model'].__exit__(None, None, None)
+    _worker.clear()
+
+
+def _variability(IDs):
+    """Minimal and maximal flux of the reactions, sharing one LP."""
+    model, tol = _worker['model'], _worker['tol']
+    rxns = [model.reactions.get_by_id(ID) for ID in IDs]
+    names = [(r.forward_variable.name, r.reverse_variable.name) for r in rxns]
+    # extreme fluxes of the reactions over all solutions so far
+    seen_min = np.full(len(rxns), np.inf)
+    seen_max = np.full(len(rxns), -np.inf)
+
+    def update(primals):
+        fluxes = np.array([primals[f] - primals[r] for f, r in names])
+        np.minimum(seen_min, fluxes, out=seen_min)
+        np.maximum(seen_max, fluxes, out=seen_max)
+
+    update(_worker['primals'])
+    results = []
+    for i, rxn in enumerate(rxns):
+        coefs = {rxn.forward_variable: 1, rxn.reverse_variable: -1}
+        extremes = []
+        for direction, bound in (('min', rxn.lower_bound), ('max', rxn.upper_bound)):
+            seen = seen_min[i] if direction == 'min' else seen_max[i]
+            if abs(seen - bound) <= tol:
+                # a feasible solution already reaches the bound
+                extremes.append(bound)
+                continue
+            model.solver.objective.set_linear_coefficients(coefs)
+            model.solver.objective.direction = direction
+            value = model.slim_optimize(error_value=np.nan)
+            if not np.isnan(value):
+                update(model.solver.primal_values)
+            extremes.append(value)
+        model.solver.objective.set_linear_coefficients(
+            {rxn.forward_variable: 0, rxn.reverse_variable: 0})
+        results.append(extremes)
+    return results
+
+
+def pathway_reactions(model: cobra.Model, rxn_file=None, subsystem=None,
+                      reactions=()) -> list:
+    """IDs of the model reactions from a reaction file, a subsystem or a list."""
+    IDs = list(reactions)
+    if rxn_file is not None:
+        IDs += [row[0] for row in read_rxn_table(rxn_file)]
+    if subsystem is not None:
+        IDs += [r.id for r in model.reactions if r.subsystem == subsystem]
+    return [ID for ID in dict.fromkeys(IDs) if ID in model.reactions]
+
+
+def pathway_fva(model: cobra.Model,
+                rxn_file=None,
+                subsystem=None,
+                reactions=(),
+                fraction_of_optimum=1.0,
+                tol=1e-9,
+                processes=None) -> pd.DataFrame:
+    """Minimal and maximal fluxes of the pathway reactions.
+
+    The reactions are those of rxn_file (a NewRxns4Full_*.csv file added to
+    the model), of the subsystem and in reactions. The objective of the
+    model is kept at fraction_of_optimum of its optimum. Returns the columns
+    minimum and maximum, as cobra's flux_variability_analysis.
+    """
+    IDs = pathway_reactions(model, rxn_file, subsystem, reactions)
+    if not IDs:
+        raise ValueError('No pathway reactions in the model')
+    processes = pool_size(processes, len(IDs))
+    # a few chunks per process, each solved on one warm LP
+    n = min(len(IDs), 4 * processes)
+    chunks = [IDs[i::n] for i in range(n)]
+
+    if processes <= 1:
+        _init_worker(model, fraction_of_optimum, tol)
+        try:
+            results = list(map(_variability, chunks))
+        finally:
+            _close_worker()
+    else:
+        data = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        with ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_worker,
+                initargs=(data, fraction_of_optimum, tol)) as pool:
+            results = list(pool.map(_variability, chunks))
+
+    df = pd.DataFrame(index=IDs, columns=['minimum', 'maximum'], dtype=float)
+    for chunk, values in zip(chunks, results):
+        df.loc[chunk] = values
+    return df
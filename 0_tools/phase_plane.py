@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Phenotypic phase planes and production envelopes on dense grids.
+
+The flux of each axis reaction is fixed at the grid values, e.g. FALD
+uptake x O2 uptake, and an objective is optimized at every point. A row of
+the grid (all values of the last axis) is solved on one LP, changing only
+the bounds of the last axis reaction, so every solve starts from the basis
+of its neighbour. Values of the last axis outside the feasible interval of
+a row are not solved at all. Rows are spread over a process pool.
+"""
+import math
+import pickle
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cobra
+from optlang.symbolics import Zero
+
+from sweep import BIOMASS
+from parallel import pool_size
+
+_worker = {}
+
+
+def _init_worker(data, axes, objective, directions):
+    model = pickle.loads(data) if isinstance(data, bytes) else data
+    model.__enter__()
+    rxns = [model.reactions.get_by_id(ID) for ID in axes]
+    target = model.reactions.get_by_id(objective)
+    # one objective, switched between the target and the last axis flux
+    variables = [rxns[-1].forward_variable, rxns[-1].reverse_variable,
+                 target.forward_variable, target.reverse_variable]
+    coefs = {
+        'target': dict(zip(variables, (0, 0, 1, -1))),
+        'last': dict(zip(variables, (1, -1, 0, 0))),
+    }
+    model.objective = model.problem.Objective(Zero, sloppy=True)
+    _worker.update(model=model, directions=directions, rxns=rxns, coefs=coefs)
+
+
+def _close_worker():
+    _worker['model'].__exit__(None, None, None)
+    _worker.clear()
+
+
+def _optimize(coefs, direction):
+    model = _worker['model']
+    model.solver.objective.set_linear_coefficients(_worker['coefs'][coefs])
+    model.solver.objective.direction = direction
+    return model.slim_optimize(error_value=np.nan)
+
+
+def _solve_row(fixed, values, tol=1e-9):
+    """Optimum along the last axis with the other axes fixed.
+
+    The feasible values of the last axis form an interval, found with two
+    solves first, so infeasible points are not solved.
+    """
+    model, rxns = _worker['model'], _worker['rxns']
+    directions = _worker['directions']
+    row = np.full((len(directions), len(values)), np.nan)
+    with model:
+        for rxn, v in zip(rxns, fixed):
+            rxn.bounds = (v, v)
+        lo, hi = _optimize('last', 'min'), _optimize('last', 'max')
+        if np.isnan(lo) or np.isnan(hi):
+            return row
+        last = rxns[-1]
+        for j, v in enumerate(values):
+            if v < lo - tol or v > hi + tol:
+                continue
+            last.bounds = (v, v)
+            for k, direction in enumerate(directions):
+                row[k, j] = _optimize('target', direction)
+    return row
+
+
+def _grid(model, axes, objective, directions, processes):
+    IDs = list(axes)
+    values = [np.asarray(axes[ID], dtype=float) for ID in IDs]
+    if not 1 <= len(IDs) <= 3:
+        raise ValueError('Give one to three axis reactions')
+    rows = list(itertools.product(*values[:-1]))
+    last = [values[-1]] * len(rows)
+    processes = pool_size(processes, len(rows))
+
+    if processes <= 1:
+        _init_worker(model, IDs, objective, directions)
+        try:
+            results = list(map(_solve_row, rows, last))
+        finally:
+            _close_worker()
+    else:
+        data = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        chunksize = max(1, math.ceil(len(rows) / (4 * processes)))
+        with ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_worker,
+                initargs=(data, IDs, objective, directions)) as pool:
+            results = list(pool.map(_solve_row, rows, last, chunksize=chunksize))
+
+    shape = tuple(len(v) for v in values)
+    return [np.stack([r[k] for r in results]).reshape(shape)
+            for k in range(len(directions))]
+
+
+def phase_plane(model: cobra.Model,
+                axes: dict,
+                objective=BIOMASS,
+                processes=None) -> np.ndarray:
+    """Maximal objective (growth by default) over a grid of fixed fluxes.
+
+    axes maps one to three reaction IDs to their flux values, e.g.
+    {'EX_fald_e': np.linspace(-20, 0, 50), 'EX_o2_e': np.linspace(-20, 0, 50)}.
+    Returns an array with one dimension per axis, in the order of axes;
+    infeasible points are NaN.
+    """
+    return _grid(model, axes, objective, ('max',), processes)[0]
+
+
+def production_envelope(model: cobra.Model,
+                        axes: dict,
+                        target: str,
+                        processes=None):
+    """Minimal and maximal flux of target over a grid of fixed fluxes.
+
+    axes as in phase_plane, e.g. growth rate and substrate uptake. Returns
+    the (minimum, maximum) arrays.
+    """
+    minimum, maximum = _grid(model, axes, target, ('min', 'max'), processes)
+    return minimum, maximum
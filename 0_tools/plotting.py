@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""Switch between interactive runs and headless batch runs.
+
+With the environment variable HEADLESS=1 the scripts skip their figure
+cells, and matplotlib, seaborn and IPython are never imported.
+"""
+import os
+
+HEADLESS = os.environ.get('HEADLESS', '0') not in ('', '0')
+
+
+def display(obj):
+    """IPython display, or a plain print in headless runs."""
+    if HEADLESS:
+        print(obj)
+        return
+    from IPython.display import display as _display
+    _display(obj)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Array snapshots of models for linear algebra without cobra objects.
+
+A snapshot is a directory with
+ * S_data.npy, S_indices.npy, S_indptr.npy - the CSR stoichiometric matrix
+   (metabolites x reactions);
+ * E_data.npy, E_indices.npy, E_indptr.npy - the CSR elements x metabolites
+   composition matrix, see medium.composition_matrix;
+ * lb.npy, ub.npy, c.npy - bounds and objective coefficients per reaction;
+ * reactions.txt, metabolites.txt, elements.txt - the IDs, one per line.
+The arrays are read back memory-mapped, so opening a snapshot of a genome
+scale model costs little more than reading the ID lists.
+"""
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from scipy import sparse
+import cobra
+from cobra.util.solver import linear_reaction_coefficients
+
+from medium import composition_matrix
+
+_ARRAYS = ['S_data', 'S_indices', 'S_indptr', 'E_data', 'E_indices',
+           'E_indptr', 'lb', 'ub', 'c']
+
+
+def _write_ids(path, ids):
+    with open(path, 'w') as f:
+        f.write('\n'.join(ids))
+
+
+def _read_ids(path):
+    with open(path) as f:
+        text = f.read()
+    return text.split('\n') if text else []
+
+
+def compile_snapshot(model: cobra.Model, path):
+    """Write the snapshot of the model to the directory path, replacing it."""
+    mets = {met: i for i, met in enumerate(model.metabolites)}
+    rows, cols, coefs = [], [], []
+    for j, rxn in enumerate(model.reactions):
+        for met, coef in rxn._metabolites.items():
+            rows.append(mets[met])
+            cols.append(j)
+            coefs.append(coef)
+    S = sparse.csr_matrix((coefs, (rows, cols)),
+                          shape=(len(model.metabolites), len(model.reactions)))
+    elements, E = composition_matrix(model)
+    objective = linear_reaction_coefficients(model)
+    arrays = {
+        'S_data': S.data, 'S_indices': S.indices, 'S_indptr': S.indptr,
+        'E_data': E.data, 'E_indices': E.indices, 'E_indptr': E.indptr,
+        'lb': np.array([r.lower_bound for r in model.reactions], dtype=float),
+        'ub': np.array([r.upper_bound for r in model.reactions], dtype=float),
+        'c': np.array([objective.get(r, 0) for r in model.reactions], dtype=float),
+    }
+
+    tmp = f'{os.path.normpath(path)}.{os.getpid()}.tmp'
+    os.makedirs(tmp)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, f'{name}.npy'), np.ascontiguousarray(array))
+    _write_ids(os.path.join(tmp, 'reactions.txt'), [r.id for r in model.reactions])
+    _write_ids(os.path.join(tmp, 'metabolites.txt'), [m.id for m in model.metabolites])
+    _write_ids(os.path.join(tmp, 'elements.txt'), elements)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    return Snapshot(path)
+
+
+class Snapshot:
+    """Stoichiometry, composition, bounds and objective of a model as arrays."""
+
+    def __init__(self, path):
+        self.path = path
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                  for name in _ARRAYS}
+        self.reactions = _read_ids(os.path.join(path, 'reactions.txt'))
+        self.metabolites = _read_ids(os.path.join(path, 'metabolites.txt'))
+        self.elements = _read_ids(os.path.join(path, 'elements.txt'))
+        self.rxn_index = {ID: j for j, ID in enumerate(self.reactions)}
+        self.met_index = {ID: i for i, ID in enumerate(self.metabolites)}
+        self.S = sparse.csr_matrix(
+            (arrays['S_data'], arrays['S_indices'], arrays['S_indptr']),
+            shape=(len(self.metabolites), len(self.reactions)), copy=False)
+        self.E = sparse.csr_matrix(
+            (arrays['E_data'], arrays['E_indices'], arrays['E_indptr']),
+            shape=(len(self.elements), len(self.metabolites)), copy=False)
+        self.lb, self.ub, self.c = arrays['lb'], arrays['ub'], arrays['c']
+
+    def __repr__(self):
+        return (f'<Snapshot {self.path}: {len(self.metabolites)} metabolites, '
+                f'{len(self.reactions)} reactions>')
+
+    def column(self, rxnID):
+        """Stoichiometry of one reaction as a {metabolite ID: coefficient} dict."""
+        col = self.S[:, self.rxn_index[rxnID]].tocoo()
+        return {self.metabolites[i]: v for i, v in zip(col.row, col.data)}
+
+    def boundary(self) -> np.ndarray:
+        """Mask of the boundary reactions, those with a single metabolite."""
+        return np.diff(self.S.tocsc().indptr) == 1
+
+    def mass_balance(self, boundary=False) -> pd.DataFrame:
+        """Element imbalance (elements x reactions) of the unbalanced reactions.
+
+        As cobra's check_mass_balance, from one sparse product; reactions
+        with a metabolite without formula are included when the other
+        metabolites do not balance. Boundary reactions are skipped unless
+        boundary is True.
+        """
+        imbalance = (self.E @ self.S).tocsc()
+        imbalance.eliminate_zeros()
+        keep = np.abs(imbalance).max(axis=0).toarray().ravel() > 1e-9
+        if not boundary:
+            keep &= ~self.boundary()
+        idx = np.flatnonzero(keep)
+        return pd.DataFrame(imbalance[:, idx].toarray(), index=self.elements,
+                            columns=[self.reactions[j] for j in idx])
+
+    def blocked_reactions(self, lb=None, ub=None) -> list:
+        """IDs of the reactions blocked by dead-end metabolites.
+
+        A metabolite that the open reactions can only produce or only consume,
+        or that has a single open reaction, blocks all its reactions; this is repeated until no reaction is
+        removed. The result is the structural part of the blocked reactions
+        of cobra's find_blocked_reactions, found without solving; reactions
+        blocked only by the flux balance of cycles need an LP. lb and ub
+        override the bounds of the snapshot.
+        """
+        lb = np.asarray(self.lb if lb is None else lb)
+        ub = np.asarray(self.ub if ub is None else ub)
+        S = self.S.tocsc()
+        forward, backward = ub > 0, lb < 0
+        active = forward | backward
+        while True:
+            # per metabolite: can it be produced and consumed by open reactions?
+            fwd = sparse.diags((forward & active).astype(float))
+            bwd = sparse.diags((backward & active).astype(float))
+            Sf, Sb = S @ fwd, S @ bwd
+            produced = ((Sf > 0).sum(axis=1).A1 + (Sb < 0).sum(axis=1).A1) > 0
+            consumed = ((Sf < 0).sum(axis=1).A1 + (Sb > 0).sum(axis=1).A1) > 0
+            # a reversible reaction both produces and consumes its metabolites,
+            # but not in one steady state: a second open reaction is needed
+            reactions = (S @ sparse.diags(active.astype(float)) != 0).sum(axis=1).A1
+            dead = ~(produced & consumed) | (reactions < 2)
+            blocked = active & (np.abs(S[dead]).sum(axis=0).A1 > 0)
+            if not blocked.any():
+                break
+            active &= ~blocked
+        return [self.reactions[j] for j in np.flatnonzero(~active)]
+
+    def flux_vector(self, fluxes) -> np.ndarray:
+        """Flux vector in the reaction order of the snapshot.
+
+        fluxes is a Series indexed by reaction ID (e.g. Solution.fluxes);
+        reactions missing from it are NaN.
+        """
+        values = np.full(len(self.reactions), np.nan)
+        index = pd.Index(fluxes.index).get_indexer(self.reactions)
+        found = index >= 0
+        values[found] = np.asarray(fluxes)[index[found]]
+        return values
+
+    def balance(self, fluxes) -> pd.Series:
+        """Net production of every metabolite, S @ v, for a flux vector."""
+        v = np.nan_to_num(self.flux_vector(fluxes))
+        return pd.Series(self.S @ v, index=self.metabolites)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Strain variants stored as a diff against a shared base model.
+
+A Strain records its modifications of the base model - added reactions and
+metabolites, NewRxns4Full_*.csv files, bound changes, media, knock-outs and
+stoichiometry edits - in order, without copying the model. All strains of
+a base share one pooled model, a single copy of the base. `with strain as
+m:` applies the diff of the strain to the pooled model inside a model
+context, reactions and metabolites included, and returns it; leaving the
+block undoes the diff, so the pooled model is the base again for the next
+strain. Memory grows with the size of the diffs instead of one model copy
+per strain.
+
+The base must not change after the first strain of it was entered, and
+strains of one base cannot be entered inside each other.
+"""
+import weakref
+import cobra
+
+from fba_utils import knock_out, read_rxn_table, set_bounds
+from medium import apply_medium
+
+_pools = weakref.WeakKeyDictionary()
+
+
+def _pool(base: cobra.Model) -> cobra.Model:
+    """The pooled model of base."""
+    model = _pools.get(base)
+    if model is None:
+        model = _pools[base] = base.copy()
+    return model
+
+
+class Strain:
+    """Modifications of a base model, applied while in a `with` block."""
+
+    def __init__(self, base: cobra.Model, name=None):
+        self.base = base
+        self.name = name
+        self.diff = []
+
+    def __repr__(self):
+        return f'<Strain {self.name or id(self)}: {len(self.diff)} changes of {self.base.id}>'
+
+    def copy(self, name=None):
+        """A new strain with the same diff, to be modified further."""
+        strain = Strain(self.base, name)
+        strain.diff = list(self.diff)
+        return strain
+
+    def add_reaction(self, ID, stoich, lower_bound=0, upper_bound=1000,
+                     name='', subsystem=''):
+        """Add a reaction; stoich maps metabolite IDs, or new Metabolites, to
+        coefficients."""
+        self.diff.append(('reactions', [(ID, name, subsystem, lower_bound,
+                                         upper_bound, dict(stoich))]))
+        return self
+
+    def add_rxn_file(self, newRxnFile):
+        """Add the reactions of a NewRxns4Full_*.csv file, as AddRxn."""
+        self.diff.append(('reactions', list(read_rxn_table(newRxnFile))))
+        return self
+
+    def add_metabolites(self, ID, stoich):
+        """Add stoich to the reaction ID, as cobra's add_metabolites."""
+        self.diff.append(('stoich', (ID, dict(stoich))))
+        return self
+
+    def set_bounds(self, bounds: dict):
+        """Set reaction bounds, {ID: (lb, ub)}; None keeps a bound as is."""
+        self.diff.append(('bounds', dict(bounds)))
+        return self
+
+    def apply_medium(self, medium):
+        """Apply a medium of medium.MEDIA or a {ID: (lb, ub)} dict."""
+        self.diff.append(('medium', medium))
+        return self
+
+    def knock_out(self, reactions=(), genes=()):
+        """Knock out reactions and genes, as fba_utils.knock_out."""
+        self.diff.append(('knock_out', (list(reactions), list(genes))))
+        return self
+
+    def _add_reactions(self, model, rows):
+        """Add the reactions of rows missing from the model, as AddRxn."""
+        new_mets, rxns = {}, []
+        for ID, name, subsystem, lb, ub, stoich in rows:
+            # reactions of the base are skipped, as in AddRxn
+            if ID in model.reactions or any(r.id == ID for r in rxns):
+                continue
+            mets = {}
+            for met, coef in stoich.items():
+                metID = met.id if isinstance(met, cobra.Metabolite) else met
+                if metID in model.metabolites:
+                    mets[model.metabolites.get_by_id(metID)] = coef
+                    continue
+                if metID not in new_mets:
+                    new_mets[metID] = (met.copy() if isinstance(met, cobra.Metabolite)
+                                       else cobra.Metabolite(metID))
+                mets[new_mets[metID]] = coef
+            rxn = cobra.Reaction(ID, name=name, subsystem=subsystem,
+                                 lower_bound=lb, upper_bound=ub)
+            rxn.add_metabolites(mets)
+            rxns.append(rxn)
+        # inside the context of the strain, so removed with it
+        model.add_reactions(rxns)
+
+    def _apply(self, model):
+        for kind, data in self.diff:
+            if kind == 'reactions':
+                self._add_reactions(model, data)
+            elif kind == 'stoich':
+                ID, stoich = data
+                model.reactions.get_by_id(ID).add_metabolites(stoich)
+            elif kind == 'bounds':
+                bounds = {}
+                for ID, (lb, ub) in data.items():
+                    rxn = model.reactions.get_by_id(ID)
+                    bounds[rxn] = (rxn.lower_bound if lb is None else lb,
+                                   rxn.upper_bound if ub is None else ub)
+                set_bounds(model, bounds)
+            elif kind == 'medium':
+                apply_medium(model, data)
+            elif kind == 'knock_out':
+                knock_out(model, *data)
+
+    def __enter__(self) -> cobra.Model:
+        model = _pool(self.base)
+        if model._contexts:
+            raise RuntimeError('A strain of this base is already entered')
+        model.__enter__()
+        try:
+            self._apply(model)
+        except Exception:
+            model.__exit__(None, None, None)
+            raise
+        return model
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _pool(self.base).__exit__(exc_type, exc_value, traceback)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Persistent pFBA and warm-started sweeps over growth rates.
+
+`pfba` keeps the constraint fixing the objective in the solver problem of
+the model until the model context of the caller ends, relaxed while unused,
+and switches between the objective and the total flux by their coefficients
+only. Repeated calls inside one context re-solve the same LP from the
+previous basis instead of adding and removing the pFBA terms every time;
+outside a context the constraint is removed after each call.
+
+`growth_sweep` fixes the biomass reaction at each growth rate and minimizes
+the uptake, followed by a pFBA step, as in `req_calc`.
+"""
+from itertools import chain
+import numpy as np
+import pandas as pd
+import cobra
+from cobra.core import get_solution
+from cobra.util.context import get_context
+from cobra.exceptions import OptimizationError
+from optlang.symbolics import Zero
+
+from instrument import traced
+
+BIOMASS = 'BIOMASS_Ec_iML1515_core_75p37M'
+FIXED_OBJECTIVE = 'pfba_fixed_objective'
+
+
+def _fixed_objective(model: cobra.Model):
+    """The relaxed constraint for the objective value, and whether to remove it.
+
+    The constraint is added once per model context and removed with it; the
+    caller removes a constraint added outside any context.
+    """
+    if FIXED_OBJECTIVE in model.constraints:
+        return model.constraints[FIXED_OBJECTIVE], False
+    constraint = model.problem.Constraint(
+        Zero, name=FIXED_OBJECTIVE, lb=None, ub=None, sloppy=True)
+    model.add_cons_vars(constraint)
+    return constraint, get_context(model) is None
+
+
+@traced
+def pfba(model: cobra.Model,
+         fraction_of_optimum=1.0,
+         reactions=None) -> cobra.Solution:
+    """cobra.flux_analysis.pfba on the persistent pFBA problem of the model.
+
+    The current objective is optimized, fixed at fraction_of_optimum of its
+    optimum and the total flux is minimized. The objective of the model is
+    restored afterwards; the pFBA fluxes are those of the returned Solution.
+    Raises OptimizationError if the model is infeasible.
+    """
+    objective = model.solver.objective
+    direction = objective.direction
+    coefs = {v: c for v, c in objective.get_linear_coefficients(
+        model.variables).items() if c}
+    fixed, remove = _fixed_objective(model)
+    terms = dict.fromkeys(
+        (v for v, c in fixed.get_linear_coefficients(model.variables).items() if c), 0)
+    terms.update(coefs)
+    fixed.set_linear_coefficients(terms)
+
+    variables = list(chain(*((r.forward_variable, r.reverse_variable)
+                             for r in model.reactions)))
+    total_flux = dict.fromkeys(coefs, 0)
+    total_flux.update(dict.fromkeys(variables, 1.0))
+    restore = dict.fromkeys(variables, 0)
+    restore.update(coefs)
+    try:
+        fixed.lb, fixed.ub = None, None
+        optimum = model.slim_optimize(error_value=None) * fraction_of_optimum
+        if direction == 'max':
+            fixed.lb = optimum
+        else:
+            fixed.ub = optimum
+        objective.set_linear_coefficients(total_flux)
+        objective.direction = 'min'
+        model.slim_optimize(error_value=None)
+        if reactions is not None:
+            reactions = model.reactions.get_by_any(reactions)
+        solution = get_solution(model, reactions=reactions)
+    finally:
+        objective.set_linear_coefficients(restore)
+        objective.direction = direction
+        fixed.lb, fixed.ub = None, None
+        if remove:
+            model.remove_cons_vars(fixed)
+    return solution
+
+
+# growth_sweep has a pfba argument
+_pfba = pfba
+
+
+def growth_sweep(model: cobra.Model,
+                 uptake: str,
+                 growth_rates,
+                 fluxes=(),
+                 biomass=BIOMASS,
+                 pfba=True) -> pd.DataFrame:
+    """Minimal uptake and pFBA fluxes at each fixed growth rate.
+
+    Returns a DataFrame with the 'Growth rate', the flux of the uptake
+    reaction and the fluxes of the reactions in `fluxes`. Infeasible growth
+    rates give NaN. The model is left unchanged.
+    """
+    growth_rates = np.asarray(growth_rates, dtype=float)
+    columns = [uptake] + [ID for ID in fluxes if ID != uptake]
+    data = np.full((len(growth_rates), len(columns)), np.nan)
+
+    with model:
+        rxn_uptake = model.reactions.get_by_id(uptake)
+        rxn_biomass = model.reactions.get_by_id(biomass)
+        rxns = [model.reactions.get_by_id(ID) for ID in columns]
+
+        # the minimal uptake is the largest (negative) uptake flux
+        model.objective = {rxn_uptake: 1}
+        model.objective_direction = 'max'
+        for i, gr in enumerate(growth_rates):
+            rxn_biomass.bounds = (gr, gr)
+            try:
+                if pfba:
+                    solution = _pfba(model, reactions=rxns)
+                    data[i] = solution.fluxes[columns].values
+                else:
+                    model.slim_optimize(error_value=None)
+                    data[i] = [r.flux for r in rxns]
+            except OptimizationError:
+                continue
+
+    df = pd.DataFrame(data, columns=columns)
+    df.insert(0, 'Growth rate', growth_rates)
+    return df
+
+
+def dependency_slope(growth_rates, uptakes):
+    """Least-squares slope of the uptake over the growth rate (mmol/gCDW).
+
+    Points that are NaN (infeasible) are left out of the fit.
+    """
+    x = np.asarray(growth_rates, dtype=float)
+    y = np.asarray(uptakes, dtype=float)
+    mask = np.isfinite(x) & np.isfinite(y)
+    return np.polyfit(x[mask], y[mask], 1)[0]
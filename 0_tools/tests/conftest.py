@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(TOOLS_DIR)
+# the tools are imported as flat modules, as in the scripts
+if TOOLS_DIR not in sys.path:
+    sys.path.insert(0, TOOLS_DIR)
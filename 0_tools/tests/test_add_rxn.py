@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import os
+import glob
+import pandas as pd
+import pytest
+import cobra
+
+import iml1515
+from conftest import ROOT_DIR
+from fba_utils import AddRxn
+
+RXN_FILES = sorted(glob.glob(os.path.join(ROOT_DIR, '*', '*', 'NewRxns4Full_*.csv')))
+
+
+def _legacy_add_rxn(model, newRxnFile):
+    """The per-row AddRxn of the scripts, with build_reaction_from_string."""
+    n1 = len(model.reactions)
+    AllAddRxn = pd.read_csv(newRxnFile, sep=',', index_col='RxnID', skipinitialspace=True)
+    for i in range(len(AllAddRxn)):
+        ID = AllAddRxn.index.values[i]
+        model.add_reactions([cobra.Reaction(ID)])
+        addRxnInf = model.reactions[n1 + i]
+        addRxnInf.name = AllAddRxn.loc[ID, 'RxnName']
+        addRxnInf.reaction = AllAddRxn.loc[ID, 'RxnFormula']
+        addRxnInf.subsystem = AllAddRxn.loc[ID, 'Subsystem']
+        addRxnInf.lower_bound = AllAddRxn.loc[ID, 'LowerBound']
+        addRxnInf.upper_bound = AllAddRxn.loc[ID, 'UpperBound']
+    return model
+
+
+def _reactions(model):
+    return {r.id: (r.name, r.subsystem, r.bounds,
+                   {m.id: c for m, c in r.metabolites.items()})
+            for r in model.reactions}
+
+
+@pytest.fixture(scope='module')
+def base():
+    if not os.path.exists(iml1515.MODEL_FILE):
+        pytest.skip('iML1515.json is not available')
+    return iml1515.load_model(copy=False)
+
+
+@pytest.mark.parametrize('rxn_file', RXN_FILES,
+                         ids=lambda f: os.path.relpath(f, ROOT_DIR))
+def test_add_rxn_matches_legacy(base, rxn_file):
+    expected = _legacy_add_rxn(base.copy(), rxn_file)
+    with base:
+        AddRxn(base, rxn_file)
+        assert _reactions(base) == _reactions(expected)
+        assert ({m.id for m in base.metabolites}
+                == {m.id for m in expected.metabolites})
+        assert base.slim_optimize() == pytest.approx(expected.slim_optimize())
+        # applying the file again adds nothing
+        AddRxn(base, rxn_file)
+        assert len(base.reactions) == len(expected.reactions)
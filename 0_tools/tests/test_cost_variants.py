@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import os
+import numpy as np
+import pytest
+import cobra
+
+from conftest import ROOT_DIR
+from fba_utils import AddRxn
+from cost_variants import (COSTS, variant_costs, cost_summary,
+                           reducing_eq_segments, fixed_flux_segments,
+                           sensitivity_table)
+
+CORE_DIR = os.path.join(ROOT_DIR, '2024_CORE', 'Cost_comparison')
+PATHWAYS = {'NPR': 'a_NPRrxns.csv', 'GLC': 'b_GLCrxns.csv',
+            'TACO': 'f_TACOrxns.csv', 'CORE_Lig': 'x1_CORE_Lig_rxns.csv'}
+GCC_ATP = {('atp', 'GCC'): -1, ('adp', 'GCC'): 1, ('pi', 'GCC'): 1}
+
+
+@pytest.fixture(scope='module')
+def model():
+    # as in CORE_cost_comparison.py
+    model = cobra.Model()
+    AddRxn(model, os.path.join(CORE_DIR, 'CBBrxns.csv'))
+    model.objective = {model.reactions.DM_atp: 1}
+    model.objective_direction = 'min'
+    model.add_cons_vars(model.problem.Constraint(
+        model.reactions.RBPC.flux_expression - 3 * model.reactions.RBPO.flux_expression,
+        lb=0, ub=0, name='rubisco_flux'))
+    return model
+
+
+def _explicit_costs(model, extra_atp):
+    """Costs of TACO with GCC changed by add_metabolites, as the script did."""
+    with model as m:
+        AddRxn(m, os.path.join(CORE_DIR, 'f_TACOrxns.csv'))
+        m.reactions.GCC.add_metabolites(
+            {'atp': -extra_atp, 'adp': extra_atp, 'pi': extra_atp})
+        m.optimize()
+        return [abs(m.reactions.get_by_id(ID).flux) for ID in COSTS]
+
+
+@pytest.mark.parametrize('name, atp', [('TACO', 1), ('TACO_M5', 3.9),
+                                       ('TACO_L100N', 1.7)])
+def test_variant_costs_match_add_metabolites(model, name, atp):
+    costs = variant_costs(model, {'TACO': os.path.join(CORE_DIR, 'f_TACOrxns.csv')},
+                          {'GCC ATP': (GCC_ATP, [atp])}, processes=1)
+    np.testing.assert_allclose(costs[('TACO', atp)].values,
+                               _explicit_costs(model, atp - 1), atol=1e-9)
+    # the model is left as it was
+    assert 'GCC' not in model.reactions
+
+
+def _brute_force(model, path, atp, fd):
+    """Minimal reducing equivalents per 3pg, solved at one ratio."""
+    with model as m:
+        AddRxn(m, os.path.join(CORE_DIR, path))
+        m.objective = {m.reactions.DM_atp: 1 / atp, m.reactions.DM_e: 1,
+                       m.reactions.Fdr: 1 / fd}
+        m.objective_direction = 'min'
+        return m.slim_optimize() / abs(m.reactions.sink_3pg.flux)
+
+
+@pytest.mark.parametrize('factor, low, high, n', [('atp_per_nadh', 1, 5, 81),
+                                                  ('fd_per_nadh', 1, 3, 41)])
+def test_segments_match_brute_force(model, factor, low, high, n):
+    with model:
+        # routes trading ATP and ferredoxin for NAD(P)H, for breakpoints
+        # at 2 ATP and 2 Fd per NAD(P)H
+        atp_route = cobra.Reaction('ATP_NADH')
+        fd_route = cobra.Reaction('FD_NADH')
+        model.add_reactions([atp_route, fd_route])
+        atp_route.build_reaction_from_string('2 atp + nad -> 2 adp + 2 pi + nadh')
+        fd_route.build_reaction_from_string('2 fdxrd + nad -> 2 fdxo + nadh')
+        pathways = {psw: os.path.join(CORE_DIR, path)
+                    for psw, path in PATHWAYS.items()}
+        segments = reducing_eq_segments(model, pathways, factor, (low, high),
+                                        processes=1)
+        ratios = np.linspace(low, high, n)
+        table = sensitivity_table(segments, ratios)
+        assert (segments.groupby('Pathway').size() > 1).any()
+        for psw, path in PATHWAYS.items():
+            expected = [_brute_force(model, path, *((r, 2) if factor == 'atp_per_nadh'
+                                                     else (2.5, r)))
+                        for r in ratios]
+            np.testing.assert_allclose(table['reducing_eq', psw], expected,
+                                       rtol=1e-9, atol=1e-9)
+
+
+def test_fixed_flux_segments_match_cost_summary(model):
+    pathways = {psw: os.path.join(CORE_DIR, path) for psw, path in PATHWAYS.items()}
+    cost_df = variant_costs(model, pathways, processes=1)
+    table = sensitivity_table(fixed_flux_segments(cost_df, 'fd_per_nadh', (1, 3)),
+                              [1, 2])
+    summary = cost_summary(cost_df, atp_per_nadh=2.5, fd_per_nadh=2)
+    np.testing.assert_allclose(table.loc[2.0, 'Rel_yield'],
+                               summary.loc['Rel_yield', table['Rel_yield'].columns])
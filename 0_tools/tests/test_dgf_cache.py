@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import os
+import pytest
+
+pytest.importorskip('equilibrator_api')
+pytest.importorskip('equilibrator_pathway')
+
+from conftest import ROOT_DIR
+
+
+@pytest.fixture(scope='module')
+def comp_contrib():
+    from equilibrator_api import ComponentContribution, Q_
+    # conditions of formate_reduction_eQu.py
+    cc = ComponentContribution()
+    cc.p_h = Q_(7)
+    cc.ionic_strength = Q_('250 mM')
+    cc.p_mg = Q_(3)
+    return cc
+
+
+def test_cached_dgs_match_equilibrator(comp_contrib, tmp_path):
+    from equilibrator_pathway import ThermodynamicModel
+    import dgf_cache
+    path = os.path.join(ROOT_DIR, '2022_formate_reduction', 'MDF', '3_Pi.tsv')
+    model = ThermodynamicModel.from_sbtab(path, comp_contrib=comp_contrib)
+    # estimated, then read back from the cache file
+    dgf_cache.check(model, cache_dir=str(tmp_path))
+    dgf_cache._caches.clear()
+    dgf_cache.check(model, cache_dir=str(tmp_path))
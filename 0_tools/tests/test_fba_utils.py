@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import pytest
+from cobra.io import load_model
+
+from fba_utils import (change_objective, add_precursor_drains,
+                       set_precursor_objective, knock_out)
+
+KO_REACTIONS = ['FUM', 'ACKr']
+# b3916 and b1723 encode the two isozymes of PFK, b1380 one of LDH_D
+KO_GENES = ['b3916', 'b1723', 'b1380']
+PRECURSORS = ['biomass', 'g6p_c', 'accoa_c', 'pyr_c', 'akg_c', 'glc__D_e']
+
+
+@pytest.fixture
+def model():
+    model = load_model('textbook')
+    # a product with an exchange of its own and restricted uptake
+    model.reactions.EX_glc__D_e.bounds = (-10, 5)
+    return model
+
+
+def test_precursor_drains_match_change_objective(model):
+    expected = {}
+    for product in PRECURSORS:
+        with model:
+            if product != 'biomass':
+                change_objective(model, product)
+            expected[product] = model.slim_optimize()
+    bounds = {r.id: r.bounds for r in model.reactions}
+    with model:
+        drains = add_precursor_drains(model, PRECURSORS)
+        for product in PRECURSORS + PRECURSORS[::-1]:
+            set_precursor_objective(model, drains, product)
+            assert model.slim_optimize() == pytest.approx(expected[product])
+            # the exchange of the model keeps its bounds throughout
+            assert model.reactions.EX_glc__D_e.bounds == (-10, 5)
+    assert {r.id: r.bounds for r in model.reactions} == bounds
+
+
+def _ko_state(model):
+    return ({r.id: r.bounds for r in model.reactions},
+            {g.id: g.functional for g in model.genes})
+
+
+def test_knock_out_matches_cobra(model):
+    expected = model.copy()
+    for ID in KO_REACTIONS:
+        expected.reactions.get_by_id(ID).knock_out()
+    for ID in KO_GENES:
+        expected.genes.get_by_id(ID).knock_out()
+
+    state = _ko_state(model)
+    with model:
+        closed = knock_out(model, KO_REACTIONS, KO_GENES)
+        assert _ko_state(model) == _ko_state(expected)
+        assert model.slim_optimize() == pytest.approx(expected.slim_optimize())
+        assert set(closed) == {'FUM', 'ACKr', 'PFK'}
+    assert _ko_state(model) == state
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import cobra
+from cobra.io import load_model
+
+from flux_store import FluxStore, SPARE_COLUMNS
+
+
+def _pathway(model, n):
+    """n reactions new to the model, more than the spare columns of a block."""
+    rxns = [cobra.Reaction(f'NEW{i}', name=f'new {i}', subsystem='test',
+                           lower_bound=0, upper_bound=1000) for i in range(n)]
+    for rxn in rxns:
+        rxn.add_metabolites({model.metabolites.pyr_c: -1,
+                             model.metabolites.lac__D_c: 1})
+    model.add_reactions(rxns)
+
+
+def test_round_trip_past_spare_columns(tmp_path):
+    model = load_model('textbook')
+    IDs = [r.id for r in model.reactions]
+    store = FluxStore(tmp_path)
+    first = model.optimize()
+    store.append(first, model, pathway='wt', precursor='biomass',
+                 knockouts=['FUM', 'ACKr'])
+
+    with model:
+        _pathway(model, SPARE_COLUMNS + 10)
+        model.reactions.NEW0.lower_bound = 1
+        second = model.optimize()
+        store.append(second, model, pathway='new', precursor='biomass',
+                     medium='glucose')
+        new_IDs = [r.id for r in model.reactions]
+    assert len(store._blocks) == 2
+
+    # a new store object on the same directory reads back everything
+    store = FluxStore(tmp_path)
+    assert store.reactions()['RxnID'].tolist() == new_IDs
+    assert store.reactions().set_index('RxnID').loc['NEW3', 'RxnName'] == 'new 3'
+    sc = store.scenarios()
+    assert sc['pathway'].tolist() == ['wt', 'new']
+    assert sc['block'].tolist() == [0, 1]
+    assert sc.loc[0, 'knockouts'] == 'FUM;ACKr'
+    assert sc.loc[1, 'medium'] == 'glucose'
+    np.testing.assert_allclose(sc['objective'],
+                               [first.objective_value, second.objective_value])
+
+    fluxes = store.fluxes()
+    np.testing.assert_array_equal(fluxes.loc[0, IDs], first.fluxes[IDs])
+    assert fluxes.loc[0].drop(IDs).isna().all()
+    np.testing.assert_array_equal(fluxes.loc[1, new_IDs], second.fluxes[new_IDs])
+    pd.testing.assert_series_equal(
+        store.column('NEW0'),
+        pd.Series([np.nan, second.fluxes['NEW0']], index=sc.index, name='NEW0'))
+    assert store.column('PFK', pathway='wt').tolist() == [first.fluxes['PFK']]
+
+    # appending after reopening continues the last block
+    row = store.append(first, pathway='wt', precursor='biomass')
+    assert row == 2
+    assert store.scenarios().loc[2, 'block'] == 1
+    np.testing.assert_array_equal(store.fluxes(pathway='wt').loc[2, IDs],
+                                  first.fluxes[IDs])
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from cobra.io import load_model
+from cobra.flux_analysis import pfba
+
+from flux_summary import flux_summary
+
+
+@pytest.fixture
+def model():
+    return load_model('textbook')
+
+
+def _conditions(model):
+    yield model.optimize()
+    yield pfba(model)
+    with model:
+        # fermentation products are secreted without oxygen
+        model.reactions.EX_o2_e.lower_bound = 0
+        yield model.optimize()
+
+
+def test_flux_summary_matches_model_summary(model):
+    for solution in _conditions(model):
+        expected = model.summary(solution=solution)
+        summary = flux_summary(model, solution)
+        assert summary.to_string() == expected.to_string()
+        # the objective of the model, also for the pFBA solution
+        assert summary.objective_value == pytest.approx(
+            solution.fluxes['Biomass_Ecoli_core'])
+        for ours, theirs in [(summary.uptake, expected.uptake_flux),
+                             (summary.secretion, expected.secretion_flux)]:
+            theirs = theirs[theirs['flux'].abs() >= model.tolerance]
+            assert sorted(ours['Reaction']) == sorted(theirs['reaction'])
+            np.testing.assert_allclose(
+                ours.set_index('Reaction')['Flux'][theirs['reaction']],
+                theirs['flux'])
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import itertools
+import numpy as np
+import pytest
+from cobra.io import load_model
+
+from fba_utils import knock_out
+from ko_screen import ko_screen
+from sweep import growth_sweep, dependency_slope
+
+BIOMASS = 'Biomass_Ecoli_core'
+UPTAKE = 'EX_fru_e'
+CANDIDATES = ['GLCpts', 'PGI', 'PFK', 'FBP', 'G6PDH2r', 'PGL', 'GND', 'RPI',
+              'RPE', 'TKT1', 'TALA', 'PPC', 'PPCK', 'ME1', 'ICL', 'ACKr']
+GROWTH_RATES = np.arange(0.5, step=0.1)
+
+
+@pytest.fixture(scope='module')
+def model():
+    return load_model('textbook')
+
+
+def _growth(model, ko, lb):
+    with model:
+        knock_out(model, ko)
+        model.reactions.get_by_id(UPTAKE).lower_bound = lb
+        return model.slim_optimize(error_value=0.0)
+
+
+def _exhaustive(model, max_size=2, min_growth=0.1, tol=1e-6):
+    """Every minimal knock-out set, tested one by one."""
+    hits = {}
+    for size in range(1, max_size + 1):
+        for ko in itertools.combinations(sorted(CANDIDATES), size):
+            if any(set(h) <= set(ko) for h in hits):
+                continue
+            growth = _growth(model, ko, -1000)
+            if growth >= min_growth and _growth(model, ko, 0) <= tol:
+                hits[ko] = growth
+    slopes = {}
+    for ko in hits:
+        with model:
+            knock_out(model, ko)
+            model.reactions.get_by_id(UPTAKE).lower_bound = -1000
+            sweep = growth_sweep(model, UPTAKE, GROWTH_RATES, biomass=BIOMASS)
+        slopes[ko] = dependency_slope(sweep['Growth rate'], sweep[UPTAKE].abs())
+    return hits, slopes
+
+
+def test_pruned_screen_matches_exhaustive(model):
+    screen = ko_screen(model, UPTAKE, max_size=2, candidates=CANDIDATES,
+                       growth_rates=GROWTH_RATES, biomass=BIOMASS, processes=1)
+    hits, slopes = _exhaustive(model)
+    assert hits
+    assert {tuple(sorted(ko)) for ko in screen['Knockouts']} == set(hits)
+    for row in screen.itertuples():
+        ko = tuple(sorted(row.Knockouts))
+        assert row[3] == pytest.approx(hits[ko])
+        assert row.Slope == pytest.approx(slopes[ko])
+    # ranked by slope
+    np.testing.assert_allclose(screen['Slope'], sorted(slopes.values(), reverse=True))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import os
+import warnings
+import numpy as np
+import pytest
+
+pytest.importorskip('cvxpy')
+from conftest import ROOT_DIR
+from mdf_tools import mdf_sweep, mdf_parametric, mdf_from_segments
+
+RT = 8.314e-3 * 298.15
+
+
+def _arrays(S, dg0, compounds='ABCD'):
+    S = np.asarray(S, dtype=float)
+    n, m = S.shape
+    return {
+        'compounds': list(compounds[:n]),
+        'reactions': [f'R{j}' for j in range(m)],
+        'S': S, 'dg0': np.asarray(dg0, dtype=float),
+        'dg_sigma': None, 'dg_confidence': 0.0,
+        'directions': np.ones(m),
+        'ln_lb': np.full(n, np.log(1e-6)), 'ln_ub': np.full(n, np.log(1e-2)),
+        'RT': RT,
+    }
+
+
+# A -> B -> C -> D
+CHAIN = [[-1, 0, 0], [1, -1, 0], [0, 1, -1], [0, 0, 1]]
+MODELS = {
+    # the bottleneck moves from the whole chain to the first reaction
+    'chain': _arrays(CHAIN, [5, -20, -5]),
+    # two identical first reactions, bottlenecks at the same time
+    'twin': _arrays(np.hstack([CHAIN, [[-1], [1], [0], [0]]]), [5, -20, -5, 5]),
+    # without A, one flat segment
+    'flat': _arrays([[-1], [1]], [-5], 'BC'),
+}
+
+
+@pytest.mark.parametrize('kind, bounds', [('ub', (0.01, 10)), ('lb', (1e-3, 5))])
+def test_parametric_matches_sweep(kind, bounds):
+    grid = np.geomspace(*bounds, 41)
+    segments = mdf_parametric(MODELS, 'A', kind, bounds)
+    if kind == 'ub':
+        assert (segments['pathway'] == 'chain').sum() > 1
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        swept = mdf_sweep(MODELS, [(kind, 'A', grid)], processes=1)
+    exact = mdf_from_segments(segments, grid)
+    np.testing.assert_allclose(exact.values, swept.values, atol=1e-5)
+    assert (segments['pathway'] == 'flat').sum() == 1
+    twin = segments[segments['pathway'] == 'twin']
+    chain = segments[segments['pathway'] == 'chain']
+    np.testing.assert_allclose(twin[['ln_start', 'ln_end', 'slope']].values,
+                               chain[['ln_start', 'ln_end', 'slope']].values)
+
+
+def _equilibrator_mdf(path, comp_contrib, cid, kind, value):
+    """MDF_ub/MDF_lb of formate_reduction_eQu.py: set a bound, mdf_analysis."""
+    from equilibrator_api import Q_, ureg
+    from equilibrator_pathway import ThermodynamicModel
+    import dgf_cache
+    model = ThermodynamicModel.from_sbtab(path, comp_contrib=comp_contrib)
+    model.set_bounds(cid=cid, **{kind: Q_(value, ureg.mM)})
+    dgf_cache.update_standard_dgs(model)
+    return model.mdf_analysis().score
+
+
+@pytest.mark.parametrize('cid, kind, values', [('for', 'ub', [1, 5, 10, 50]),
+                                               ('fald', 'lb', [0.001, 0.01, 0.1])])
+def test_sweep_matches_mdf_analysis(cid, kind, values):
+    pytest.importorskip('equilibrator_api')
+    pytest.importorskip('equilibrator_pathway')
+    from equilibrator_api import ComponentContribution, Q_
+    from equilibrator_pathway import ThermodynamicModel
+    import dgf_cache
+    comp_contrib = ComponentContribution()
+    # conditions of formate_reduction_eQu.py
+    comp_contrib.p_h = Q_(7)
+    comp_contrib.ionic_strength = Q_('250 mM')
+    comp_contrib.p_mg = Q_(3)
+    path = os.path.join(ROOT_DIR, '2022_formate_reduction', 'MDF', '3_Pi.tsv')
+    model = ThermodynamicModel.from_sbtab(path, comp_contrib=comp_contrib)
+    dgf_cache.update_standard_dgs(model)
+    swept = mdf_sweep({'3_Pi': model}, [(kind, cid, values)], processes=1)
+    expected = [_equilibrator_mdf(path, comp_contrib, cid, kind, v) for v in values]
+    np.testing.assert_allclose(swept['3_Pi'], expected, atol=1e-3)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import os
+import pytest
+from cobra.io import load_model
+
+import iml1515
+from medium import MEDIA, apply_medium, carbon_exchanges
+
+
+@pytest.fixture(scope='module', params=['textbook', 'iML1515'])
+def model(request):
+    if request.param == 'textbook':
+        return load_model('textbook')
+    if not os.path.exists(iml1515.MODEL_FILE):
+        pytest.skip('iML1515.json is not available')
+    return iml1515.load_model()
+
+
+def _baseline_medium(model):
+    """The check_mass_balance loop of the scripts, formaldehyde medium."""
+    for rxn in model.boundary:
+        if "C" in rxn.check_mass_balance():
+            rxn.bounds = (0.0, 1000)
+    model.reactions.get_by_id('EX_co2_e').bounds = (-1000, 1000)
+    if 'EX_fald_e' in model.reactions:
+        model.reactions.get_by_id('EX_fald_e').bounds = (-10, 0)
+
+
+def _bounds(model):
+    return {r.id: r.bounds for r in model.reactions}
+
+
+def test_carbon_exchanges_match_check_mass_balance(model):
+    expected = [r.id for r in model.boundary if 'C' in r.check_mass_balance()]
+    assert sorted(carbon_exchanges(model)) == sorted(expected)
+
+
+def test_apply_medium_matches_baseline(model):
+    medium = {ID: b for ID, b in MEDIA['formaldehyde'].items() if ID in model.reactions}
+    with model:
+        _baseline_medium(model)
+        expected = _bounds(model)
+    before = _bounds(model)
+    with model:
+        apply_medium(model, medium)
+        assert _bounds(model) == expected
+    assert _bounds(model) == before
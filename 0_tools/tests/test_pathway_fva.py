@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+from cobra.io import load_model
+from cobra.flux_analysis import flux_variability_analysis
+
+from fba_utils import AddRxn
+from pathway_fva import pathway_fva, pathway_reactions
+
+
+@pytest.fixture
+def model():
+    return load_model('textbook')
+
+
+@pytest.fixture
+def rxn_file(tmp_path):
+    path = tmp_path / 'NewRxns4Full_test.csv'
+    pd.DataFrame({
+        'RxnID': ['FORt_new', 'FDH_new'],
+        'RxnName': ['formate uptake', 'formate dehydrogenase'],
+        'Subsystem': ['test', 'test'],
+        'LowerBound': [-10, 0],
+        'UpperBound': [10, 1000],
+        'RxnFormula': ['for_e <=> for_c', 'for_c + nad_c --> co2_c + nadh_c'],
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('fraction_of_optimum', [1.0, 0.9])
+@pytest.mark.parametrize('processes', [1, 2])
+def test_pathway_fva_matches_cobra(model, fraction_of_optimum, processes):
+    objective = str(model.objective.expression)
+    IDs = [r.id for r in model.reactions]
+    result = pathway_fva(model, reactions=IDs,
+                         fraction_of_optimum=fraction_of_optimum,
+                         processes=processes)
+    expected = flux_variability_analysis(
+        model, IDs, fraction_of_optimum=fraction_of_optimum, processes=1)
+    assert list(result.columns) == ['minimum', 'maximum']
+    np.testing.assert_allclose(result.loc[IDs], expected.loc[IDs], atol=1e-6)
+    assert str(model.objective.expression) == objective
+    assert 'fva_optimum' not in model.constraints
+
+
+def test_pathway_reactions(model, rxn_file):
+    AddRxn(model, rxn_file)
+    IDs = pathway_reactions(model, rxn_file, subsystem='Pyruvate Metabolism',
+                            reactions=['PFK', 'FDH_new', 'missing'])
+    pyruvate = [r.id for r in model.reactions
+                if r.subsystem == 'Pyruvate Metabolism']
+    assert IDs == ['PFK', 'FDH_new', 'FORt_new'] + pyruvate
+    result = pathway_fva(model, rxn_file, processes=1)
+    expected = flux_variability_analysis(model, ['FORt_new', 'FDH_new'],
+                                         processes=1)
+    np.testing.assert_allclose(result, expected.loc[result.index], atol=1e-6)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from cobra.io import load_model
+
+from phase_plane import phase_plane, production_envelope
+
+BIOMASS = 'Biomass_Ecoli_core'
+GLUCOSE = [-10, -5, -1, 0]
+OXYGEN = [-20, -8, 0]
+
+
+@pytest.fixture
+def model():
+    return load_model('textbook')
+
+
+def _direct(model, fixed, objective, direction='max'):
+    """Optimum with the fluxes fixed, solved from scratch."""
+    with model:
+        for ID, v in fixed.items():
+            model.reactions.get_by_id(ID).bounds = (v, v)
+        model.objective = objective
+        model.objective.direction = direction
+        return model.slim_optimize(error_value=np.nan)
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_phase_plane_matches_direct(model, processes):
+    objective = str(model.objective.expression)
+    grid = phase_plane(model, {'EX_glc__D_e': GLUCOSE, 'EX_o2_e': OXYGEN},
+                       objective=BIOMASS, processes=processes)
+    assert grid.shape == (len(GLUCOSE), len(OXYGEN))
+    expected = np.array([[_direct(model, {'EX_glc__D_e': g, 'EX_o2_e': o}, BIOMASS)
+                          for o in OXYGEN] for g in GLUCOSE])
+    # without glucose the ATP maintenance cannot be met
+    assert np.isnan(expected[-1]).all()
+    np.testing.assert_allclose(grid, expected, atol=1e-6)
+    assert str(model.objective.expression) == objective
+
+
+def test_production_envelope_matches_direct(model):
+    growth = [0.0, 0.2, 0.5, 0.8]
+    minimum, maximum = production_envelope(
+        model, {'EX_glc__D_e': [-10, -4], BIOMASS: growth}, 'EX_ac_e',
+        processes=1)
+    for i, g in enumerate([-10, -4]):
+        for j, mu in enumerate(growth):
+            fixed = {'EX_glc__D_e': g, BIOMASS: mu}
+            for grid, direction in ((minimum, 'min'), (maximum, 'max')):
+                assert grid[i, j] == pytest.approx(
+                    _direct(model, fixed, 'EX_ac_e', direction), abs=1e-6,
+                    nan_ok=True)
+    # growth of 0.8 needs more than 4 glucose
+    assert np.isnan(maximum[1, -1]) and not np.isnan(maximum[0, -1])
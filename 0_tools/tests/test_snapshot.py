@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+import cobra
+from cobra.flux_analysis import find_blocked_reactions
+
+from snapshot import compile_snapshot
+
+
+def test_blocked_reactions_single_reversible(tmp_path):
+    # c is only made and used by the reversible R2
+    model = cobra.Model()
+    for ID, formula in [('EX_a', 'a <=>'), ('R1', 'a -> b'), ('R2', 'b <=> c'),
+                        ('R3', 'b -> d'), ('EX_d', 'd -->')]:
+        rxn = cobra.Reaction(ID)
+        model.add_reactions([rxn])
+        rxn.build_reaction_from_string(formula, verbose=False)
+    snapshot = compile_snapshot(model, tmp_path / 'snapshot')
+    assert snapshot.blocked_reactions() == ['R2']
+    assert set(find_blocked_reactions(model)) == {'R2'}
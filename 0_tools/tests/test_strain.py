@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import pytest
+import cobra
+from cobra.io import load_model
+
+from strain import Strain
+
+
+@pytest.fixture(scope='module')
+def base():
+    return load_model('textbook')
+
+
+def _edited(base, reactions=(), bounds=None):
+    """A fresh copy of base with the reactions and bounds of a strain."""
+    model = base.copy()
+    for ID, stoich in reactions:
+        rxn = cobra.Reaction(ID, lower_bound=-1000, upper_bound=1000)
+        model.add_reactions([rxn])
+        rxn.add_metabolites({model.metabolites.get_by_id(m) if m in model.metabolites
+                             else cobra.Metabolite(m): c for m, c in stoich.items()})
+    for ID, b in (bounds or {}).items():
+        model.reactions.get_by_id(ID).bounds = b
+    return model
+
+
+def _state(model):
+    return ({r.id: (r.bounds, {m.id: c for m, c in r.metabolites.items()})
+             for r in model.reactions},
+            {m.id for m in model.metabolites})
+
+
+def test_strains_in_sequence(base):
+    first = [('HPS', {'ru5p__D_c': -1, 'fald_c': -1, 'h6p_c': 1}),
+             ('EX_fald_e', {'fald_c': -1})]
+    second = {'EX_glc__D_e': (-5, 1000)}
+    a = Strain(base, 'a')
+    for ID, stoich in first:
+        a.add_reaction(ID, stoich, lower_bound=-1000)
+    b = Strain(base, 'b').set_bounds(second)
+
+    for strain, expected in [(a, _edited(base, first)), (b, _edited(base, bounds=second)),
+                             (a, _edited(base, first))]:
+        with strain as m:
+            assert _state(m) == _state(expected)
+            assert m.slim_optimize() == pytest.approx(expected.slim_optimize())
+    # the base itself is not touched
+    assert _state(base) == _state(load_model('textbook'))
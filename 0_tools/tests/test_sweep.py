@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from cobra.io import load_model
+from cobra.flux_analysis import pfba
+
+import sweep
+
+BIOMASS = 'Biomass_Ecoli_core'
+GROWTH_RATES = [0.1, 0.3, 0.5, 0.8, 1.5]
+
+
+@pytest.fixture
+def model():
+    return load_model('textbook')
+
+
+def _state(model):
+    return ({c.name: (c.lb, c.ub) for c in model.constraints},
+            str(model.objective.expression), model.objective.direction)
+
+
+def test_pfba_matches_cobra(model):
+    expected = pfba(model).fluxes
+    state = _state(model)
+    with model:
+        for _ in range(2):
+            solution = sweep.pfba(model)
+            np.testing.assert_allclose(solution.fluxes[expected.index], expected,
+                                       atol=1e-6)
+        assert sweep.FIXED_OBJECTIVE in model.constraints
+    assert _state(model) == state
+    # outside a context the constraint is removed after the call
+    sweep.pfba(model)
+    assert _state(model) == state
+
+
+def test_growth_sweep_matches_cobra(model):
+    IDs = [r.id for r in model.reactions]
+    state = _state(model)
+    df = sweep.growth_sweep(model, 'EX_glc__D_e', GROWTH_RATES, fluxes=IDs,
+                            biomass=BIOMASS)
+    assert _state(model) == state
+    for gr, row in zip(GROWTH_RATES, df.itertuples(index=False)):
+        with model:
+            model.reactions.get_by_id(BIOMASS).bounds = (gr, gr)
+            model.objective = {model.reactions.EX_glc__D_e: 1}
+            model.objective_direction = 'max'
+            if np.isnan(model.slim_optimize(error_value=np.nan)):
+                assert np.isnan(row[1])
+                continue
+            expected = pfba(model).fluxes
+        np.testing.assert_allclose(np.asarray(row[1:], dtype=float),
+                                   expected[df.columns[1:]], atol=1e-6)
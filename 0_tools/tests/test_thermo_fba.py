@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+import cobra
+
+from thermo_fba import pathway_thermo, add_thermo_constraints
+
+# a -> b -> c -> a
+S = [[-1, 0, 1], [1, -1, 0], [0, 1, -1]]
+
+
+def _thermo(dg0, ln_lb=np.log(1e-6), ln_ub=np.log(1e-2)):
+    return pathway_thermo({
+        'reactions': ['R1', 'R2', 'R3'], 'compounds': ['a', 'b', 'c'],
+        'S': np.array(S, dtype=float), 'dg0': np.array(dg0, dtype=float),
+        'dg_sigma': None, 'dg_confidence': 0.0, 'RT': 2.479,
+        'ln_lb': np.full(3, ln_lb), 'ln_ub': np.full(3, ln_ub),
+    })
+
+
+@pytest.fixture
+def model():
+    model = cobra.Model()
+    for ID, formula in [('R1', 'a_c <=> b_c'), ('R2', 'b_c <=> c_c'),
+                        ('R3', 'c_c <=> a_c')]:
+        rxn = cobra.Reaction(ID)
+        model.add_reactions([rxn])
+        rxn.build_reaction_from_string(formula, verbose=False)
+        rxn.bounds = (-10, 10)
+    model.objective = 'R1'
+    return model
+
+
+def test_loop_is_removed(model):
+    # every reaction can run both ways on its own, but not around the loop
+    thermo = _thermo([-5, -5, 10])
+    assert (thermo['dg_min'] < 0).all() and (thermo['dg_max'] > 0).all()
+    assert model.slim_optimize() == pytest.approx(10)
+    with model:
+        add_thermo_constraints(model, thermo)
+        assert model.slim_optimize() == pytest.approx(0)
+    assert model.slim_optimize() == pytest.approx(10)
+
+
+def test_allowed_direction_is_feasible(model):
+    for ID, formula in [('EX_a', 'a_c <=>'), ('EX_c', 'c_c <=>')]:
+        rxn = cobra.Reaction(ID)
+        model.add_reactions([rxn])
+        rxn.build_reaction_from_string(formula, verbose=False)
+    model.reactions.R3.bounds = (0, 0)
+    with model:
+        add_thermo_constraints(model, _thermo([-5, -5, 10]))
+        assert model.slim_optimize() == pytest.approx(10)
+        assert model.reactions.R2.flux == pytest.approx(10)
+
+
+def test_blocked_both_ways_is_rejected(model):
+    # fixed concentrations and ΔG'° = 0: R3 cannot reach ±min_driving_force
+    thermo = _thermo([-5, 5, 0], np.log(1e-3), np.log(1e-3))
+    with pytest.raises(ValueError, match='R3'):
+        add_thermo_constraints(model, thermo)
+    # without the loop constraints only the bounds are set
+    with model:
+        add_thermo_constraints(model, thermo, loopless=False)
+        assert model.reactions.R1.bounds == (0, 10)
+        assert model.reactions.R2.bounds == (-10, 0)
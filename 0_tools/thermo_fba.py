@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Thermodynamic constraints from the SBtab MDF models on the FBA models.
+
+The ΔG'° of the reactions of an SBtab pathway (see mdf_tools.mdf_arrays)
+and its concentration bounds give the range of ΔG' of every reaction.
+Reactions that can only run one way get that direction as flux bounds. With
+loopless=True the pathway subnetwork is also made a small MILP: each
+pathway reaction has a binary direction variable, and only flux directions
+with negative ΔG' for one common set of concentrations are allowed, which
+removes thermodynamically infeasible cycles through the pathway. The rest
+of the model stays an LP.
+
+The ΔG'° uncertainty of the MDF problem is a chi2 ellipsoid over
+correlated errors. Here every reaction gets the ΔG'° range of that
+ellipsoid on its own, dg0 ± spread, as in dg_min and dg_max, and the
+ranges are independent of each other: a relaxation that allows some
+combinations of ΔG'° outside the ellipsoid, but keeps the problem linear.
+"""
+import numpy as np
+import pandas as pd
+import cobra
+from scipy import stats
+
+from fba_utils import set_bounds
+
+
+def pathway_thermo(model, reactions=None, reaction_map=None,
+                   compound_map=None) -> dict:
+    """ΔG' data of an SBtab pathway for add_thermo_constraints.
+
+    model is a ThermodynamicModel, with update_standard_dgs() applied, or
+    its mdf_arrays. reaction_map renames SBtab reactions to FBA reaction IDs
+    and compound_map SBtab compounds to FBA metabolite IDs (default
+    '<compound>_c'). reactions restricts the result to these FBA reaction
+    IDs. Returns a dict of arrays that can be pickled to the workers.
+    """
+    if isinstance(model, dict):
+        arrays = model
+    else:
+        # cvxpy is only needed on the MDF side
+        from mdf_tools import mdf_arrays
+        arrays = mdf_arrays(model)
+    reaction_map = reaction_map or {}
+    compound_map = compound_map or {}
+    IDs = [reaction_map.get(r, r) for r in arrays['reactions']]
+    keep = [i for i, ID in enumerate(IDs) if reactions is None or ID in reactions]
+    S = arrays['S'][:, keep]
+    used = np.flatnonzero(np.abs(S).sum(axis=1) > 0)
+    S = S[used]
+    RT = arrays['RT']
+    ln_lb, ln_ub = arrays['ln_lb'][used], arrays['ln_ub'][used]
+
+    dg0 = arrays['dg0'][keep]
+    # the ΔG'° uncertainty is the chi2 ellipsoid of the MDF problem
+    dg_sigma = arrays['dg_sigma']
+    if dg_sigma is not None and arrays['dg_confidence'] > 0:
+        dg_sigma = dg_sigma[keep]
+        radius = stats.chi2.ppf(arrays['dg_confidence'], dg_sigma.shape[1]) ** 0.5
+    else:
+        dg_sigma, radius = np.zeros((len(keep), 0)), 0.0
+    spread = radius * np.linalg.norm(dg_sigma, axis=1)
+    dg_min = (dg0 - spread + RT * (np.clip(S, None, 0).T @ ln_ub
+                                   + np.clip(S, 0, None).T @ ln_lb))
+    dg_max = (dg0 + spread + RT * (np.clip(S, 0, None).T @ ln_ub
+                                   + np.clip(S, None, 0).T @ ln_lb))
+    compounds = [arrays['compounds'][i] for i in used]
+    return {
+        'reactions': [IDs[i] for i in keep],
+        'compounds': compounds,
+        'metabolites': [compound_map.get(c, f'{c}_c') for c in compounds],
+        'S': S, 'dg0': dg0, 'dg_sigma': dg_sigma, 'radius': radius,
+        'spread': spread,
+        'ln_lb': ln_lb, 'ln_ub': ln_ub, 'RT': RT,
+        'dg_min': dg_min, 'dg_max': dg_max,
+    }
+
+
+def _orientation(rxn, thermo, j, tol=1e-6):
+    """+1 or -1 as rxn is written as the SBtab reaction or reversed."""
+    signs = set()
+    for i in np.flatnonzero(thermo['S'][:, j]):
+        ID = thermo['metabolites'][i]
+        coef = next((c for m, c in rxn._metabolites.items() if m.id == ID), 0)
+        if abs(abs(coef) - abs(thermo['S'][i, j])) > tol:
+            signs.add(0)
+        else:
+            signs.add(np.sign(coef * thermo['S'][i, j]))
+    if len(signs) != 1 or 0 in signs:
+        raise ValueError(f"{rxn.id} differs from the SBtab reaction; "
+                         "check reaction_map and compound_map")
+    return int(signs.pop())
+
+
+def thermo_table(thermo) -> pd.DataFrame:
+    """ΔG'° and the range of ΔG' (kJ/mol) of the pathway reactions."""
+    return pd.DataFrame({
+        'dG0': thermo['dg0'], 'dG_min': thermo['dg_min'],
+        'dG_max': thermo['dg_max'],
+    }, index=pd.Index(thermo['reactions'], name='Reaction'))
+
+
+def add_thermo_constraints(model: cobra.Model,
+                           thermo: dict,
+                           loopless=True,
+                           min_driving_force=0.1,
+                           max_flux=1000) -> list:
+    """Constrain the pathway reactions of model by their ΔG'.
+
+    thermo comes from pathway_thermo. Reactions whose ΔG' range excludes
+    one direction get it closed by their bounds. With loopless, a pathway
+    reaction carrying flux needs ΔG' of at most -min_driving_force (kJ/mol)
+    in its direction, with one set of concentrations and ΔG'° for the whole
+    pathway; fluxes are limited to max_flux in the MILP. A reaction whose
+    ΔG' range lies within ±min_driving_force could run neither way, even at
+    zero flux, and raises a ValueError. Inside a model context all
+    constraints are removed with the context. Returns the IDs of the
+    constrained reactions.
+    """
+    rxns = [model.reactions.get_by_id(ID) for ID in thermo['reactions']]
+    signs = [_orientation(r, thermo, j) for j, r in enumerate(rxns)]
+    if loopless:
+        stuck = [r.id for r, lo, hi in zip(rxns, thermo['dg_min'], thermo['dg_max'])
+                 if lo > -min_driving_force and hi < min_driving_force]
+        if stuck:
+            raise ValueError(f"The ΔG' range of {', '.join(stuck)} lies within "
+                             f"±{min_driving_force} kJ/mol; lower "
+                             "min_driving_force or leave out the reactions")
+
+    bounds = {}
+    for rxn, sign, lo, hi in zip(rxns, signs, thermo['dg_min'], thermo['dg_max']):
+        # fluxes in the direction of the SBtab reaction, sign * v
+        if hi < 0:
+            bounds[rxn] = (0, rxn.upper_bound) if sign > 0 else (rxn.lower_bound, 0)
+        elif lo > 0:
+            bounds[rxn] = (rxn.lower_bound, 0) if sign > 0 else (0, rxn.upper_bound)
+        else:
+            continue
+        if bounds[rxn][0] > bounds[rxn][1]:
+            raise ValueError(f"{rxn.id} is forced against its ΔG'")
+    set_bounds(model, bounds)
+    if not loopless:
+        return [r.id for r in rxns]
+
+    prob = model.problem
+    ln_conc = [prob.Variable(f'thermo_ln_{c}', lb=lb, ub=ub) for c, lb, ub in
+               zip(thermo['compounds'], thermo['ln_lb'], thermo['ln_ub'])]
+    variables, constraints = ln_conc, []
+    for j, (rxn, sign) in enumerate(zip(rxns, signs)):
+        direction = prob.Variable(f'thermo_dir_{rxn.id}', type='binary')
+        dg = prob.Variable(f'thermo_dG_{rxn.id}', lb=thermo['dg_min'][j],
+                           ub=thermo['dg_max'][j])
+        variables += [direction, dg]
+        terms = [thermo['RT'] * thermo['S'][i, j] * ln_conc[i]
+                 for i in np.flatnonzero(thermo['S'][:, j])]
+        # ΔG' = ΔG'° + RT S' ln(c), with ΔG'° within dg0 ± spread
+        constraints.append(prob.Constraint(
+            dg - sum(terms), lb=thermo['dg0'][j] - thermo['spread'][j],
+            ub=thermo['dg0'][j] + thermo['spread'][j],
+            name=f'thermo_dGdef_{rxn.id}'))
+        # direction 1: sign * v >= 0 and ΔG' <= -min_driving_force;
+        # direction 0: sign * v <= 0 and ΔG' >= min_driving_force
+        flux = sign * (rxn.forward_variable - rxn.reverse_variable)
+        big = max(abs(thermo['dg_min'][j]), abs(thermo['dg_max'][j])) + min_driving_force
+        constraints += [
+            prob.Constraint(flux - max_flux * direction, ub=0,
+                            name=f'thermo_fwd_{rxn.id}'),
+            prob.Constraint(flux - max_flux * direction, lb=-max_flux,
+                            name=f'thermo_rev_{rxn.id}'),
+            prob.Constraint(dg + (big + min_driving_force) * direction, ub=big,
+                            name=f'thermo_dGfwd_{rxn.id}'),
+            prob.Constraint(dg + (big + min_driving_force) * direction,
+                            lb=min_driving_force, name=f'thermo_dGrev_{rxn.id}'),
+        ]
+    model.add_cons_vars(variables + constraints)
+    return [r.id for r in rxns]
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Pathway x precursor yield matrix solved on a process pool.
+
+Each worker unpickles the base model once and keeps it for its lifetime.
+Cells are sent to the workers grouped by pathway, so a worker applies the
+reactions of a pathway once and solves its precursors one after another.
+By default the precursor drains are installed once per worker and a solve
+only switches the objective (see fba_utils.add_precursor_drains).
+"""
+import math
+import pickle
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import cobra
+from cobra.util.solver import linear_reaction_coefficients
+
+from fba_utils import (AddRxn, KORxn, change_objective, prodFBA,
+                       add_precursor_drains, set_precursor_objective)
+from flux_store import FluxStore
+from parallel import pool_size
+from thermo_fba import add_thermo_constraints
+
+_worker = {}
+
+
+def _init_worker(data, psws, knockouts, bounds, stoich, saveif,
+                 precursors, drains, keep_fluxes=False, thermo=None):
+    model = pickle.loads(data) if isinstance(data, bytes) else data
+    # the outer context undoes the drains on the caller's model (processes=1)
+    model.__enter__()
+    model.objective = linear_reaction_coefficients(model)
+    _worker.update(
+        model=model, psws=psws, knockouts=knockouts, bounds=bounds,
+        stoich=stoich, saveif=saveif, keep_fluxes=keep_fluxes, psw=None,
+        thermo=thermo or {},
+        drains=add_precursor_drains(model, precursors) if drains else None,
+    )
+
+
+def _leave_pathway():
+    if _worker.get('psw') is not None:
+        _worker['model'].__exit__(None, None, None)
+        _worker['psw'] = None
+
+
+def _close_worker():
+    _leave_pathway()
+    _worker['model'].__exit__(None, None, None)
+    _worker.clear()
+
+
+def _enter_pathway(psw):
+    """Set up the worker model for a pathway, undoing the previous one."""
+    model = _worker['model']
+    if _worker['psw'] == psw:
+        return model
+    _leave_pathway()
+    model.__enter__()
+    _worker['psw'] = psw
+    for ID, bounds in _worker['bounds'].items():
+        model.reactions.get_by_id(ID).bounds = bounds
+    AddRxn(model, _worker['psws'][psw])
+    for ID, mets in _worker['stoich'].get(psw, {}).items():
+        model.reactions.get_by_id(ID).add_metabolites(mets)
+    KORxn(model, _worker['knockouts'].get(psw, []))
+    if psw in _worker['thermo']:
+        add_thermo_constraints(model, _worker['thermo'][psw])
+    return model
+
+
+def _optimize(model, psw, precursor):
+    """prodFBA, also handing back the fluxes when they go to a FluxStore."""
+    value, solution = prodFBA(model, psw, precursor, _worker['saveif'],
+                              keep_solution=True)
+    return value, solution if _worker['keep_fluxes'] else None
+
+
+def _solve_cell(psw, precursor):
+    model = _enter_pathway(psw)
+    if _worker['drains'] is not None:
+        set_precursor_objective(model, _worker['drains'], precursor)
+        return _optimize(model, psw, precursor)
+    with model:
+        if precursor != 'biomass':
+            change_objective(model, precursor)
+        return _optimize(model, psw, precursor)
+
+
+def _variant(psw, bounds, stoich, thermo) -> str:
+    """Short hash of the bounds, stoich and thermo data of a pathway, or ''."""
+    data = [sorted((ID, tuple(b)) for ID, b in bounds.items()),
+            sorted((ID, sorted((str(m), c) for m, c in mets.items()))
+                   for ID, mets in stoich.get(psw, {}).items()),
+            sorted((k, np.asarray(v).tolist())
+                   for k, v in thermo.get(psw, {}).items())]
+    if not any(data):
+        return ''
+    return hashlib.sha1(repr(data).encode()).hexdigest()[:10]
+
+
+def yield_matrix(model: cobra.Model,
+                 psws: dict,
+                 precursors: list,
+                 knockouts: dict = None,
+                 bounds: dict = None,
+                 stoich: dict = None,
+                 saveif=False,
+                 drains=True,
+                 store=None,
+                 scenario=None,
+                 thermo: dict = None,
+                 processes=None) -> pd.DataFrame:
+    """Maximal yields of the precursors (rows) for the pathways (columns).
+
+    psws maps a pathway name to its NewRxns4Full_*.csv file. Per pathway
+    modifications are given as data: knockouts {psw: [rxn IDs]}, stoich
+    {psw: {rxn ID: {met ID: coef}}}, and bounds {rxn ID: (lb, ub)} applied
+    to every pathway. With drains=False every solve adds its drain with
+    change_objective as before. With processes=1 the cells are solved in
+    this process; by default also when called from the top-level code of
+    a script on Windows or macOS (see parallel.pool_size).
+
+    store (a FluxStore or its directory) receives the flux vector of every
+    cell, keyed by pathway, precursor, the pathway knock-outs and as variant
+    a hash of its bounds, stoich and thermo data; scenario adds further keys
+    such as {'medium': 'formate'}.
+
+    thermo {psw: thermo_fba.pathway_thermo(...)} adds the ΔG' direction and
+    loop constraints of the SBtab pathway, which makes those solves MILPs.
+    """
+    knockouts = knockouts or {}
+    bounds = bounds or {}
+    stoich = stoich or {}
+    cells = [(psw, precursor) for psw in psws for precursor in precursors]
+    processes = pool_size(processes, len(cells))
+
+    if processes <= 1:
+        _init_worker(model, psws, knockouts, bounds, stoich, saveif,
+                     precursors, drains, store is not None, thermo)
+        try:
+            values = [_solve_cell(*cell) for cell in cells]
+        finally:
+            _close_worker()
+    else:
+        data = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        chunksize = max(1, math.ceil(len(cells) / (4 * processes)))
+        with ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_worker,
+                initargs=(data, psws, knockouts, bounds, stoich, saveif,
+                          precursors, drains, store is not None, thermo)) as pool:
+            values = list(pool.map(_solve_cell, *zip(*cells), chunksize=chunksize))
+
+    if store is not None and not isinstance(store, FluxStore):
+        store = FluxStore(store)
+    results = pd.DataFrame(index=list(precursors), columns=list(psws), dtype=float)
+    for (psw, precursor), (value, solution) in zip(cells, values):
+        results.loc[precursor, psw] = value
+    if store is not None:
+        solutions = dict(zip(cells, (solution for _, solution in values)))
+        for psw in psws:
+            variant = _variant(psw, bounds, stoich, thermo or {})
+            # the pathway reactions and drains give the data of new reactions
+            with model:
+                AddRxn(model, psws[psw])
+                if drains:
+                    add_precursor_drains(model, precursors)
+                for precursor in precursors:
+                    store.append(solutions[psw, precursor], model,
+                                 pathway=psw, precursor=precursor,
+                                 knockouts=knockouts.get(psw, []),
+                                 variant=variant,
+                                 **(scenario or {}))
+    return results
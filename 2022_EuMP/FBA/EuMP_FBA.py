@@ -5,93 +5,29 @@ import numpy as np
 import pandas as pd
 import cobra
 
+sys.path.append(os.path.join('..', '..', '0_tools'))
+import iml1515
+from fba_utils import KORxn, flux2file
+from yield_matrix import yield_matrix
+import sweep
+from flux_summary import flux_summary
+from medium import apply_medium
+from phase_plane import phase_plane
+from pathway_fva import pathway_fva
+from strain import Strain
+from plotting import HEADLESS
+
 print('Python version:', sys.version)
 print('numpy version:', np.__version__)
 print('pandas version:', pd.__version__)
 print('cobrapy version:', cobra.__version__)
 
 # %%
-def AddRxn(model: cobra.Model,
-           newRxnFile):
-    """Function of adding new reactions to the model."""
-    n1 = len(model.reactions)
-    AllAddRxn = pd.read_csv(newRxnFile, sep=',', index_col='RxnID', skipinitialspace=True)
-    n2 = len(AllAddRxn)
-    for i in range(n2):
-        ID = AllAddRxn.index.values[i]
-        addRxn = cobra.Reaction(ID)
-        model.add_reactions([addRxn])
-        addRxnInf = model.reactions[n1 + i]
-        addRxnInf.name = AllAddRxn.loc[ID, 'RxnName']
-        addRxnInf.reaction = AllAddRxn.loc[ID, 'RxnFormula']
-        addRxnInf.subsystem = AllAddRxn.loc[ID, 'Subsystem']
-        addRxnInf.lower_bound = AllAddRxn.loc[ID, 'LowerBound']
-        addRxnInf.upper_bound = AllAddRxn.loc[ID, 'UpperBound']
-    return model
-
-# %%
-def KORxn(model: cobra.Model,
-          rxns2KO: list):
-    """Function for knocking out reactions."""
-    for ID in rxns2KO:
-        reaction = model.reactions.get_by_id(ID)
-        reaction.knock_out()
-
-# %%
-def pfba(model: cobra.Model):
-    cobra.flux_analysis.pfba(model)
-    print(model.summary())
-
-# %%
-def change_objective(model, product):
-    """change objective function"""
-    if product in ['accoa_c', 'succoa_c']:
-        rxn = cobra.Reaction(id=f"EX_{product}", lower_bound=-1000, upper_bound=1000)
-        model.add_reaction(rxn)
-        rxn.add_metabolites({product: -1, 'coa_c': 1})
-    elif product in ['g6p_c', 'f6p_c', 'e4p_c', 'r5p_c', 'g3p_c', '3pg_c', 'pep_c']:
-        rxn = cobra.Reaction(id=f"EX_{product}", lower_bound=-1000, upper_bound=1000)
-        model.add_reaction(rxn)
-        rxn.add_metabolites({product: -1, 'pi_c': 1})
-    elif f"EX_{product}" not in model.reactions:
-        rxn = cobra.Reaction(id=f"EX_{product}", lower_bound=-1000, upper_bound=1000)
-        model.add_reaction(rxn)
-        rxn.add_metabolites({product: -1})
-    model.objective = f"EX_{product}"
+def pfba(model: cobra.Model) -> cobra.Solution:
+    solution = sweep.pfba(model)
+    print(flux_summary(model, solution))
+    return solution
 
-# %%
-def flux2file(model: cobra.Model, 
-              psw, product, output_dir='tmp'):
-    """Function of exporting flux data."""
-    n = len(model.reactions)
-    modelMatrix = np.empty([n, 9], dtype = object)
-    for i in range(len(model.reactions)):
-        x = model.reactions[i]
-        modelMatrix[i, 0] = i + 1
-        modelMatrix[i, 1] = x.id
-        modelMatrix[i, 2] = x.name
-        modelMatrix[i, 3] = x.reaction
-        modelMatrix[i, 4] = x.subsystem
-        modelMatrix[i, 5] = x.lower_bound
-        modelMatrix[i, 6] = x.upper_bound
-        modelMatrix[i, 7] = x.flux
-        modelMatrix[i, 8] = abs(x.flux)
-        
-    df = pd.DataFrame(data = modelMatrix, 
-                      columns = ['N', 'RxnID', 'RxnName', 'Reaction', 'SubSystem', 
-                      'LowerBound', 'UpperBound', 'Flux-core', 'abs(Flux)'])
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
-    filepath = os.path.join(output_dir, '{}_{}.xlsx'.format(psw, product))
-    df.to_excel(filepath, index=False)
-#%%
-def prodFBA(model, psw, product,saveif):
-    solution = model.optimize()
-    # print("%s: " %product, round(solution.objective_value, 3))
-    # export results
-    if saveif: 
-        flux2file(model, psw, product)
-    return round(solution.objective_value, 3)
 # %% [markdown]
 # ## Model background
 # 
@@ -107,13 +43,6 @@ def prodFBA(model, psw, product,saveif):
 # and F6PA: f6p_c ⇌ dha_c + g3p_c, which seems to be not active in vivo. PTAr. 
 
 
-# %%
-model = cobra.io.load_json_model(r'..\..\0_ecoli_models\iML1515.json')
-
-model.reactions.THD2pp.add_metabolites({"h_p": 1, "h_c": -1})
-model.reactions.HSDy.bounds = (-1000, 0)
-model.reactions.MMM.bounds = (-1000, 1000)
-
 # %% [markdown]
 # ## Base knock-outs
 # * pyruvate synthase (POR5), 3pg producing glycerate kinase (GLYCK)
@@ -127,15 +56,14 @@ KORxn_base = ['POR5', 'GLYCK', 'FDH4pp', 'FDH5pp', 'ATPM',
               'PFL', 'OBTFL', 'GART', 'DRPA', 'PAI2T',
               'FRD2','FRD3','F6PA']
 
-KORxn(model, KORxn_base)
+# curated model, read from the cache in 0_ecoli_models/.cache after the first run
+model = iml1515.load_model(patches=('THD2pp', 'HSDy', 'MMM'),
+                           knockouts=KORxn_base)
 
 #%%
 # Set medium: formaldehyde as sole the carbon source.
-for rxn in model.boundary:
-    if "C" in rxn.check_mass_balance(): # knock out all other carbon-related transporters
-        rxn.bounds = (0.0, 1000)
-model.reactions.get_by_id('EX_co2_e').bounds = (-1000, 1000)
-model.reactions.get_by_id('EX_fald_e').bounds = (-10, 0)
+# knock out all other carbon-related transporters, CO2 stays open
+apply_medium(model, 'formaldehyde')
 
 model.reactions.get_by_id('EX_h2s_e').bounds = (0.0, 0.0) # avoid using S as electron accepeter
 model.reactions.get_by_id('EX_fe3_e').bounds = (0.0, 0.0) # avoid using Fe2 as electron donor
@@ -159,75 +87,67 @@ precursors = ['biomass', 'g6p_c', 'f6p_c', 'e4p_c', 'r5p_c', 'g3p_c',
 # %%
 # saveif = True
 saveif = False
-precursors_results = pd.DataFrame()
+AddKO = {psw: ['FTHFLi', 'THRA', 'THRD',] for psw in psws}
+AddKO['SerCyc'] = ['THRA', 'THRD', 'EtMaCoA']  # no EtMaCoA to be fair
 
-for psw, pswrxns in psws.items():
-    with model:
-        _model = AddRxn(model, pswrxns)
-        if psw == 'SerCyc':
-            AddKO = ['THRA', 'THRD', 'EtMaCoA']  # no EtMaCoA to be fair
-        else:
-            AddKO = ['FTHFLi', 'THRA', 'THRD',]
-        KORxn(_model, AddKO)
-        for precursor in precursors:
-            with _model:
-                if precursor != 'biomass':
-                    change_objective(_model, precursor)
-                sol = prodFBA(_model, psw, precursor, saveif)
-                precursors_results.loc[precursor, psw] = sol
+# the pathway x precursor cells are solved in parallel, one process per core
+precursors_results = yield_matrix(model, psws, precursors,
+                                  knockouts=AddKO, saveif=saveif)
 
 precursors_results
 # %% 
-import matplotlib.pyplot as plt 
-
-plt.rcParams["font.family"] = "Arial"
-plt.rcParams['ytick.labelsize'] = 15
-plt.rcParams['xtick.labelsize'] = 15
-plt.rcParams['axes.titlesize'] = 24
-plt.rcParams['axes.labelsize'] = 18
-plt.rcParams['legend.title_fontsize'] = 15
-plt.rcParams['legend.fontsize'] = 13
-plt.rcParams.update({'mathtext.default': 'regular'})
-plt.rcParams['axes.axisbelow'] = True
-plt.rcParams['savefig.bbox'] = 'tight'
-
-x = np.arange(len(precursors))
-witdh = 0.2
-
-fig, ax = plt.subplots(figsize=(16, 6))
-ax.set_xticks(x)
-ax.set_xlim(-0.5, 12.5)
-ax.set_xticklabels(precursors)
-ax.set_yticklabels(map(str, np.arange(0, 7, 1)/10))
-ax.set_ylabel('Maximal yeild (mol/mol-Fald)')
-plt.grid(which='both', axis='y')
-ax.bar(x-1.5*witdh, precursors_results['RuMP'], witdh, label='RuMP')
-ax.bar(x-0.5*witdh, precursors_results['EuMP'], witdh, label = 'EuMP')
-ax.bar(x+0.5*witdh, precursors_results['SerCyc'], witdh, label = 'SerCyc')
-ax.bar(x+1.5*witdh, precursors_results['XuMP'], witdh, label = 'XuMP')
-plt.legend()
-plt.savefig('12 precursors production figure.eps', dpi=300)
-plt.show()
+if not HEADLESS:
+    import matplotlib.pyplot as plt 
+
+    plt.rcParams["font.family"] = "Arial"
+    plt.rcParams['ytick.labelsize'] = 15
+    plt.rcParams['xtick.labelsize'] = 15
+    plt.rcParams['axes.titlesize'] = 24
+    plt.rcParams['axes.labelsize'] = 18
+    plt.rcParams['legend.title_fontsize'] = 15
+    plt.rcParams['legend.fontsize'] = 13
+    plt.rcParams.update({'mathtext.default': 'regular'})
+    plt.rcParams['axes.axisbelow'] = True
+    plt.rcParams['savefig.bbox'] = 'tight'
+
+    x = np.arange(len(precursors))
+    witdh = 0.2
+
+    fig, ax = plt.subplots(figsize=(16, 6))
+    ax.set_xticks(x)
+    ax.set_xlim(-0.5, 12.5)
+    ax.set_xticklabels(precursors)
+    ax.set_yticklabels(map(str, np.arange(0, 7, 1)/10))
+    ax.set_ylabel('Maximal yeild (mol/mol-Fald)')
+    plt.grid(which='both', axis='y')
+    ax.bar(x-1.5*witdh, precursors_results['RuMP'], witdh, label='RuMP')
+    ax.bar(x-0.5*witdh, precursors_results['EuMP'], witdh, label = 'EuMP')
+    ax.bar(x+0.5*witdh, precursors_results['SerCyc'], witdh, label = 'SerCyc')
+    ax.bar(x+1.5*witdh, precursors_results['XuMP'], witdh, label = 'XuMP')
+    plt.legend()
+    plt.savefig('12 precursors production figure.eps', dpi=300)
+    plt.show()
 
 # %%
 # yield of RuMP as 100%
 yield_norm = precursors_results.div(precursors_results.RuMP, axis=0) * 100
 round(yield_norm,1)
 
-fig, ax = plt.subplots(figsize=(16, 6))
-ax.set_xticks(x)
-ax.set_xlim(-0.5, 12.5)
-ax.set_xticklabels(precursors)  
-ax.set_ylim(0, 115)
-ax.set_ylabel('')
-plt.grid(which='both', axis='y')
-ax.bar(x-1.5*witdh, yield_norm['RuMP'], witdh, label='RuMP',)
-ax.bar(x-0.5*witdh, yield_norm['EuMP'], witdh, label = 'EuMP',)
-ax.bar(x+0.5*witdh, yield_norm['SerCyc'], witdh, label = 'SerCyc',)
-ax.bar(x+1.5*witdh, yield_norm['XuMP'], witdh, label = 'XuMP',)
-plt.legend()
-plt.savefig('production comparison figure.eps', dpi=300)
-plt.show()
+if not HEADLESS:
+    fig, ax = plt.subplots(figsize=(16, 6))
+    ax.set_xticks(x)
+    ax.set_xlim(-0.5, 12.5)
+    ax.set_xticklabels(precursors)  
+    ax.set_ylim(0, 115)
+    ax.set_ylabel('')
+    plt.grid(which='both', axis='y')
+    ax.bar(x-1.5*witdh, yield_norm['RuMP'], witdh, label='RuMP',)
+    ax.bar(x-0.5*witdh, yield_norm['EuMP'], witdh, label = 'EuMP',)
+    ax.bar(x+0.5*witdh, yield_norm['SerCyc'], witdh, label = 'SerCyc',)
+    ax.bar(x+1.5*witdh, yield_norm['XuMP'], witdh, label = 'XuMP',)
+    plt.legend()
+    plt.savefig('production comparison figure.eps', dpi=300)
+    plt.show()
 
 # %% [markdown]
 # ### To calculation selection pressures
@@ -236,10 +156,10 @@ plt.show()
 # 
 # ### ${\Delta}$frmRAB ${\Delta}$tktAB strain
 # To confirm the strain does not grow on glycerol alone
-model_m = model.copy()
-eump_m = AddRxn(model_m, 'NewRxns4Full_EuMP.csv')
+# a diff applied to `model` inside the with blocks, no model copy
+eump_m = Strain(model, 'EuMP').add_rxn_file('NewRxns4Full_EuMP.csv')
 # KO DHAPT to block f6p -> dha -> dhap for better interpretation 
-eump_m.reactions.DHAPT.knock_out()
+eump_m.knock_out(['DHAPT'])
 #%%
 with eump_m as m: 
     m.reactions.EX_glyc_e.lower_bound = -10
@@ -255,9 +175,9 @@ with eump_m as m:
     m.reactions.BIOMASS_Ec_iML1515_core_75p37M.bounds = (1,1)
     m.objective = {m.reactions.EPS: 1}
     m.objective_direction = 'min'
-    pfba(m)
-    flux2file(m,'EuMP','2_tkt')
-    f_TKT = m.reactions.EPS.flux
+    solution = pfba(m)
+    flux2file(m,'EuMP','2_tkt',solution=solution)
+    f_TKT = solution.fluxes['EPS']
 
 # %%[markdown]
 # ### ${\Delta}$frmRAB ${\Delta}$fbp ${\Delta}$glpX strain
@@ -276,6 +196,59 @@ with eump_m as m:
     m.reactions.BIOMASS_Ec_iML1515_core_75p37M.bounds = (1,1)
     m.objective = {m.reactions.EPS: 1}
     m.objective_direction = 'min'
-    pfba(m)
-    flux2file(m,'EuMP','4_fbp')
-    f_FBP = m.reactions.EPS.flux
+    solution = pfba(m)
+    flux2file(m,'EuMP','4_fbp',solution=solution)
+    f_FBP = solution.fluxes['EPS']
+
+# %% [markdown]
+# ### Thermodynamically constrained yields
+# ΔG'° of the EuMP reactions from the SBtab MDF model (../MDF/EuMP.tsv) 
+# close infeasible directions and, as a MILP on the EuMP reactions only, 
+# infeasible cycles through them
+# equilibrator is only needed for this cell, which is skipped without it
+try:
+    from equilibrator_api import ComponentContribution
+    from equilibrator_pathway import ThermodynamicModel
+except ImportError:
+    ThermodynamicModel = None
+    print('equilibrator-api and equilibrator-pathway are not installed, '
+          'skipping the thermodynamically constrained yields')
+
+if ThermodynamicModel is not None:
+    import dgf_cache
+    from thermo_fba import pathway_thermo, thermo_table
+
+    EuMP_sbtab = ThermodynamicModel.from_sbtab(os.path.join('..', 'MDF', 'EuMP.tsv'),
+                                               comp_contrib=ComponentContribution())
+    dgf_cache.update_standard_dgs(EuMP_sbtab)
+    thermo = {'EuMP': pathway_thermo(EuMP_sbtab, reactions=['EPS', 'LerI', 'DerI'])}
+    print(thermo_table(thermo['EuMP']))
+    thermo_results = yield_matrix(model, {'EuMP': psws['EuMP']}, precursors,
+                                  knockouts=AddKO, thermo=thermo)
+    print(thermo_results.join(precursors_results['EuMP'], rsuffix=' (no ΔG)'))
+
+# %% [markdown]
+# ### Flexibility of the EuMP reactions
+# Flux ranges of the added reactions at 95% of the maximal growth on FALD
+with eump_m as m:
+    eump_fva = pathway_fva(m, rxn_file='NewRxns4Full_EuMP.csv',
+                           fraction_of_optimum=0.95)
+eump_fva
+
+# %% [markdown]
+# ### Phase plane of the EuMP strain: FALD uptake x O2 uptake -> growth
+fald_uptake = np.linspace(-20, 0, 41)
+o2_uptake = np.linspace(-20, 0, 41)
+with eump_m as m:
+    m.reactions.EX_fald_e.lower_bound = -1000
+    growth_plane = phase_plane(m, {'EX_fald_e': fald_uptake,
+                                   'EX_o2_e': o2_uptake})
+
+if not HEADLESS:
+    fig, ax = plt.subplots(figsize=(6, 5))
+    c = ax.contourf(-o2_uptake, -fald_uptake, growth_plane, levels=20)
+    fig.colorbar(c, ax=ax, label='Growth rate (1/h)')
+    ax.set_xlabel('O$_2$ uptake (mmol/gCDW/h)')
+    ax.set_ylabel('FALD uptake (mmol/gCDW/h)')
+    plt.savefig('EuMP phase plane.pdf')
+    plt.show()
@@ -1,16 +1,22 @@
 # %%
+import os
+import sys
 import equilibrator_api
 from equilibrator_api import ComponentContribution, Q_, ureg
 import equilibrator_pathway
 from equilibrator_pathway import ThermodynamicModel
-import matplotlib.pyplot as plt
+sys.path.append(os.path.join('..', '..', '0_tools'))
+import dgf_cache
+from plotting import HEADLESS
 
 print('equlibrator_api version:', equilibrator_api.__version__)
 print('equlibrator_pathway version:', equilibrator_pathway.__version__)
 
 ureg.default_format = ".2f~P"
-plt.rc('axes', axisbelow=True)
-ureg.setup_matplotlib(True)
+if not HEADLESS:
+    import matplotlib.pyplot as plt
+    plt.rc('axes', axisbelow=True)
+    ureg.setup_matplotlib(True)
 
 comp_contrib = ComponentContribution()
 
@@ -23,17 +29,19 @@ comp_contrib = ComponentContribution()
 # %%
 EuMP = ThermodynamicModel.from_sbtab('EuMP.tsv', comp_contrib=comp_contrib)
 
-EuMP.update_standard_dgs()
+dgf_cache.update_standard_dgs(EuMP)
 EuMP_mdf = EuMP.mdf_analysis()
 
 EuMP_mdf.reaction_df
 
 # %%
-fig, ax = plt.subplots(1, 1, figsize=(10, 5))
-EuMP_mdf.plot_driving_forces(ax)
-ax.grid('on')
-fig.savefig('mdf_result_EuMP.eps')
+if not HEADLESS:
+    fig, ax = plt.subplots(1, 1, figsize=(10, 5))
+    EuMP_mdf.plot_driving_forces(ax)
+    ax.grid('on')
+    fig.savefig('mdf_result_EuMP.eps')
 
 # %%
-fig, ax = plt.subplots(1, 1, figsize=(10, 15))
-EuMP_mdf.plot_concentrations(ax)
\ No newline at end of file
+if not HEADLESS:
+    fig, ax = plt.subplots(1, 1, figsize=(10, 15))
+    EuMP_mdf.plot_concentrations(ax)
\ No newline at end of file
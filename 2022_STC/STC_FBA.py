@@ -4,63 +4,34 @@ import sys, os
 import numpy as np
 import pandas as pd
 import cobra
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-plt.rcParams["font.family"] = "Arial"
-plt.rcParams['ytick.labelsize'] = 15
-plt.rcParams['xtick.labelsize'] = 15
-plt.rcParams['axes.titlesize'] = 20
-plt.rcParams['axes.labelsize'] = 18
-plt.rcParams['legend.title_fontsize'] = 15
-plt.rcParams['legend.fontsize'] = 13
-plt.rcParams.update({'mathtext.default': 'regular'})
-plt.rcParams['axes.axisbelow'] = True
-plt.rcParams['savefig.bbox'] = 'tight'
+sys.path.append(os.path.join('..', '0_tools'))
+import iml1515
+from fba_utils import flux2file, knock_out
+from sweep import growth_sweep, dependency_slope, pfba
+from flux_summary import flux_summary
+from strain import Strain
+from plotting import HEADLESS
+
+if not HEADLESS:
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.rcParams["font.family"] = "Arial"
+    plt.rcParams['ytick.labelsize'] = 15
+    plt.rcParams['xtick.labelsize'] = 15
+    plt.rcParams['axes.titlesize'] = 20
+    plt.rcParams['axes.labelsize'] = 18
+    plt.rcParams['legend.title_fontsize'] = 15
+    plt.rcParams['legend.fontsize'] = 13
+    plt.rcParams.update({'mathtext.default': 'regular'})
+    plt.rcParams['axes.axisbelow'] = True
+    plt.rcParams['savefig.bbox'] = 'tight'
 
 print('Python version:', sys.version)
 print('numpy version:', np.__version__)
 print('pandas version:', pd.__version__)
 print('cobrapy version:', cobra.__version__)
 
-# %%
-def KORxn(model: cobra.Model,
-          rxns2KO: list):
-    """Function for knocking out reactions."""
-    for ID in rxns2KO:
-        reaction = model.reactions.get_by_id(ID)
-        reaction.knock_out()
-
-# %%
-def pfba(model: cobra.Model):
-    cobra.flux_analysis.pfba(model)
-    
-# %%
-def flux2file(model: cobra.Model, 
-              psw, product, output_dir='tmp'):
-    """Function of exporting flux data."""
-    n = len(model.reactions)
-    modelMatrix = np.empty([n, 9], dtype = object)
-    for i in range(len(model.reactions)):
-        x = model.reactions[i]
-        modelMatrix[i, 0] = i + 1
-        modelMatrix[i, 1] = x.id
-        modelMatrix[i, 2] = x.name
-        modelMatrix[i, 3] = x.reaction
-        modelMatrix[i, 4] = x.subsystem
-        modelMatrix[i, 5] = x.lower_bound
-        modelMatrix[i, 6] = x.upper_bound
-        modelMatrix[i, 7] = x.flux
-        modelMatrix[i, 8] = abs(x.flux)
-        
-    df = pd.DataFrame(data = modelMatrix, 
-                      columns = ['N', 'RxnID', 'RxnName', 'Reaction', 'SubSystem', 
-                      'LowerBound', 'UpperBound', 'Flux-core', 'abs(Flux)'])
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
-    filepath = os.path.join(output_dir, '{}_{}.xlsx'.format(psw, product))
-    df.to_excel(filepath, index=False)
-
 # %% [markdown]
 # ## Model background
 # 
@@ -74,36 +45,27 @@ def flux2file(model: cobra.Model,
 
 # %%
 # Load full model and modification 
-model = cobra.io.load_json_model(r'..\0_ecoli_models\iML1515.json')
-
-model.reactions.THD2pp.add_metabolites({"h_p": 1, "h_c": -1})
-model.reactions.HSDy.bounds = (-1000, 0)
-
 KORxn_base = ['POR5', 'GLYCK', 'FDH4pp', 'FDH5pp',
               'PFL', 'OBTFL', 'GART', 'DRPA', 'PAI2T',
               'FRD2','FRD3']
 
-KORxn(model, KORxn_base)
+model = iml1515.load_model(patches=('THD2pp', 'HSDy'), knockouts=KORxn_base)
 # %%
-# add reactions
-model_STC = model.copy()
+# add reactions, as a diff applied to `model` inside the with blocks
+model_STC = Strain(model, 'STC')
 
-rxn = cobra.Reaction(id="FDH", name="formate dehydrogenase", lower_bound=0, upper_bound=1000)
-model_STC.add_reaction(rxn)
-rxn.add_metabolites({"for_c": -1, "nad_c": -1, "co2_c": 1, "nadh_c": 1})
+model_STC.add_reaction("FDH", {"for_c": -1, "nad_c": -1, "co2_c": 1, "nadh_c": 1},
+                       name="formate dehydrogenase", lower_bound=0, upper_bound=1000)
 
 # Set medium: remove all other carbon sources
-for rxn in model_STC.boundary:
-    if "C" in rxn.check_mass_balance(): # knock out all other carbon-related transporters
-        rxn.bounds = (0.0, 1000)
-model_STC.reactions.get_by_id('EX_co2_e').bounds = (-1000, 1000)
+# knock out all other carbon-related transporters, CO2 stays open
+model_STC.apply_medium('carbon-free')
 
 # %%
 # check the model on formate
 with model_STC as m: 
     m.reactions.EX_for_e.lower_bound=-10  # arbitrary
-    pfba(m)
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'STC','1-biomass')
 
 # %%
@@ -112,8 +74,7 @@ with model_STC as m:
     m.reactions.EX_for_e.lower_bound=-10  # arbitrary
     m.reactions.FDH.bounds = (0,0)
     m.reactions.ATPM.knock_out()
-    pfba(m)
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'STC-FDH','4-biomass')
 
 # FDH is essential 
@@ -124,18 +85,15 @@ with model_STC as m:
 with model_STC as m: 
     m.reactions.EX_gly_e.lower_bound=-10  # arbitrary 
     m.reactions.GLYCL.knock_out()  # GcvTHP
-    print(m.summary())
-    pfba(m)
+    print(flux_summary(m, pfba(m)))
 
 # %%
 with model_STC as m: 
     m.reactions.EX_for_e.lower_bound=-10
     m.reactions.EX_gly_e.lower_bound=-1000
-    m.reactions.GLYCL.knock_out()  # GcvTHP
-    m.genes.get_by_id('b0114').knock_out()  # aceE
-    m.genes.get_by_id('b0871').knock_out()  # poxB
-    print(m.summary())
-    pfba(m)
+    knock_out(m, reactions=['GLYCL'],  # GcvTHP
+              genes=['b0114', 'b0871'])  # aceE, poxB
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'STC','2-biomass')
 
 # %%
@@ -144,13 +102,11 @@ with model_STC as m:
 with model_STC as m: 
     m.reactions.EX_for_e.lower_bound=-10
     m.reactions.EX_gly_e.lower_bound=-1000
-    m.reactions.GLYCL.knock_out()  # GcvTHP
-    m.genes.get_by_id('b0114').knock_out()  # aceE
-    m.genes.get_by_id('b0871').knock_out()  # poxB
-    m.reactions.G6PDH2r.knock_out()
-    m.reactions.ETHAAL.knock_out()   # to block unrealistic AcAld production
-    print(m.summary())
-    pfba(m)
+    knock_out(m, reactions=['GLYCL',  # GcvTHP
+                            'G6PDH2r',
+                            'ETHAAL'],  # to block unrealistic AcAld production
+              genes=['b0114', 'b0871'])  # aceE, poxB
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'STC','3-biomass')
 
 # There is no ICL-MALS flux
@@ -163,18 +119,15 @@ with model_STC as m:
 # $$\dfrac{mmol/gCDW/h}{1/h} = \dfrac{mmol}{gCDW}$$
 # %% 
 # Modify the model 
-model_STC.reactions.GLYCL.knock_out()
-model_STC.genes.get_by_id('b0114').knock_out()  # aceE
-model_STC.genes.get_by_id('b0903').knock_out()  # pflB
-model_STC.genes.get_by_id('b0871').knock_out()  # poxB
-model_STC.genes.get_by_id('b2913').knock_out()  # serA
-model_STC.reactions.G6PDH2r.knock_out()
-model_STC.reactions.ETHAAL.knock_out()  
-
-rxn = cobra.Reaction(id="Pyc", name="pyruvate carboxylase", lower_bound=0, upper_bound=1000)
-model_STC.add_reaction(rxn)
-rxn.add_metabolites({"pyr_c": -1, "hco3_c": -1, "atp_c": -1, "oaa_c": 1, "adp_c": 1, "pi_c": 1})
-KORxn(model_STC,['PPC'])
+model_STC.knock_out(reactions=['GLYCL', 'G6PDH2r', 'ETHAAL'],
+                    genes=['b0114',  # aceE
+                           'b0903',  # pflB
+                           'b0871',  # poxB
+                           'b2913'])  # serA
+
+model_STC.add_reaction("Pyc", {"pyr_c": -1, "hco3_c": -1, "atp_c": -1, "oaa_c": 1, "adp_c": 1, "pi_c": 1},
+                       name="pyruvate carboxylase", lower_bound=0, upper_bound=1000)
+model_STC.knock_out(['PPC'])
 # %%
 # in the case of feeding formate soly
 FA = pd.DataFrame(
@@ -185,17 +138,13 @@ FA['Growth rate'] = np.arange(0.5,step=0.1)
 
 with model_STC as m: 
     m.reactions.EX_for_e.lower_bound=-1000
-    m.objective={m.reactions.EX_for_e: -1}
-    m.objective_direction = 'min'
-    for i in FA.index:
-        gr = FA.loc[i,'Growth rate']
-        m.reactions.BIOMASS_Ec_iML1515_core_75p37M.bounds = (gr, gr)
-        pfba(m)
-        FA.loc[i,'Formate uptake'] = abs(m.reactions.EX_for_e.flux)
-        FA.loc[i,'FDH flux'] = abs(m.reactions.FDH.flux)
-        FA.loc[i,'Ftfl flux'] = abs(m.reactions.FTHFLi.flux)
+    sweep = growth_sweep(m, 'EX_for_e', FA['Growth rate'],
+                         fluxes=['FDH', 'FTHFLi'])
+FA['Formate uptake'] = sweep['EX_for_e'].abs().values
+FA['FDH flux'] = sweep['FDH'].abs().values
+FA['Ftfl flux'] = sweep['FTHFLi'].abs().values
 
-slope_FA = (FA.iloc[4,1]-FA.iloc[0,1])/(FA.iloc[4,0]-FA.iloc[0,0])
+slope_FA = dependency_slope(FA['Growth rate'], FA['Formate uptake'])
 FA
 # %%
 # in the case of feeding formate + glycine
@@ -210,48 +159,45 @@ with model_STC as m:
     m.reactions.EX_gly_e.lower_bound=-1000
     m.genes.get_by_id('b4015').knock_out()  # aceA
 
-    m.objective={m.reactions.EX_for_e: -1}
-    m.objective_direction = 'min'
-    for i in FA_G.index:
-        gr = FA_G.loc[i,'Growth rate']
-        m.reactions.BIOMASS_Ec_iML1515_core_75p37M.bounds = (gr, gr)
-        pfba(m)
-        FA_G.loc[i,'Formate uptake'] = abs(m.reactions.EX_for_e.flux)
-        FA_G.loc[i,'FDH flux'] = abs(m.reactions.FDH.flux)
-        FA_G.loc[i,'Ftfl flux'] = abs(m.reactions.FTHFLi.flux)
-        FA_G.loc[i,'Glycine uptake'] = abs(m.reactions.EX_gly_e.flux)
+    sweep = growth_sweep(m, 'EX_for_e', FA_G['Growth rate'],
+                         fluxes=['FDH', 'FTHFLi', 'EX_gly_e'])
+FA_G['Formate uptake'] = sweep['EX_for_e'].abs().values
+FA_G['FDH flux'] = sweep['FDH'].abs().values
+FA_G['Ftfl flux'] = sweep['FTHFLi'].abs().values
+FA_G['Glycine uptake'] = sweep['EX_gly_e'].abs().values
 
-slope_FA_G = (FA_G.iloc[4,1]-FA_G.iloc[0,1])/(FA_G.iloc[4,0]-FA_G.iloc[0,0])
+slope_FA_G = dependency_slope(FA_G['Growth rate'], FA_G['Formate uptake'])
 FA_G
 # %%
-fig, ax = plt.subplots(1,2,sharey=True,figsize=(10,6))
-
-sns.lineplot(
-    x='Growth rate',y='Formate uptake',data=FA,
-    ax=ax[0],marker='o',
-)
-ax[0].fill_between(
-    x=FA['Growth rate'],y1=100,y2=FA['Formate uptake'],
-    facecolor='b', alpha=0.5
-)
-
-sns.lineplot(
-    x='Growth rate',y='Formate uptake',data=FA_G,
-    ax=ax[1],marker='o',
-)
-ax[1].fill_between(
-    x=FA_G['Growth rate'],y1=100,y2=FA_G['Formate uptake'],
-    facecolor='b', alpha=0.5
-)
-
-plt.setp(
-    ax,xlim=(0,0.4),ylim=(0,100),
-    xlabel='Growth rate (1/h)',
-    ylabel='Formate uptake rate (mmol/gCDW/h)'
-)
-ax[0].set_title(f'Formate \n slope={slope_FA:.2f} mmol/gCDW')
-ax[1].set_title(f'Formate + glycine \n slope={slope_FA_G:.2f} mmol/gCDW')
-plt.savefig('Formate dependency.png')
+if not HEADLESS:
+    fig, ax = plt.subplots(1,2,sharey=True,figsize=(10,6))
+
+    sns.lineplot(
+        x='Growth rate',y='Formate uptake',data=FA,
+        ax=ax[0],marker='o',
+    )
+    ax[0].fill_between(
+        x=FA['Growth rate'],y1=100,y2=FA['Formate uptake'],
+        facecolor='b', alpha=0.5
+    )
+
+    sns.lineplot(
+        x='Growth rate',y='Formate uptake',data=FA_G,
+        ax=ax[1],marker='o',
+    )
+    ax[1].fill_between(
+        x=FA_G['Growth rate'],y1=100,y2=FA_G['Formate uptake'],
+        facecolor='b', alpha=0.5
+    )
+
+    plt.setp(
+        ax,xlim=(0,0.4),ylim=(0,100),
+        xlabel='Growth rate (1/h)',
+        ylabel='Formate uptake rate (mmol/gCDW/h)'
+    )
+    ax[0].set_title(f'Formate \n slope={slope_FA:.2f} mmol/gCDW')
+    ax[1].set_title(f'Formate + glycine \n slope={slope_FA_G:.2f} mmol/gCDW')
+    plt.savefig('Formate dependency.png')
 # %%
 ratio = slope_FA/slope_FA_G
 print(f'Formate only condition needs at least {ratio:.2f} times higher formate uptake than formate + glycine.')
\ No newline at end of file
@@ -5,93 +5,25 @@ import numpy as np
 import pandas as pd
 import cobra
 
+sys.path.append(os.path.join('..', '..', '0_tools'))
+import iml1515
+from fba_utils import AddRxn
+from yield_matrix import yield_matrix
+import sweep
+from flux_summary import flux_summary
+from plotting import HEADLESS
+
 print('Python version:', sys.version)
 print('numpy version:', np.__version__)
 print('pandas version:', pd.__version__)
 print('cobrapy version:', cobra.__version__)
 
 # %%
-def AddRxn(model: cobra.Model,
-           newRxnFile):
-    """Function of adding new reactions to the model."""
-    n1 = len(model.reactions)
-    AllAddRxn = pd.read_csv(newRxnFile, sep=',', index_col='RxnID', skipinitialspace=True)
-    n2 = len(AllAddRxn)
-    for i in range(n2):
-        ID = AllAddRxn.index.values[i]
-        addRxn = cobra.Reaction(ID)
-        model.add_reactions([addRxn])
-        addRxnInf = model.reactions[n1 + i]
-        addRxnInf.name = AllAddRxn.loc[ID, 'RxnName']
-        addRxnInf.reaction = AllAddRxn.loc[ID, 'RxnFormula']
-        addRxnInf.subsystem = AllAddRxn.loc[ID, 'Subsystem']
-        addRxnInf.lower_bound = AllAddRxn.loc[ID, 'LowerBound']
-        addRxnInf.upper_bound = AllAddRxn.loc[ID, 'UpperBound']
-    return model
-
-# %%
-def KORxn(model: cobra.Model,
-          rxns2KO: list):
-    """Function for knocking out reactions."""
-    for ID in rxns2KO:
-        reaction = model.reactions.get_by_id(ID)
-        reaction.knock_out()
-
-# %%
-def pfba(model: cobra.Model):
-    cobra.flux_analysis.pfba(model)
-    print(model.summary())
-
-# %%
-def change_objective(model, product):
-    """change objective function"""
-    if product in ['accoa_c', 'succoa_c']:
-        rxn = cobra.Reaction(id=f"EX_{product}", lower_bound=-1000, upper_bound=1000)
-        model.add_reaction(rxn)
-        rxn.add_metabolites({product: -1, 'coa_c': 1})
-    elif product in ['g6p_c', 'f6p_c', 'e4p_c', 'r5p_c', 'g3p_c', '3pg_c', 'pep_c']:
-        rxn = cobra.Reaction(id=f"EX_{product}", lower_bound=-1000, upper_bound=1000)
-        model.add_reaction(rxn)
-        rxn.add_metabolites({product: -1, 'pi_c': 1})
-    elif f"EX_{product}" not in model.reactions:
-        rxn = cobra.Reaction(id=f"EX_{product}", lower_bound=-1000, upper_bound=1000)
-        model.add_reaction(rxn)
-        rxn.add_metabolites({product: -1})
-    model.objective = f"EX_{product}"
+def pfba(model: cobra.Model) -> cobra.Solution:
+    solution = sweep.pfba(model)
+    print(flux_summary(model, solution))
+    return solution
 
-# %%
-def flux2file(model: cobra.Model, 
-              psw, product, output_dir='tmp'):
-    """Function of exporting flux data."""
-    n = len(model.reactions)
-    modelMatrix = np.empty([n, 9], dtype = object)
-    for i in range(len(model.reactions)):
-        x = model.reactions[i]
-        modelMatrix[i, 0] = i + 1
-        modelMatrix[i, 1] = x.id
-        modelMatrix[i, 2] = x.name
-        modelMatrix[i, 3] = x.reaction
-        modelMatrix[i, 4] = x.subsystem
-        modelMatrix[i, 5] = x.lower_bound
-        modelMatrix[i, 6] = x.upper_bound
-        modelMatrix[i, 7] = x.flux
-        modelMatrix[i, 8] = abs(x.flux)
-        
-    df = pd.DataFrame(data = modelMatrix, 
-                      columns = ['N', 'RxnID', 'RxnName', 'Reaction', 'SubSystem', 
-                      'LowerBound', 'UpperBound', 'Flux-core', 'abs(Flux)'])
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
-    filepath = os.path.join(output_dir, '{}_{}.xlsx'.format(psw, product))
-    df.to_excel(filepath, index=False)
-#%%
-def prodFBA(model, psw, product,saveif):
-    solution = model.optimize()
-    # print("%s: " %product, round(solution.objective_value, 3))
-    # export results
-    if saveif: 
-        flux2file(model, psw, product)
-    return round(solution.objective_value, 3)
 # %% [markdown]
 # ## Model background
 # 
@@ -104,13 +36,6 @@ def prodFBA(model, psw, product,saveif):
 #  * The model has part of the Ethylmalonyl-CoA pathway, ACACT1r, HACD1 and ECOAH1,
 #  propanoyl-CoA degradation, MMM and MMCD already. 
 
-# %%
-model = cobra.io.load_json_model(r'..\..\0_ecoli_models\iML1515.json')
-
-model.reactions.THD2pp.add_metabolites({"h_p": 1, "h_c": -1})
-model.reactions.HSDy.bounds = (-1000, 0)
-model.reactions.MMM.bounds = (-1000, 1000)
-
 # %% [markdown]
 # ## Base knock-outs
 # * pyruvate synthase (POR5), 3pg producing glycerate kinase (GLYCK)
@@ -124,7 +49,9 @@ KORxn_base = ['POR5', 'GLYCK', 'FDH4pp', 'FDH5pp', 'ATPM',
               'PFL', 'OBTFL', 'GART', 'DRPA', 'PAI2T',
               'FRD2','FRD3','F6PA','FORCT']
 
-KORxn(model, KORxn_base)
+# curated model, read from the cache in 0_ecoli_models/.cache after the first run
+model = iml1515.load_model(patches=('THD2pp', 'HSDy', 'MMM'),
+                           knockouts=KORxn_base)
 # %%
 model.reactions.get_by_id('EX_glc__D_e').bounds = (0,0)
 
@@ -148,21 +75,12 @@ precursors = ['biomass', 'g6p_c', 'f6p_c', 'e4p_c', 'r5p_c', 'g3p_c',
 # %%
 # saveif = True
 saveif = False
-nadph_results = pd.DataFrame()
-
-for psw, pswrxns in psws.items():
-    with model_rump as m:
-        m.reactions.EX_for_e.lower_bound = -10
-        _m = AddRxn(m, pswrxns)
-        if psw != 'THF':
-            AddKO = ['FTHFLi',] 
-            KORxn(_m, AddKO)
-        for precursor in precursors:
-            with _m:
-                if precursor != 'biomass':
-                    change_objective(_m, precursor)
-                sol = prodFBA(_m, psw, precursor, saveif)
-                nadph_results.loc[precursor, psw] = sol
+AddKO = {'CoA': ['FTHFLi',], 'Pi': ['FTHFLi',]}
+
+nadph_results = yield_matrix(model_rump, psws, precursors,
+                             knockouts=AddKO,
+                             bounds={'EX_for_e': (-10, 1000)},
+                             saveif=saveif)
 
 nadph_results
 nadph_results.to_excel('formate reduction_FBA_nadph.xlsx')
@@ -171,72 +89,54 @@ nadph_results.to_excel('formate reduction_FBA_nadph.xlsx')
 # %%
 # saveif = True
 saveif = False
-nadh_results = pd.DataFrame()
-
-for psw, pswrxns in psws.items():
-    with model_rump as m:
-        m.reactions.EX_for_e.lower_bound = -10
-        _m = AddRxn(m, pswrxns)
-
-        if psw == 'THF': 
-            _m.reactions.get_by_id('MTHFD').add_metabolites({
-                "nad_c":-1,"nadp_c":1,"nadh_c":1,"nadph_c":-1
-            })
-        elif psw == 'Pi': 
-            _m.reactions.get_by_id('FPR').add_metabolites({
-                "nadh_c":-1,"nadp_c":-1,"nad_c":1,"nadph_c":1
-            })
-            AddKO = ['FTHFLi',] 
-            KORxn(_m, AddKO)
-        elif psw == 'CoA': 
-            _m.reactions.get_by_id('FCR').add_metabolites({
-                "nadh_c":-1,"nadp_c":-1,"nad_c":1,"nadph_c":1
-            })
-            AddKO = ['FTHFLi',] 
-            KORxn(_m, AddKO)
-
-        for precursor in precursors:
-            with _m:
-                if precursor != 'biomass':
-                    change_objective(_m, precursor)
-                sol = prodFBA(_m, psw, precursor, saveif)
-                nadh_results.loc[precursor, psw] = sol
+nadh = {
+    'THF': {'MTHFD': {"nad_c":-1,"nadp_c":1,"nadh_c":1,"nadph_c":-1}},
+    'Pi': {'FPR': {"nadh_c":-1,"nadp_c":-1,"nad_c":1,"nadph_c":1}},
+    'CoA': {'FCR': {"nadh_c":-1,"nadp_c":-1,"nad_c":1,"nadph_c":1}},
+}
+
+nadh_results = yield_matrix(model_rump, psws, precursors,
+                            knockouts=AddKO,
+                            bounds={'EX_for_e': (-10, 1000)},
+                            stoich=nadh,
+                            saveif=saveif)
 
 nadh_results
 nadh_results.to_excel('formate reduction_FBA_nadh.xlsx')
 # %%
-import matplotlib.pyplot as plt 
-
-plt.rcParams["font.family"] = "Arial"
-plt.rcParams['ytick.labelsize'] = 15
-plt.rcParams['xtick.labelsize'] = 15
-plt.rcParams['axes.titlesize'] = 24
-plt.rcParams['axes.labelsize'] = 18
-plt.rcParams['legend.title_fontsize'] = 15
-plt.rcParams['legend.fontsize'] = 13
-plt.rcParams.update({'mathtext.default': 'regular'})
-plt.rcParams['axes.axisbelow'] = True
-plt.rcParams['savefig.bbox'] = 'tight'
-
-x = np.arange(len(precursors))
-witdh = 0.2
-
-fig, ax = plt.subplots(figsize=(16, 6))
-ax.set_xticks(x)
-ax.set_xlim(-0.5, 12.5)
-ax.set_xticklabels(precursors)
-ax.set_yticklabels(map(str, np.arange(0, 7, 1)/10))
-ax.set_ylabel('Maximal yeild (mol/mol-formate)')
-plt.grid(which='both', axis='y')
-
-ax.bar(x-witdh, nadh_results['THF'], witdh, label='THF-NADH',edgecolor='k',lw=1,ls='--')
-ax.bar(x, nadh_results['CoA'], witdh, label = 'CoA-NADH',edgecolor='k',lw=1,ls='--')
-ax.bar(x+witdh, nadh_results['Pi'], witdh, label = 'Pi-NADH',edgecolor='k',lw=1,ls='--')
-
-ax.bar(x-witdh, nadph_results['THF'], witdh, label='THF-NADPH',edgecolor='k',lw=1,ls='-')
-ax.bar(x, nadph_results['CoA'], witdh, label = 'CoA-NADPH',edgecolor='k',lw=1,ls='-')
-ax.bar(x+witdh, nadph_results['Pi'], witdh, label = 'Pi-NADPH',edgecolor='k',lw=1,ls='-')
-
-plt.legend()
-plt.savefig('12 precursors production figure_stacked.eps', dpi=300)
-plt.show()
\ No newline at end of file
+if not HEADLESS:
+    import matplotlib.pyplot as plt 
+
+    plt.rcParams["font.family"] = "Arial"
+    plt.rcParams['ytick.labelsize'] = 15
+    plt.rcParams['xtick.labelsize'] = 15
+    plt.rcParams['axes.titlesize'] = 24
+    plt.rcParams['axes.labelsize'] = 18
+    plt.rcParams['legend.title_fontsize'] = 15
+    plt.rcParams['legend.fontsize'] = 13
+    plt.rcParams.update({'mathtext.default': 'regular'})
+    plt.rcParams['axes.axisbelow'] = True
+    plt.rcParams['savefig.bbox'] = 'tight'
+
+    x = np.arange(len(precursors))
+    witdh = 0.2
+
+    fig, ax = plt.subplots(figsize=(16, 6))
+    ax.set_xticks(x)
+    ax.set_xlim(-0.5, 12.5)
+    ax.set_xticklabels(precursors)
+    ax.set_yticklabels(map(str, np.arange(0, 7, 1)/10))
+    ax.set_ylabel('Maximal yeild (mol/mol-formate)')
+    plt.grid(which='both', axis='y')
+
+    ax.bar(x-witdh, nadh_results['THF'], witdh, label='THF-NADH',edgecolor='k',lw=1,ls='--')
+    ax.bar(x, nadh_results['CoA'], witdh, label = 'CoA-NADH',edgecolor='k',lw=1,ls='--')
+    ax.bar(x+witdh, nadh_results['Pi'], witdh, label = 'Pi-NADH',edgecolor='k',lw=1,ls='--')
+
+    ax.bar(x-witdh, nadph_results['THF'], witdh, label='THF-NADPH',edgecolor='k',lw=1,ls='-')
+    ax.bar(x, nadph_results['CoA'], witdh, label = 'CoA-NADPH',edgecolor='k',lw=1,ls='-')
+    ax.bar(x+witdh, nadph_results['Pi'], witdh, label = 'Pi-NADPH',edgecolor='k',lw=1,ls='-')
+
+    plt.legend()
+    plt.savefig('12 precursors production figure_stacked.eps', dpi=300)
+    plt.show()
\ No newline at end of file
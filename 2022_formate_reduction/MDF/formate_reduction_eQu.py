@@ -1,13 +1,17 @@
 #%%
+import os
+import sys
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from IPython.display import display
 import equilibrator_api
 from equilibrator_api import ComponentContribution, Q_, ureg, Reaction
 import equilibrator_pathway
 from equilibrator_pathway import ThermodynamicModel
+sys.path.append(os.path.join('..', '..', '0_tools'))
+from mdf_tools import mdf_arrays, mdf_sweep, mdf_parametric
+import dgf_cache
+from instrument import traced
+from plotting import HEADLESS, display
 
 print('equlibrator_api version:', equilibrator_api.__version__)
 print('equlibrator_pathway version:', equilibrator_pathway.__version__)
@@ -16,8 +20,10 @@ import warnings
 warnings.filterwarnings('ignore')
 
 ureg.default_format = ".2f~P"
-plt.rc('axes', axisbelow=True)
-ureg.setup_matplotlib(True)
+if not HEADLESS:
+    import matplotlib.pyplot as plt
+    plt.rc('axes', axisbelow=True)
+    ureg.setup_matplotlib(True)
 
 comp_contrib = ComponentContribution()
 
@@ -27,26 +33,28 @@ comp_contrib.ionic_strength = Q_('250 mM')
 comp_contrib.p_mg = Q_(3)
 
 # %%
+@traced
 def MDF(psw):
     print(psw)
     model = ThermodynamicModel.from_sbtab(f"{psw}.tsv", comp_contrib=comp_contrib) 
     print('Net reaction: ', model.net_reaction_formula)
 
-    model.update_standard_dgs()
+    dgf_cache.update_standard_dgs(model)
     mdf_result = model.mdf_analysis()
     mdf = mdf_result.score
     print(f'MDF: {mdf: .2f} kJ/mol')
     display(mdf_result.reaction_df)
 
-    fig, ax = plt.subplots(1, 1, figsize=(4, 4))
-    mdf_result.plot_driving_forces(ax)
-    ax.grid('on')
-    # fig.savefig(f'mdf_result_{psw}.eps')
-    plt.show()
+    if not HEADLESS:
+        fig, ax = plt.subplots(1, 1, figsize=(4, 4))
+        mdf_result.plot_driving_forces(ax)
+        ax.grid('on')
+        # fig.savefig(f'mdf_result_{psw}.eps')
+        plt.show()
 
-    fig, ax = plt.subplots(1, 1, figsize=(6, 6))
-    mdf_result.plot_concentrations(ax)
-    plt.show()
+        fig, ax = plt.subplots(1, 1, figsize=(6, 6))
+        mdf_result.plot_concentrations(ax)
+        plt.show()
 
 # %% [markdown]
 # ## Under default conditions 
@@ -62,32 +70,35 @@ def loadModel(psw):
     print('Net reaction: ', model.net_reaction_formula)
     return model
 
-def MDF_ub(model, cmp, ub):
-    model.set_bounds(cid=cmp, ub=Q_(ub, ureg.mM))
-    model.update_standard_dgs()
-    mdf_result = model.mdf_analysis()
-    return mdf_result.score
-
-def MDF_lb(model, cmp, lb):
-    model.set_bounds(cid=cmp, lb=Q_(lb, ureg.mM))
-    model.update_standard_dgs()
-    mdf_result = model.mdf_analysis()
-    return mdf_result.score
-
 # %% [markdown]
 # ## Formate upper bound between 1 and 50 mM
-mdf_for = pd.DataFrame()
-mdf_for['for_ub'] = range(1,51)
+# standard dG'0 are estimated once per pathway, only the bounds change
+models = {}
 for psw in psws:
-    model = loadModel(psw)
-    for i in mdf_for.index: 
-        mdf_for.loc[i,psw]=MDF_ub(model, 'for', mdf_for['for_ub'][i])
+    models[psw] = loadModel(psw)
+    dgf_cache.update_standard_dgs(models[psw])
+mdf_for = mdf_sweep(models, [('ub', 'for', range(1,51))]).reset_index()
 mdf_for.to_excel('formate reduction_MDF.xlsx')
+
+# %% [markdown]
+# ## Breakpoints over the formate upper bound
+# Without the uncertainty of the standard dG'0 the MDF is piecewise linear in
+# ln(formate upper bound): segments and their bottleneck reactions, exact
+arrays = {psw: dict(mdf_arrays(models[psw]), dg_confidence=0) for psw in psws}
+mdf_for_segments = mdf_parametric(arrays, 'for', 'ub', (1, 50))
+display(mdf_for_segments)
+
+# %% [markdown]
+# ## Formate upper bound x NADPH/NADP+ ratio
+mdf_for_nadph = mdf_sweep(models, [('ub', 'for', range(1,51)),
+                                   ('ratio', ('nadph', 'nadp'), [1, 3, 10, 30])])
+display(mdf_for_nadph)
 # %%    
-fig, ax = plt.subplots()
-mdf_for.plot(x='for_ub', ax=ax)
-plt.setp(
-    ax, ylabel='MDF (kJ/mol)', ylim=(0, 22),
-    xlim=(0, 50), xlabel='Formate concentration upper bound (mM)'
-)
-plt.savefig('formate_reduction_mdf.eps')
\ No newline at end of file
+if not HEADLESS:
+    fig, ax = plt.subplots()
+    mdf_for.plot(x='for_ub', ax=ax)
+    plt.setp(
+        ax, ylabel='MDF (kJ/mol)', ylim=(0, 22),
+        xlim=(0, 50), xlabel='Formate concentration upper bound (mM)'
+    )
+    plt.savefig('formate_reduction_mdf.eps')
\ No newline at end of file
@@ -4,63 +4,35 @@ import sys, os
 import numpy as np
 import pandas as pd
 import cobra
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-plt.rcParams["font.family"] = "Arial"
-plt.rcParams['ytick.labelsize'] = 15
-plt.rcParams['xtick.labelsize'] = 15
-plt.rcParams['axes.titlesize'] = 24
-plt.rcParams['axes.labelsize'] = 18
-plt.rcParams['legend.title_fontsize'] = 15
-plt.rcParams['legend.fontsize'] = 13
-plt.rcParams.update({'mathtext.default': 'regular'})
-plt.rcParams['axes.axisbelow'] = True
-plt.rcParams['savefig.bbox'] = 'tight'
+
+sys.path.append(os.path.join('..', '0_tools'))
+import iml1515
+from fba_utils import flux2file
+from sweep import growth_sweep, dependency_slope, pfba
+from flux_summary import flux_summary
+from ko_screen import ko_screen
+from strain import Strain
+from plotting import HEADLESS
+
+if not HEADLESS:
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.rcParams["font.family"] = "Arial"
+    plt.rcParams['ytick.labelsize'] = 15
+    plt.rcParams['xtick.labelsize'] = 15
+    plt.rcParams['axes.titlesize'] = 24
+    plt.rcParams['axes.labelsize'] = 18
+    plt.rcParams['legend.title_fontsize'] = 15
+    plt.rcParams['legend.fontsize'] = 13
+    plt.rcParams.update({'mathtext.default': 'regular'})
+    plt.rcParams['axes.axisbelow'] = True
+    plt.rcParams['savefig.bbox'] = 'tight'
 
 print('Python version:', sys.version)
 print('numpy version:', np.__version__)
 print('pandas version:', pd.__version__)
 print('cobrapy version:', cobra.__version__)
 
-# %%
-def KORxn(model: cobra.Model,
-          rxns2KO: list):
-    """Function for knocking out reactions."""
-    for ID in rxns2KO:
-        reaction = model.reactions.get_by_id(ID)
-        reaction.knock_out()
-
-# %%
-def pfba(model: cobra.Model):
-    cobra.flux_analysis.pfba(model)
-    
-# %%
-def flux2file(model: cobra.Model, 
-              psw, product, output_dir='tmp'):
-    """Function of exporting flux data."""
-    n = len(model.reactions)
-    modelMatrix = np.empty([n, 9], dtype = object)
-    for i in range(len(model.reactions)):
-        x = model.reactions[i]
-        modelMatrix[i, 0] = i + 1
-        modelMatrix[i, 1] = x.id
-        modelMatrix[i, 2] = x.name
-        modelMatrix[i, 3] = x.reaction
-        modelMatrix[i, 4] = x.subsystem
-        modelMatrix[i, 5] = x.lower_bound
-        modelMatrix[i, 6] = x.upper_bound
-        modelMatrix[i, 7] = x.flux
-        modelMatrix[i, 8] = abs(x.flux)
-        
-    df = pd.DataFrame(data = modelMatrix, 
-                      columns = ['N', 'RxnID', 'RxnName', 'Reaction', 'SubSystem', 
-                      'LowerBound', 'UpperBound', 'Flux-core', 'abs(Flux)'])
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
-    filepath = os.path.join(output_dir, '{}_{}.xlsx'.format(psw, product))
-    df.to_excel(filepath, index=False)
-
 # %% [markdown]
 # ## Model background
 # 
@@ -77,20 +49,14 @@ def flux2file(model: cobra.Model,
 # 
 # %%
 # Load full model and modification 
-model = cobra.io.load_json_model(r'..\0_ecoli_models\iML1515.json')
-
-model.reactions.THD2pp.add_metabolites({"h_p": 1, "h_c": -1})
-model.reactions.HSDy.bounds = (-1000, 0)
-model.reactions.ICL.bounds = (-1000, 1000)
-model.reactions.TRPAS2.bounds = (0, 1000)
-
-wt = model.copy()
+patches = ('THD2pp', 'HSDy', 'ICL', 'TRPAS2')
+wt = iml1515.load_model(patches=patches)
 
 KORxn_base = ['POR5', 'GLYCK', 'FDH4pp', 'FDH5pp',
               'PFL', 'OBTFL', 'GART', 'DRPA', 'PAI2T',
               'FRD2','FRD3',]
 
-KORxn(model, KORxn_base)
+model = iml1515.load_model(patches=patches, knockouts=KORxn_base)
 
 model.reactions.EX_glc__D_e.bounds = (0,0)
 
@@ -99,7 +65,8 @@ model.reactions.EX_glc__D_e.bounds = (0,0)
 # rxn.add_metabolites({'sarcs_c':-1})
 # %% [markdown]
 # ## RuMP sensor 
-rump = model.copy()
+# the sensor strains are diffs applied to `model` inside their with blocks
+rump = Strain(model, 'RuMP')
 
 h6p_c = cobra.Metabolite(
     'h6p_c',
@@ -108,13 +75,11 @@ h6p_c = cobra.Metabolite(
     compartment='c'
 )
 
-rxn=cobra.Reaction(id='HPS',name='3-hexulose-6-phosphate synthase',lower_bound=-1000,upper_bound=1000)
-rump.add_reaction(rxn)
-rxn.add_metabolites({'ru5p__D_c':-1,'fald_c':-1,h6p_c:1})
+rump.add_reaction('HPS', {'ru5p__D_c':-1,'fald_c':-1,h6p_c:1},
+                  name='3-hexulose-6-phosphate synthase',lower_bound=-1000,upper_bound=1000)
 
-rxn=cobra.Reaction(id='PHI',name='6-phospho-3-hexuloisomerase',lower_bound=-1000,upper_bound=1000)
-rump.add_reaction(rxn)
-rxn.add_metabolites({h6p_c:-1,'f6p_c':1})
+rump.add_reaction('PHI', {h6p_c:-1,'f6p_c':1},
+                  name='6-phospho-3-hexuloisomerase',lower_bound=-1000,upper_bound=1000)
 
 KO_rump = [
     'FALDH2',  # frmA
@@ -122,30 +87,26 @@ KO_rump = [
     'FBP',  # fbp, glpX
     'G6PDH2r',  # zwf
 ]
-KORxn(rump,KO_rump)
+rump.knock_out(KO_rump)
 
-rump.reactions.EX_xyl__D_e.lower_bound = -1000
-rump.reactions.EX_succ_e.lower_bound = -1000
+rump.set_bounds({'EX_xyl__D_e': (-1000, None), 'EX_succ_e': (-1000, None)})
 
 # E4P source 
-rxn=cobra.Reaction(id='EX_E4P',name='EX E4P',lower_bound=-1000,upper_bound=0)
-rump.add_reaction(rxn)
-rxn.add_metabolites({'e4p_c':-1})
+rump.add_reaction('EX_E4P', {'e4p_c':-1}, name='EX E4P',lower_bound=-1000,upper_bound=0)
 
 # %%
 # check growth without sarcosine/formaldehyde first 
 with rump as m: 
     # need to KO F6PA: dha + g3p <=> f6 to create the sensor strain 
     m.reactions.F6PA.knock_out()
-    pfba(m)
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'rump','0')
 # %%
 with rump as m: 
     # m.reactions.EX_sarcs.lower_bound = -1
     m.reactions.EX_fald_e.lower_bound = -1
     m.reactions.F6PA.knock_out()
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'rump','1')
 
 # %% [markdown]
@@ -167,35 +128,33 @@ def req_calc(
         strain: str
 ):
     model.reactions.EX_fald_e.lower_bound = -1000
-    model.objective ={model.reactions.EX_fald_e:-1}
-    model.objective_direction='min'
-
-    for i in df.index: 
-        gr = df.loc[i,'Growth rate']
-        # print(gr)
-        model.reactions.BIOMASS_Ec_iML1515_core_75p37M.bounds = (gr,gr)
-        pfba(model)
-        # print(model.summary())
-        df.loc[i,'FALD uptake'] = abs(model.reactions.EX_fald_e.flux)
-
-    slope = (df.iloc[4,1]-df.iloc[0,1])/(df.iloc[4,0]-df.iloc[0,0])
-
-    fig, ax = plt.subplots(figsize=(5,5))
-    sns.lineplot(
-        x='Growth rate',y='FALD uptake',data=df,
-        marker='o',ax=ax,
-    )
-    ax.fill_between(
-        x=df['Growth rate'],y1=0.5,y2=df['FALD uptake'],
-        facecolor='b',alpha=0.5,
-    )
-    plt.setp(
-        ax,xlim=(0,0.4),ylim=(0,0.5),
-        xlabel='Growth rate (1/h)',
-        ylabel='FALD uptake rate (mmol/gCDW/h)',
-        title=f'{strain}\n slope={slope:.3f} mmol/gCDW',
-    )
-    plt.savefig(f'{strain} FALD dependecy.pdf')
+
+    # minimal FALD uptake + pFBA at each growth rate, warm-started along the grid
+    sweep = growth_sweep(model, 'EX_fald_e', df['Growth rate'])
+    df['FALD uptake'] = sweep['EX_fald_e'].abs().values
+
+    # least-squares fit, so denser grids in `data` can be used
+    slope = dependency_slope(df['Growth rate'], df['FALD uptake'])
+    print(f'{strain} FALD dependency: {slope:.3f} mmol/gCDW')
+
+    if not HEADLESS:
+        fig, ax = plt.subplots(figsize=(5,5))
+        sns.lineplot(
+            x='Growth rate',y='FALD uptake',data=df,
+            marker='o',ax=ax,
+        )
+        ax.fill_between(
+            x=df['Growth rate'],y1=0.5,y2=df['FALD uptake'],
+            facecolor='b',alpha=0.5,
+        )
+        plt.setp(
+            ax,xlim=(0,0.4),ylim=(0,0.5),
+            xlabel='Growth rate (1/h)',
+            ylabel='FALD uptake rate (mmol/gCDW/h)',
+            title=f'{strain}\n slope={slope:.3f} mmol/gCDW',
+        )
+        plt.savefig(f'{strain} FALD dependecy.pdf')
+    return slope
 
 # %%
 with rump as m:
@@ -203,33 +162,42 @@ with rump as m:
     rump_df = data.copy()
     req_calc(m,rump_df,'RuMP')
 
+# %%
+# Single and double knock-outs in central metabolism that make the RuMP
+# strain depend on FALD, ranked by the FALD dependency (F6PA is chosen above)
+subsystems = ['Glycolysis/Gluconeogenesis', 'Pentose Phosphate Pathway',
+              'Citric Acid Cycle', 'Anaplerotic Reactions',
+              'Alternate Carbon Metabolism']
+with rump as m:
+    candidates = [r.id for r in m.reactions
+                  if r.subsystem in subsystems and r.genes]
+    rump_screen = ko_screen(m, 'EX_fald_e', max_size=2, candidates=candidates)
+rump_screen.head(10)
+
 # %% [markdown]
 # ## LtaE sensor 
-ltaE = model.copy()
+ltaE = Strain(model, 'LtaE')
 
-rxn=cobra.Reaction(id='SAL',name='serine aldolase',lower_bound=-1000,upper_bound=1000)
-ltaE.add_reaction(rxn)
-rxn.add_metabolites({'gly_c':-1,'fald_c':-1,'ser__L_c':1})
+ltaE.add_reaction('SAL', {'gly_c':-1,'fald_c':-1,'ser__L_c':1},
+                  name='serine aldolase',lower_bound=-1000,upper_bound=1000)
 
 KO_ltaE = [
     'FALDH2',  # frmA
     'AHGDx','PGCD', # serA
     'GHMT2r','THFAT'  # glyA
 ]
-KORxn(ltaE,KO_ltaE)
+ltaE.knock_out(KO_ltaE)
 
-ltaE.reactions.EX_glc__D_e.lower_bound = -1000
-ltaE.reactions.EX_gly_e.lower_bound = -1000
+ltaE.set_bounds({'EX_glc__D_e': (-1000, None), 'EX_gly_e': (-1000, None)})
 # %%
 # check growth without sarcosine/formaldehyde first 
 with ltaE as m: 
-    pfba(m)
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'ltaE','0')
 # %%
 with ltaE as m: 
     m.reactions.EX_fald_e.lower_bound = -1
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'ltaE','1')
 
 # %%
@@ -239,7 +207,7 @@ with ltaE as m:
 
 # %% [markdown]
 # ## HAL sensor 
-HAL = model.copy()
+HAL = Strain(model, 'HAL')
 
 hob_c = cobra.Metabolite(
     'hob_c',
@@ -248,33 +216,29 @@ hob_c = cobra.Metabolite(
     compartment='c'
 )
 
-rxn=cobra.Reaction(id='HAL',name='HOB aldolase',lower_bound=-1000,upper_bound=1000)
-HAL.add_reaction(rxn)
-rxn.add_metabolites({'pyr_c':-1,'fald_c':-1,hob_c:1})
+HAL.add_reaction('HAL', {'pyr_c':-1,'fald_c':-1,hob_c:1},
+                 name='HOB aldolase',lower_bound=-1000,upper_bound=1000)
 
-rxn=cobra.Reaction(id='HAT',name='HOB aminotransferase',lower_bound=-1000,upper_bound=1000)
-HAL.add_reaction(rxn)
-rxn.add_metabolites({hob_c:-1,'glu__L_c':-1,'hom__L_c':1,'akg_c':1})
+HAL.add_reaction('HAT', {hob_c:-1,'glu__L_c':-1,'hom__L_c':1,'akg_c':1},
+                 name='HOB aminotransferase',lower_bound=-1000,upper_bound=1000)
 
 KO_hal = [
     'FALDH2',  # frmA
     'ASAD', # asd
 ]
-KORxn(HAL,KO_hal)
+HAL.knock_out(KO_hal)
 
-HAL.reactions.EX_glc__D_e.lower_bound = -1000
-HAL.reactions.EX_26dap__M_e.lower_bound = -1000
+HAL.set_bounds({'EX_glc__D_e': (-1000, None), 'EX_26dap__M_e': (-1000, None)})
 # %%
 # check growth without sarcosine/formaldehyde first 
 with HAL as m: 
-    pfba(m)
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'HAL','0')
 
 # %%
 with HAL as m: 
     m.reactions.EX_fald_e.lower_bound = -1
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'HAL','1')
 
 # %%
@@ -286,14 +250,13 @@ with HAL as m:
 # ## HAL with Thr
 with HAL as m: 
     m.reactions.EX_thr__L_e.lower_bound = -1000
-    pfba(m)
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'HAL_Thr','0')
 # %%
 with HAL as m: 
     m.reactions.EX_thr__L_e.lower_bound = -1000
     m.reactions.EX_fald_e.lower_bound = -1
-    print(m.summary())
+    print(flux_summary(m, pfba(m)))
     # flux2file(m,'HAL_Thr','1')
 
 # %%
@@ -1,11 +1,15 @@
 #%%
+import os
+import sys
 import numpy as np
 import pandas as pd
 import equilibrator_api
 from equilibrator_api import ComponentContribution, Q_, ureg, Reaction
 import equilibrator_pathway
 from equilibrator_pathway import ThermodynamicModel
-import matplotlib.pyplot as plt
+sys.path.append(os.path.join('..', '0_tools'))
+import dgf_cache
+from plotting import HEADLESS
 
 print('equlibrator_api version:', equilibrator_api.__version__)
 print('equlibrator_pathway version:', equilibrator_pathway.__version__)
@@ -14,8 +18,10 @@ import warnings
 warnings.filterwarnings('ignore')
 
 ureg.default_format = ".2f~P"
-plt.rc('axes', axisbelow=True)
-ureg.setup_matplotlib(True)
+if not HEADLESS:
+    import matplotlib.pyplot as plt
+    plt.rc('axes', axisbelow=True)
+    ureg.setup_matplotlib(True)
 
 comp_contrib = ComponentContribution()
 
@@ -29,7 +35,7 @@ THETA = ThermodynamicModel.from_sbtab("THETA.tsv", comp_contrib=comp_contrib)
 print(THETA.net_reaction_formula)
 
 # %%
-THETA.update_standard_dgs()
+dgf_cache.update_standard_dgs(THETA)
 mdf_result_THETA = THETA.mdf_analysis()
 
 mdf_result_THETA.reaction_df
@@ -42,15 +48,17 @@ print(f"optimized_dg_prime of overall reaction:",
     f"{mdf_result_THETA.reaction_df['optimized_dg_prime'].sum()}")
 
 # %%
-fig, ax = plt.subplots(1, 1, figsize=(10, 5))
-mdf_result_THETA.plot_driving_forces(ax)
-ax.grid('on')
-fig.savefig('mdf_result_THETA_ambient.eps')
+if not HEADLESS:
+    fig, ax = plt.subplots(1, 1, figsize=(10, 5))
+    mdf_result_THETA.plot_driving_forces(ax)
+    ax.grid('on')
+    fig.savefig('mdf_result_THETA_ambient.eps')
 
 # %%
 mdf_result_THETA.compound_df
 
 #%%
-fig, ax = plt.subplots(1, 1, figsize=(10, 15))
-mdf_result_THETA.plot_concentrations(ax)
-fig.savefig('mdf_result_THETA_cpd.eps')
\ No newline at end of file
+if not HEADLESS:
+    fig, ax = plt.subplots(1, 1, figsize=(10, 15))
+    mdf_result_THETA.plot_concentrations(ax)
+    fig.savefig('mdf_result_THETA_cpd.eps')
\ No newline at end of file
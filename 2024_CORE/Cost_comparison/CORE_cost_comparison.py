@@ -4,60 +4,21 @@ import sys
 import os
 import numpy as np
 import pandas as pd
-from matplotlib import pyplot as plt
 import cobra
-plt.rc('axes', axisbelow=True)
+sys.path.append(os.path.join('..', '..', '0_tools'))
+from fba_utils import AddRxn
+from cost_variants import (variant_costs, cost_summary, reducing_eq_segments,
+                           fixed_flux_segments, sensitivity_table)
+from plotting import HEADLESS
+if not HEADLESS:
+    from matplotlib import pyplot as plt
+    plt.rc('axes', axisbelow=True)
 
 print('Python version:', sys.version)
 print('numpy version:', np.__version__)
 print('pandas version:', pd.__version__)
 print('cobrapy version:', cobra.__version__)
 
-# %%
-def AddRxn(model, newRxnFile):
-    """Function of adding new reactions to the model."""
-    n1 = len(model.reactions)
-    AllAddRxn = pd.read_csv(newRxnFile, sep=',', index_col='RxnID', skipinitialspace=True)
-    n2 = len(AllAddRxn)
-    for i in range(n2):
-        ID = AllAddRxn.index.values[i]
-        addRxn = cobra.Reaction(ID)
-        model.add_reactions([addRxn])
-        addRxnInf = model.reactions[n1 + i]
-        addRxnInf.name = AllAddRxn.loc[ID, 'RxnName']
-        addRxnInf.reaction = AllAddRxn.loc[ID, 'RxnFormula']
-        addRxnInf.subsystem = AllAddRxn.loc[ID, 'Subsystem']
-        addRxnInf.lower_bound = AllAddRxn.loc[ID, 'LowerBound']
-        addRxnInf.upper_bound = AllAddRxn.loc[ID, 'UpperBound']
-    return model
-
-
-# %%
-def flux2file(model, product, psw, output_dir='tmp'):
-    """Function of exporting flux data."""
-    n = len(model.reactions)
-    modelMatrix = np.empty([n, 9], dtype = object)
-    for i in range(len(model.reactions)):
-        x = model.reactions[i]
-        modelMatrix[i, 0] = i + 1
-        modelMatrix[i, 1] = x.id
-        modelMatrix[i, 2] = x.name
-        modelMatrix[i, 3] = x.reaction
-        modelMatrix[i, 4] = x.subsystem
-        modelMatrix[i, 5] = x.lower_bound
-        modelMatrix[i, 6] = x.upper_bound
-        modelMatrix[i, 7] = x.flux
-        modelMatrix[i, 8] = abs(x.flux)
-        
-    df = pd.DataFrame(data = modelMatrix, 
-                        columns = ['N', 'RxnID', 'RxnName', 'Reaction', 'SubSystem', 
-                        'LowerBound', 'UpperBound', 'Flux-core', 'abs(Flux)'])
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
-    filepath = os.path.join(output_dir, '{}_{}.xlsx'.format(product, psw))
-    df.to_excel(filepath, index=False)
-    
-
 # %% [markdown]
 # Construct a cobora model  
 # The model has a constraint of producing 1 of 3pg (sink_3pg), 
@@ -74,7 +35,8 @@ model.objective_direction = 'min'
 rubisco_flux = model.problem.Constraint(
     model.reactions.RBPC.flux_expression - 3 * model.reactions.RBPO.flux_expression,
     lb = 0, 
-    ub = 0
+    ub = 0,
+    name = 'rubisco_flux'
 )
 model.add_cons_vars(rubisco_flux)
 
@@ -99,57 +61,65 @@ photores = {
     'CORE_CoAT': 'x2_CORE_CoAT_rxns.csv',
 }
 
-cost_df = pd.DataFrame()
-
-# %%
-for psw, rxns in photores.items():
-    with model as m:
-        AddRxn(m, rxns)
-        m.optimize()
-        flux2file(m,'3pg',psw,'output')
-        for cost in ['DM_atp', 'DM_e', 'Fdr', 'EX_co2', 'RBPC', 'RBPO', 'sink_3pg']:
-            cost_df.loc[cost, psw] = abs(m.reactions.get_by_id(cost).flux)
-    
-
 # %% [markdown]
-# Use the GCC M5 variant that hydrolyse 3.9 ATP per carboxylation 
-# (Fig. 2c of [TACO](https://doi.org/10.1038/s41929-020-00557-y))
-
-with model as m:
-    AddRxn(m, 'f_TACOrxns.csv')
-    m.reactions.GCC.add_metabolites({'atp': -2.9, 'adp': 2.9, 'pi': 2.9})
-    print(m.reactions.GCC)
-    m.optimize()
-    flux2file(m,'3pg', 'TACO_M5','output')
-    for cost in ['DM_atp', 'DM_e', 'Fdr', 'EX_co2', 'RBPC', 'RBPO', 'sink_3pg']:
-        cost_df.loc[cost, 'TACO_M5'] = abs(m.reactions.get_by_id(cost).flux)
-
-# %% [markdown]
-# Use the GCC M5 L100N variant that hydrolyse 1.7 ATP per carboxylation 
+# GCC variants are given as ATP hydrolysed per carboxylation: 
+# the wild type (1), the M5 variant hydrolysing 3.9 ATP 
+# (Fig. 2c of [TACO](https://doi.org/10.1038/s41929-020-00557-y)) and 
+# the M5 L100N variant hydrolysing 1.7 ATP 
 # ([Marchal et al 2023 ACS Synth Biol](https://doi.org/10.1021/acssynbio.3c00403))
+gcc_atp = {('atp', 'GCC'): -1, ('adp', 'GCC'): 1, ('pi', 'GCC'): 1}
+GCC_variants = {'TACO_M5': 3.9, 'TACO_L100N': 1.7}
+
+save = {(psw, 1): ('3pg', psw) for psw in photores}
+save.update({('TACO', v): ('3pg', name) for name, v in GCC_variants.items()})
+costs = variant_costs(model, photores, {'GCC ATP': (gcc_atp, [1, *GCC_variants.values()])},
+                      save=save)
 
-with model as m:
-    AddRxn(m, 'f_TACOrxns.csv')
-    m.reactions.GCC.add_metabolites({'atp': -0.7, 'adp': 0.7, 'pi': 0.7})
-    print(m.reactions.GCC)
-    m.optimize()
-    flux2file(m,'3pg', 'TACO_L100N','output')
-    for cost in ['DM_atp', 'DM_e', 'Fdr', 'EX_co2', 'RBPC', 'RBPO', 'sink_3pg']:
-        cost_df.loc[cost, 'TACO_L100N'] = abs(m.reactions.get_by_id(cost).flux)
+cost_df = costs.xs(1, level='GCC ATP', axis=1).copy()
+for name, v in GCC_variants.items():
+    cost_df[name] = costs[('TACO', v)]
 # %%
 cost_df
 # %% [markdown]
 # Assuming 1 NAD(P)H = 2 ferredoxin,  
 # and along ETC: 1 NAD(P)H = 2.5 ATP
-cost_df.loc['reducing_eq',:]=cost_df.loc['DM_atp',:]/2.5 + cost_df.loc['DM_e'] + cost_df.loc['Fdr']/2
-cost_df.loc['Yield',:]=1/cost_df.loc['reducing_eq',:]  # per reducing equivalent  
-cost_df.loc['Rel_yield',:]=cost_df.loc['Yield',:]/cost_df.loc['Yield','NPR']*100
+cost_df = cost_summary(cost_df, atp_per_nadh=2.5, fd_per_nadh=2)
 cost_df.to_excel('CORE costs comparison.xlsx')
 cost_df.round(3)
+# %% [markdown]
+# Sensitivity to the conversion factors: minimizing the reducing equivalents 
+# themselves, the optimum is piecewise linear in 1/ratio, so a whole sweep 
+# of the ATP (or ferredoxin) per NAD(P)H ratio needs a few LPs per pathway.  
+# This is not the LP of cost_df, which minimizes ATP: a pathway may use more 
+# NAD(P)H or ferredoxin to save ATP, so at 2.5 ATP and 2 Fd the sweep can 
+# give a higher yield than cost_df. The *_fixed sweeps keep the cost_df fluxes.
+atp_segments = reducing_eq_segments(model, photores, 'atp_per_nadh', (2, 3.5))
+fd_segments = reducing_eq_segments(model, photores, 'fd_per_nadh', (1, 3))
+atp_sweep = sensitivity_table(atp_segments, np.linspace(2, 3.5, 31))
+fd_sweep = sensitivity_table(fd_segments, np.linspace(1, 3, 41))
+atp_fixed = sensitivity_table(fixed_flux_segments(cost_df, 'atp_per_nadh', (2, 3.5)),
+                              np.linspace(2, 3.5, 31))
+fd_fixed = sensitivity_table(fixed_flux_segments(cost_df, 'fd_per_nadh', (1, 3)),
+                             np.linspace(1, 3, 41))
+pd.concat({'min reducing_eq': atp_sweep['Rel_yield'],
+           'min ATP': atp_fixed['Rel_yield']}, axis=1).iloc[::5].round(1)
 # %%
-fig, ax = plt.subplots()
-cost_df.loc['Rel_yield'].plot(kind='bar', ax=ax)
-ax.grid(axis='y')
-plt.savefig('CORE cost comparison.eps',dpi=300,format='pdf')
-plt.show()
+if not HEADLESS:
+    fig, ax = plt.subplots()
+    cost_df.loc['Rel_yield'].plot(kind='bar', ax=ax)
+    ax.grid(axis='y')
+    plt.savefig('CORE cost comparison.eps',dpi=300,format='pdf')
+    plt.show()
+
+# %% [markdown]
+# Relative yields over GCC ATP per carboxylation, the RuBisCO 
+# carboxylation/oxygenation ratio and the NAD(P)H equivalents 
+# of ATP and ferredoxin
+grid = variant_costs(model, photores, {
+    'GCC ATP': (gcc_atp, np.arange(1, 4.01, 0.5)),
+    'RuBisCO ratio': ({('rubisco_flux', 'RBPO'): -1}, np.arange(2, 6.01, 0.5)),
+})
+grid_summary = cost_summary(grid, atp_per_nadh=[2.5, 3], fd_per_nadh=[1, 2])
+rel_yield = grid_summary.loc['Rel_yield'].unstack('Pathway')
+rel_yield.round(1)
 # %%